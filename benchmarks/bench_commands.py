@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compare the commands per second of the previous and the compiled encoders
+
+The previous encoding path (_process_args() plus list building, joining
+and encoding in _run_command()) is reproduced here and timed against the
+generated methods and property setters, for set_property, step_property
+and seek-heavy workloads.
+
+Commands either go to a sink which discards them, which shows the cost of
+encoding alone, or through a real command channel into /dev/null.
+
+Usage: bench_commands.py [-n COMMANDS] [--exec-dir DIR]
+
+--exec-dir prepends DIR to PATH so that an alternative 'mplayer'
+executable is used. A live MPlayer process is needed since commands to
+dead processes are discarded early.
+
+"""
+
+import os
+import sys
+import time
+import argparse
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def legacy_process_args(req, types, *args):
+    args = list(args[:req]) + [x for x in args[req:] if x is not None]
+    for i, arg in enumerate(args):
+        if not isinstance(arg, types[i].type):
+            msg = 'expected {0} for argument {1}'.format(types[i].name, i + 1)
+            raise TypeError(msg)
+        args[i] = types[i].adapt(arg)
+    return tuple(args)
+
+
+def legacy_run_command(player, name, *args):
+    if not player.is_alive():
+        return
+    cmd = [player.cmd_prefix, name]
+    cmd.extend(args)
+    cmd.append('\n')
+    if name in ['quit', 'pause', 'stop', 'loadfile']:
+        cmd.pop(0)
+    cmd = ' '.join(cmd)
+    if not isinstance(cmd, bytes):
+        cmd = cmd.encode('utf-8', 'ignore')
+    player._channel.put(cmd)
+
+
+class _Legacy(object):
+    """Forwards to player, with the volume property set up the old way"""
+
+    def __init__(self, player):
+        self._player = player
+        self._propcache = player._propcache
+
+    def _propset(self, value, pname, ptype, pmin, pmax, Step, mtypes):
+        cache = self._propcache
+        if not isinstance(value, Step):
+            if not isinstance(value, ptype.type):
+                raise TypeError('expected {0}'.format(ptype.name))
+            if pmin is not None and value < pmin:
+                raise ValueError('value must be at least {0}'.format(pmin))
+            if pmax is not None and value > pmax:
+                raise ValueError('value must be at most {0}'.format(pmax))
+            value = ptype.adapt(value)
+            legacy_run_command(self._player, 'set_property', pname, value)
+            if cache is not None:
+                if ptype in (mtypes.FlagType, mtypes.IntegerType, mtypes.FloatType):
+                    cache.update(pname, ptype.convert(value))
+                else:
+                    cache.invalidate(pname)
+        else:
+            legacy_run_command(self._player, 'step_property', pname, value._val, value._dir)
+            if cache is not None:
+                cache.invalidate(pname)
+
+
+def legacy_workloads(player, mtypes, Step):
+    cls = type('_LegacyPlayer', (_Legacy, ), {})
+    cls.volume = property(None, partial(cls._propset, pname='volume',
+                                        ptype=mtypes.FloatType, pmin=0.0, pmax=100.0,
+                                        Step=Step, mtypes=mtypes))
+    legacy = cls(player)
+
+    def set_property(value):
+        legacy.volume = value
+
+    def step_property(value):
+        legacy.volume = Step(value, 1)
+
+    def seek(value):
+        args = legacy_process_args(1, (mtypes.FloatType, mtypes.IntegerType,
+                                       mtypes.IntegerType), value, 0)
+        legacy_run_command(player, 'seek', *args)
+
+    return [('set_property', set_property), ('step_property', step_property),
+            ('seek', seek)]
+
+
+def compiled_workloads(player, Step):
+    def set_property(value):
+        player.volume = value
+
+    def step_property(value):
+        player.volume = Step(value, 1)
+
+    def seek(value):
+        player.seek(value, 0)
+
+    return [('set_property', set_property), ('step_property', step_property),
+            ('seek', seek)]
+
+
+class _Sink(object):
+
+    def put(self, data, waiters=(), force=False):
+        pass
+
+    def close(self):
+        pass
+
+
+def measure(func, count):
+    values = [float(i % 100) for i in range(count)]
+    t = time.time()
+    for value in values:
+        func(value)
+    return count / (time.time() - t)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='command encoding benchmark')
+    parser.add_argument('-n', '--commands', type=int, default=200000)
+    parser.add_argument('--exec-dir', default=None)
+    opts = parser.parse_args()
+    if opts.exec_dir:
+        os.environ['PATH'] = os.pathsep.join([opts.exec_dir, os.environ.get('PATH', '')])
+
+    import mplayer
+    from mplayer import misc, mtypes
+
+    player = mplayer.Player()
+    channel = player._channel
+    devnull = open(os.devnull, 'wb')
+    try:
+        print('{0:<8} {1:<14} {2:>14} {3:>14} {4:>8}'.format(
+            'target', 'workload', 'previous (c/s)', 'compiled (c/s)', 'speedup'))
+        for target in ('sink', 'channel'):
+            if target == 'sink':
+                player._channel = _Sink()
+            else:
+                player._channel = misc._CommandChannel(devnull, maxsize=player.cmd_queue_size)
+            old = legacy_workloads(player, mtypes, mplayer.Step)
+            new = compiled_workloads(player, mplayer.Step)
+            for (name, old_func), (_, new_func) in zip(old, new):
+                before = measure(old_func, opts.commands)
+                after = measure(new_func, opts.commands)
+                print('{0:<8} {1:<14} {2:>14.0f} {3:>14.0f} {4:>7.2f}x'.format(
+                    target, name, before, after, after / before))
+            player._channel.close()
+    finally:
+        player._channel = channel
+        player.quit()
+        devnull.close()
+
+
+if __name__ == '__main__':
+    main()
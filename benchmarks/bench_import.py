@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Measure the time and peak RSS of 'import mplayer'
+
+Each sample is taken in a fresh interpreter. The eager (default) and lazy
+(MPLAYER_PY_LAZY=1) introspection modes are compared, both with a cold and
+a warm introspection cache.
+
+Usage: bench_import.py [-n RUNS] [--exec-dir DIR]
+
+--exec-dir prepends DIR to PATH so that an alternative 'mplayer'
+executable is introspected.
+
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+import subprocess
+
+
+_CHILD = '''
+import json, resource, sys, time
+t = time.time()
+import mplayer
+t = time.time() - t
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({'time': t, 'rss': rss, 'version': mplayer.Player.version}))
+'''
+
+
+def sample(env):
+    out = subprocess.check_output([sys.executable, '-c', _CHILD], env=env)
+    return json.loads(out.decode('utf-8'))
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='import mplayer benchmark')
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    parser.add_argument('--exec-dir', default=None)
+    opts = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cache_dir = tempfile.mkdtemp(prefix='mplayer-bench-')
+    base_env = dict(os.environ)
+    base_env['PYTHONPATH'] = os.pathsep.join([root, base_env.get('PYTHONPATH', '')])
+    if opts.exec_dir:
+        base_env['PATH'] = os.pathsep.join([opts.exec_dir, base_env.get('PATH', '')])
+    print('{0:<8} {1:<6} {2:>12} {3:>12}'.format('mode', 'cache', 'time (ms)', 'RSS (KiB)'))
+    try:
+        for lazy in ('0', '1'):
+            for cache in ('cold', 'warm'):
+                env = dict(base_env, MPLAYER_PY_LAZY=lazy)
+                if cache == 'cold':
+                    env['MPLAYER_PY_CACHE_DIR'] = ''
+                else:
+                    env['MPLAYER_PY_CACHE_DIR'] = cache_dir
+                    # Populate the cache
+                    sample(dict(env, MPLAYER_PY_LAZY='0'))
+                results = [sample(env) for _ in range(opts.runs)]
+                print('{0:<8} {1:<6} {2:>12.2f} {3:>12}'.format(
+                    'lazy' if lazy == '1' else 'eager', cache,
+                    median([r['time'] for r in results]) * 1000,
+                    median([r['rss'] for r in results])))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
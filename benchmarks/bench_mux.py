@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compare thread count, RSS and answer latency of Player and MuxPlayer
+
+For each backend and player count, a fresh interpreter spawns the players
+and reports the number of threads, the growth of its own RSS and the
+latency of 'get_property' round trips (the time until the ANS_ line is
+read and routed).
+
+Usage: bench_mux.py [-c COUNTS] [-r ROUNDS] [--exec-dir DIR]
+
+--exec-dir prepends DIR to PATH so that an alternative 'mplayer'
+executable is used.
+
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+
+def rss_kib():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100.0), len(values) - 1)]
+
+
+def run(backend, count, rounds):
+    import time
+    import threading
+    import mplayer
+    from mplayer.mux import MuxPlayer
+
+    cls = {'threads': mplayer.Player, 'mux': MuxPlayer}[backend]
+    before = rss_kib()
+    players = [cls() for _ in range(count)]
+    # Let the processes settle
+    for p in players:
+        p.get('volume')
+    threads = threading.active_count()
+    rss = rss_kib() - before
+    latencies = []
+    for _ in range(rounds):
+        for p in players:
+            t = time.time()
+            p.get('volume')
+            latencies.append(time.time() - t)
+    for p in players:
+        p.quit()
+    return {'backend': backend, 'players': count, 'threads': threads,
+            'rss': rss, 'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='multiplexed I/O benchmark')
+    parser.add_argument('-c', '--counts', default='10,50,100,200,300')
+    parser.add_argument('-r', '--rounds', type=int, default=20)
+    parser.add_argument('--exec-dir', default=None)
+    parser.add_argument('--run', nargs=2, help=argparse.SUPPRESS)
+    opts = parser.parse_args()
+
+    if opts.run:
+        print(json.dumps(run(opts.run[0], int(opts.run[1]), opts.rounds)))
+        return
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([root, env.get('PYTHONPATH', '')])
+    if opts.exec_dir:
+        env['PATH'] = os.pathsep.join([opts.exec_dir, env.get('PATH', '')])
+    print('{0:<8} {1:>7} {2:>8} {3:>10} {4:>10} {5:>10}'.format(
+        'backend', 'players', 'threads', 'RSS (KiB)', 'p50 (us)', 'p99 (us)'))
+    for count in [int(c) for c in opts.counts.split(',')]:
+        for backend in ('threads', 'mux'):
+            out = subprocess.check_output([sys.executable, __file__, '--run',
+                backend, str(count), '-r', str(opts.rounds)], env=env)
+            r = json.loads(out.decode('utf-8').strip().splitlines()[-1])
+            print('{0:<8} {1:>7} {2:>8} {3:>10} {4:>10.0f} {5:>10.0f}'.format(
+                r['backend'], r['players'], r['threads'], r['rss'],
+                r['p50'] * 1e6, r['p99'] * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Measure the queue operations and the inter-item gap of Playlist
+
+The queue is filled with ENTRIES entries, shuffled, and then advanced
+through completely; the time per operation shouldn't depend on the
+number of entries. Then ITEMS entries are played gaplessly by the fake
+MPlayer, each ending after DURATION seconds, and the gap histogram of
+Playlist.stats() is printed.
+
+Usage: bench_playlist.py [-e ENTRIES] [-i ITEMS] [-d DURATION]
+
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+
+def bench_order(count):
+    from mplayer.playlist import _Order
+
+    order = _Order()
+    t = time.time()
+    for i in range(count):
+        order.append('/media/{0}.flac'.format(i))
+    append = (time.time() - t) / count
+    t = time.time()
+    order.shuffle(True)
+    shuffle = time.time() - t
+    t = time.time()
+    while order.advance() is not None:
+        pass
+    advance = (time.time() - t) / count
+    print('{0:<10} {1:>14} {2:>14} {3:>14}'.format(
+        'entries', 'append (us)', 'shuffle (us)', 'advance (us)'))
+    print('{0:<10} {1:>14.3f} {2:>14.3f} {3:>14.3f}'.format(
+        count, append * 1e6, shuffle * 1e6, advance * 1e6))
+
+
+def bench_gap(items, duration):
+    from mplayer.playlist import Playlist
+
+    playlist = Playlist(['/media/{0}.flac'.format(i) for i in range(items)])
+    try:
+        playlist.play()
+        deadline = time.time() + items * duration * 2 + 5
+        while playlist.stats()['position'] < items and time.time() < deadline:
+            time.sleep(duration / 2)
+        stats = playlist.stats()
+    finally:
+        playlist.close()
+    gap = stats['gap']
+    print('\n{0:<8} {1:>6} {2:>7} {3:>10} {4:>10} {5:>10}'.format(
+        'items', 'swaps', 'misses', 'p50 (us)', 'p99 (us)', 'max (us)'))
+    print('{0:<8} {1:>6} {2:>7} {3:>10.0f} {4:>10.0f} {5:>10.0f}'.format(
+        items, stats['swaps'], stats['misses'], (gap['p50'] or 0) * 1e6,
+        (gap['p99'] or 0) * 1e6, gap['max'] * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='playlist benchmark')
+    parser.add_argument('-e', '--entries', type=int, default=100000)
+    parser.add_argument('-i', '--items', type=int, default=20)
+    parser.add_argument('-d', '--duration', type=float, default=0.2)
+    opts = parser.parse_args()
+
+    bin_dir = tempfile.mkdtemp(prefix='mplayer-bench-bin-')
+    try:
+        # Before mplayer is imported, which may introspect the executable
+        os.symlink(os.path.join(BENCH_DIR, 'fake_mplayer.py'), os.path.join(bin_dir, 'mplayer'))
+        os.environ['PATH'] = os.pathsep.join([bin_dir, os.environ.get('PATH', '')])
+        os.environ['FAKE_MPLAYER_DURATION'] = str(opts.duration)
+        bench_order(opts.entries)
+        bench_gap(opts.items, opts.duration)
+    finally:
+        shutil.rmtree(bin_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
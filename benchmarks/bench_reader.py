@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compare the lines per second of the chunked reader and readline()
+
+The same MPlayer-like output is processed by the previous implementation
+(one readline(), decode() and rstrip() per line, then a Python loop over
+the subscribers) and by the stdout wrapper's chunked reader, with zero,
+one and several subscribers.
+
+A second table compares subscribers which each filter the lines
+themselves (one Python call per subscriber and line) with the same
+subscribers connected with prefix=.
+
+Usage: bench_reader.py [-n LINES] [-s SUBSCRIBERS]
+
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mplayer import misc
+
+
+SAMPLE = [
+    b'A:   1.2 V:   1.2 A-V:  0.000 ct:  0.000  30/ 30  5%  1%  0.3% 0 0',
+    b'ID_VIDEO_WIDTH=1920',
+    b'ANS_time_pos=12.34',
+    b'Cache fill: 12.50% (1048576 bytes)',
+    b'[h264 @ 0x55d5c3a1a2c0]error while decoding MB 12 34',
+]
+
+
+class _Wrapper(misc._StdoutWrapper):
+
+    def _detach(self):
+        # Don't release waiters; there are none in this benchmark
+        self._source = None
+
+
+def legacy(f, subscribers, answers):
+    """The readline()-based implementation, before the chunked reader"""
+    while True:
+        line = f.readline().decode('utf-8', 'ignore')
+        if not line:
+            break
+        line = line.rstrip()
+        if line.startswith('ANS_'):
+            answers.append(line)
+        elif line:
+            for subscriber in subscribers:
+                subscriber(line)
+
+
+def chunked(f, subscribers, answers):
+    wrapper = _Wrapper(handle=None)
+    wrapper._router.dispatch = answers.append
+    for subscriber in subscribers:
+        wrapper.connect(subscriber)
+    wrapper._attach(f)
+    while wrapper._source is not None:
+        wrapper._process_output()
+
+
+def self_filtered(f, prefixes, answers):
+    # Every subscriber sees every line and checks the prefix itself
+    def make(prefix):
+        def subscriber(line):
+            if line.startswith(prefix):
+                pass
+        return subscriber
+    chunked(f, [make(prefix) for prefix in prefixes], answers)
+
+
+def prefix_filtered(f, prefixes, answers):
+    wrapper = _Wrapper(handle=None)
+    wrapper._router.dispatch = answers.append
+    for prefix in prefixes:
+        wrapper.connect(lambda line: None, prefix=prefix)
+    wrapper._attach(f)
+    while wrapper._source is not None:
+        wrapper._process_output()
+
+
+def measure(func, path, count, subscribers):
+    answers = []
+    with open(path, 'rb') as f:
+        t = time.time()
+        func(f, subscribers, answers)
+        return count / (time.time() - t)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='output reader benchmark')
+    parser.add_argument('-n', '--lines', type=int, default=500000)
+    parser.add_argument('-s', '--subscribers', default='0,1,5')
+    opts = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(prefix='mplayer-bench-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'\n'.join(SAMPLE[i % len(SAMPLE)]
+                               for i in range(opts.lines)) + b'\n')
+        print('{0:>11} {1:>14} {2:>14} {3:>8}'.format(
+            'subscribers', 'readline (l/s)', 'chunked (l/s)', 'speedup'))
+        for n in [int(x) for x in opts.subscribers.split(',')]:
+            subscribers = [(lambda line: None) for _ in range(n)]
+            old = measure(legacy, path, opts.lines, subscribers)
+            new = measure(chunked, path, opts.lines, subscribers)
+            print('{0:>11} {1:>14.0f} {2:>14.0f} {3:>7.2f}x'.format(
+                n, old, new, new / old))
+        print('')
+        print('{0:>11} {1:>14} {2:>14} {3:>8}'.format(
+            'subscribers', 'unfilt. (l/s)', 'prefix= (l/s)', 'speedup'))
+        for n in [int(x) for x in opts.subscribers.split(',')]:
+            # Mostly prefixes which never match, like plugin-style listeners
+            prefixes = ['ID_'] + ['X{0}_'.format(i) for i in range(n - 1)]
+            old = measure(self_filtered, path, opts.lines, prefixes[:n])
+            new = measure(prefix_filtered, path, opts.lines, prefixes[:n])
+            print('{0:>11} {1:>14.0f} {2:>14.0f} {3:>7.2f}x'.format(
+                n, old, new, new / old))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
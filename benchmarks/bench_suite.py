@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Run the main benchmarks against the fake MPlayer (or any executable)
+
+Measures, each in fresh interpreters:
+
+- the time and peak RSS of 'import mplayer', without introspection (lazy)
+  and with introspection from a cold and a warm cache
+- per backend (threads, mux, asyncio and, if installed, gevent):
+  spawn time and RSS per player, thread count, 'get_property' round-trip
+  latency (p50/p99) across all players, 'set_property' commands per second
+  of a single player (until the last one was processed) and the lines per
+  second read by a player whose MPlayer writes FAKE_MPLAYER_NOISE status
+  lines before each answer
+
+The executable defaults to fake_mplayer.py, so no MPlayer is needed; it's
+put in PATH as 'mplayer' through a temporary directory.
+
+Usage: bench_suite.py [--exec PATH] [-b BACKENDS] [-p PLAYERS] [-r ROUNDS]
+                      [-n COMMANDS] [--noise LINES] [--latency SECONDS]
+                      [--import-runs RUNS]
+
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+
+from bench_import import sample, median
+from bench_mux import rss_kib, percentile
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FAKE_MPLAYER = os.path.join(BENCH_DIR, 'fake_mplayer.py')
+
+BACKENDS = ('threads', 'mux', 'asyncio', 'gevent')
+
+
+def _player_class(backend):
+    if backend == 'threads':
+        from mplayer import Player
+        return Player
+    if backend == 'mux':
+        from mplayer.mux import MuxPlayer
+        return MuxPlayer
+    if backend == 'asyncio':
+        from mplayer.aio import AsyncioPlayer
+        return AsyncioPlayer
+    if backend == 'gevent':
+        from mplayer.gevent1 import GeventPlayer
+        return GeventPlayer
+    raise ValueError('unknown backend: {0}'.format(backend))
+
+
+def _result(backend, count, spawn, rss, threads, latencies, commands, rate, lines):
+    return {'backend': backend, 'players': count, 'spawn': spawn / count,
+            'rss': rss / float(count), 'threads': threads,
+            'p50': percentile(latencies, 50), 'p99': percentile(latencies, 99),
+            'commands': commands / rate, 'lines': lines}
+
+
+def run(backend, count, rounds, commands, noise):
+    import threading
+
+    cls = _player_class(backend)
+    before = rss_kib()
+    t = time.time()
+    players = [cls() for _ in range(count)]
+    # Let the processes settle
+    for p in players:
+        p.get('volume')
+    spawn = time.time() - t
+    threads = threading.active_count()
+    rss = rss_kib() - before
+    latencies = []
+    for _ in range(rounds):
+        for p in players:
+            t = time.time()
+            p.get('volume')
+            latencies.append(time.time() - t)
+    p = players[0]
+    t = time.time()
+    for i in range(commands):
+        p.volume = float(i % 100)
+    # Answers are in order, so this one arrives after all commands are done
+    p.get('volume', timeout=60.0)
+    rate = time.time() - t
+    for p in players:
+        p.quit()
+    os.environ['FAKE_MPLAYER_NOISE'] = str(noise)
+    p = cls()
+    p.get('volume')
+    t = time.time()
+    for _ in range(rounds):
+        p.get('volume')
+    lines = rounds * (noise + 1) / (time.time() - t)
+    p.quit()
+    return _result(backend, count, spawn, rss, threads, latencies, commands, rate, lines)
+
+
+async def run_asyncio(count, rounds, commands, noise):
+    import threading
+
+    cls = _player_class('asyncio')
+    before = rss_kib()
+    t = time.time()
+    players = [cls() for _ in range(count)]
+    for p in players:
+        await p.spawn()
+    for p in players:
+        await p.get('volume')
+    spawn = time.time() - t
+    threads = threading.active_count()
+    rss = rss_kib() - before
+    latencies = []
+    for _ in range(rounds):
+        for p in players:
+            t = time.time()
+            await p.get('volume')
+            latencies.append(time.time() - t)
+    p = players[0]
+    t = time.time()
+    for i in range(commands):
+        p.volume = float(i % 100)
+    await p.get('volume', timeout=60.0)
+    rate = time.time() - t
+    for p in players:
+        await p.quit()
+    os.environ['FAKE_MPLAYER_NOISE'] = str(noise)
+    async with cls() as p:
+        await p.get('volume')
+        t = time.time()
+        for _ in range(rounds):
+            await p.get('volume')
+        lines = rounds * (noise + 1) / (time.time() - t)
+    return _result('asyncio', count, spawn, rss, threads, latencies, commands, rate, lines)
+
+
+def available(backend, env):
+    """Check if the backend can be imported in a child interpreter"""
+    code = 'import mplayer.{0}'.format({'threads': 'core', 'mux': 'mux', 'asyncio': 'aio',
+                                        'gevent': 'gevent1'}[backend])
+    with open(os.devnull, 'wb') as devnull:
+        return subprocess.call([sys.executable, '-c', code], env=env,
+                               stdout=devnull, stderr=devnull) == 0
+
+
+def bench_import(env, cache_dir, runs):
+    print('{0:<22} {1:>12} {2:>12}'.format('import', 'time (ms)', 'RSS (KiB)'))
+    modes = [('lazy', dict(env, MPLAYER_PY_LAZY='1', MPLAYER_PY_CACHE_DIR='')),
+             ('eager, cold cache', dict(env, MPLAYER_PY_LAZY='0', MPLAYER_PY_CACHE_DIR='')),
+             ('eager, warm cache', dict(env, MPLAYER_PY_LAZY='0', MPLAYER_PY_CACHE_DIR=cache_dir))]
+    # Populate the cache
+    sample(modes[2][1])
+    for name, mode_env in modes:
+        results = [sample(mode_env) for _ in range(runs)]
+        print('{0:<22} {1:>12.2f} {2:>12}'.format(
+            name, median([r['time'] for r in results]) * 1000,
+            median([r['rss'] for r in results])))
+
+
+def bench_backends(env, opts):
+    print('\n{0:<8} {1:>7} {2:>10} {3:>10} {4:>8} {5:>9} {6:>9} {7:>10} {8:>10}'.format(
+        'backend', 'players', 'spawn (ms)', 'KiB/player', 'threads', 'p50 (us)',
+        'p99 (us)', 'cmds/s', 'lines/s'))
+    for backend in opts.backends.split(','):
+        if not available(backend, env):
+            print('{0:<8} (not available)'.format(backend))
+            continue
+        out = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+            '--run', backend, '-p', str(opts.players), '-r', str(opts.rounds),
+            '-n', str(opts.commands), '--noise', str(opts.noise)], env=env)
+        r = json.loads(out.decode('utf-8').strip().splitlines()[-1])
+        print('{0:<8} {1:>7} {2:>10.2f} {3:>10.0f} {4:>8} {5:>9.0f} {6:>9.0f} '
+              '{7:>10.0f} {8:>10.0f}'.format(
+                  r['backend'], r['players'], r['spawn'] * 1000, r['rss'],
+                  r['threads'], r['p50'] * 1e6, r['p99'] * 1e6, r['commands'],
+                  r['lines']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='mplayer.py benchmark suite')
+    parser.add_argument('--exec', dest='exec_path', default=FAKE_MPLAYER,
+                        help='MPlayer executable (default: fake_mplayer.py)')
+    parser.add_argument('-b', '--backends', default=','.join(BACKENDS))
+    parser.add_argument('-p', '--players', type=int, default=10)
+    parser.add_argument('-r', '--rounds', type=int, default=200)
+    parser.add_argument('-n', '--commands', type=int, default=20000)
+    parser.add_argument('--noise', type=int, default=50,
+                        help='status lines per answer for the reader benchmark')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the fake MPlayer takes per command')
+    parser.add_argument('--import-runs', type=int, default=10)
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    opts = parser.parse_args()
+
+    if opts.run:
+        if opts.run == 'asyncio':
+            import asyncio
+            r = asyncio.run(run_asyncio(opts.players, opts.rounds, opts.commands, opts.noise))
+        else:
+            r = run(opts.run, opts.players, opts.rounds, opts.commands, opts.noise)
+        print(json.dumps(r))
+        return
+
+    root = os.path.dirname(BENCH_DIR)
+    bin_dir = tempfile.mkdtemp(prefix='mplayer-bench-bin-')
+    cache_dir = tempfile.mkdtemp(prefix='mplayer-bench-cache-')
+    try:
+        os.symlink(os.path.abspath(opts.exec_path), os.path.join(bin_dir, 'mplayer'))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([root, env.get('PYTHONPATH', '')])
+        env['PATH'] = os.pathsep.join([bin_dir, env.get('PATH', '')])
+        env['MPLAYER_PY_CACHE_DIR'] = cache_dir
+        env['FAKE_MPLAYER_LATENCY'] = str(opts.latency)
+        env['FAKE_MPLAYER_NOISE'] = '0'
+        env['MPLAYER_PY_LAZY'] = '0'
+        bench_import(env, cache_dir, opts.import_runs)
+        bench_backends(env, opts)
+    finally:
+        shutil.rmtree(bin_dir, ignore_errors=True)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,462 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A pure-Python stand-in for the MPlayer executable
+
+Answers 'mplayer -list-properties', 'mplayer -input cmdlist' and the slave
+protocol (get_property, set_property, step_property, quit, plus loadfile,
+pause, seek and stop), which is enough to introspect, spawn and drive
+Player and its subclasses on hosts without MPlayer. Nothing is decoded or
+played; a file appears to be loaded until it's stopped or ends.
+
+Point Player.exec_path at this script, or put it in PATH as 'mplayer':
+
+    mplayer.Player.exec_path = '/path/to/benchmarks/fake_mplayer.py'
+    mplayer.Player.introspect()
+
+Since Player passes its own arguments, the behaviour is configured through
+environment variables, read when the process starts:
+
+FAKE_MPLAYER_LATENCY -- seconds to sleep before handling each slave
+                        command (default: 0)
+FAKE_MPLAYER_NOISE -- number of status lines written to stdout before each
+                      answer (default: 0)
+FAKE_MPLAYER_STARTUP -- seconds to sleep before doing anything, e.g. to
+                        mimic the start-up time of the real executable
+                        (default: 0)
+FAKE_MPLAYER_DURATION -- seconds of unpaused playback after which a loaded
+                         file ends with 'EOF code: 1'; 0 means never
+                         (default: 0)
+
+"""
+
+import os
+import sys
+import time
+import shlex
+import threading
+
+
+VERSION = 'MPlayer 1.5-fake (C) 2000-2022 MPlayer Team'
+
+# name, type, min, max, initial value (None: unavailable)
+PROPERTIES = [
+    ('osdlevel', 'Integer', '0', '3', 1),
+    ('speed', 'Float', '0.01', '100.00', 1.0),
+    ('loop', 'Integer', '-1', 'No', -1),
+    ('pause', 'Flag', '0', '1', False),
+    ('filename', 'String', 'No', 'No', 'fake.mkv'),
+    ('path', 'String', 'No', 'No', '/tmp/fake.mkv'),
+    ('demuxer', 'String', 'No', 'No', 'lavfpref'),
+    ('stream_pos', 'Position', '0', 'No', 0),
+    ('stream_start', 'Position', '0', 'No', 0),
+    ('stream_end', 'Position', '0', 'No', 104857600),
+    ('stream_length', 'Position', '0', 'No', 104857600),
+    ('stream_time_pos', 'Time', 'No', 'No', None),
+    ('chapter', 'Integer', '0', 'No', None),
+    ('chapters', 'Integer', 'No', 'No', 0),
+    ('angle', 'Integer', '-2', '10', None),
+    ('length', 'Time', 'No', 'No', 5400.0),
+    ('percent_pos', 'Integer', '0', '100', 0),
+    ('time_pos', 'Time', '0', 'No', 0.0),
+    ('metadata', 'String list', 'No', 'No', ['title', 'Fake', 'artist', 'Nobody']),
+    ('volume', 'Float', '0', '100', 50.0),
+    ('balance', 'Float', '-1', '1', 0.0),
+    ('mute', 'Flag', '0', '1', False),
+    ('audio_delay', 'Float', '-100', '100', 0.0),
+    ('audio_format', 'Integer', 'No', 'No', 8192),
+    ('audio_codec', 'String', 'No', 'No', 'ffac3'),
+    ('audio_bitrate', 'Integer', 'No', 'No', 192000),
+    ('samplerate', 'Integer', 'No', 'No', 48000),
+    ('channels', 'Integer', 'No', 'No', 2),
+    ('switch_audio', 'Integer', '-2', '65535', 0),
+    ('switch_angle', 'Integer', '-2', '255', None),
+    ('switch_title', 'Integer', '-2', '255', None),
+    ('capturing', 'Flag', '0', '1', False),
+    ('fullscreen', 'Flag', '0', '1', False),
+    ('deinterlace', 'Flag', '0', '1', False),
+    ('ontop', 'Flag', '0', '1', False),
+    ('rootwin', 'Flag', '0', '1', False),
+    ('border', 'Flag', '0', '1', True),
+    ('framedropping', 'Integer', '0', '2', 0),
+    ('gamma', 'Integer', '-100', '100', 0),
+    ('brightness', 'Integer', '-100', '100', 0),
+    ('contrast', 'Integer', '-100', '100', 0),
+    ('saturation', 'Integer', '-100', '100', 0),
+    ('hue', 'Integer', '-100', '100', 0),
+    ('panscan', 'Float', '0', '1', 0.0),
+    ('vsync', 'Flag', '0', '1', False),
+    ('video_format', 'Integer', 'No', 'No', 875967080),
+    ('video_codec', 'String', 'No', 'No', 'ffh264'),
+    ('video_bitrate', 'Integer', 'No', 'No', 0),
+    ('width', 'Integer', 'No', 'No', 1920),
+    ('height', 'Integer', 'No', 'No', 1080),
+    ('fps', 'Float', 'No', 'No', 25.0),
+    ('aspect', 'Float', 'No', 'No', 1.777778),
+    ('switch_video', 'Integer', '-2', '65535', 0),
+    ('switch_program', 'Integer', '-1', '65535', None),
+    ('sub', 'Integer', '-1', 'No', -1),
+    ('sub_source', 'Integer', '-1', '2', -1),
+    ('sub_file', 'Integer', '-1', 'No', -1),
+    ('sub_vob', 'Integer', '-1', 'No', -1),
+    ('sub_demux', 'Integer', '-1', 'No', -1),
+    ('sub_delay', 'Float', 'No', 'No', 0.0),
+    ('sub_pos', 'Integer', '0', '100', 100),
+    ('sub_alignment', 'Integer', '0', '2', 2),
+    ('sub_visibility', 'Flag', '0', '1', True),
+    ('sub_forced_only', 'Flag', '0', '1', False),
+    ('sub_scale', 'Float', '0', '100', 5.0),
+    ('tv_brightness', 'Integer', '-100', '100', None),
+    ('tv_contrast', 'Integer', '-100', '100', None),
+    ('tv_saturation', 'Integer', '-100', '100', None),
+    ('tv_hue', 'Integer', '-100', '100', None),
+    ('teletext_page', 'Integer', '0', '799', None),
+    ('teletext_subpage', 'Integer', '0', '64', None),
+    ('teletext_mode', 'Flag', '0', '1', None),
+    ('teletext_format', 'Integer', '0', '3', None),
+    ('teletext_half_page', 'Integer', '0', '2', None),
+]
+
+# As printed by 'mplayer -input cmdlist'; osd_show_property_te is
+# truncated there, too
+COMMANDS = [
+    ('radio_step_channel', 'Integer'),
+    ('radio_set_channel', 'String'),
+    ('radio_set_freq', 'Float'),
+    ('radio_step_freq', 'Float'),
+    ('seek', 'Float [Integer] [Integer]'),
+    ('edl_loadfile', 'String'),
+    ('edl_mark', ''),
+    ('audio_delay', 'Float [Integer]'),
+    ('speed_incr', 'Float'),
+    ('speed_mult', 'Float'),
+    ('speed_set', 'Float'),
+    ('quit', '[Integer]'),
+    ('stop', ''),
+    ('pause', ''),
+    ('frame_step', ''),
+    ('pt_step', 'Integer [Integer]'),
+    ('pt_up_step', 'Integer [Integer]'),
+    ('alt_src_step', 'Integer'),
+    ('loop', 'Integer [Integer]'),
+    ('sub_delay', 'Float [Integer]'),
+    ('sub_step', 'Integer [Integer]'),
+    ('osd', '[Integer]'),
+    ('osd_show_text', 'String [Integer] [Integer]'),
+    ('osd_show_property_te', 'String [Integer] [Integer]'),
+    ('osd_show_progression', ''),
+    ('volume', 'Float [Integer]'),
+    ('balance', 'Float [Integer]'),
+    ('use_master', ''),
+    ('mute', '[Integer]'),
+    ('contrast', 'Integer [Integer]'),
+    ('gamma', 'Integer [Integer]'),
+    ('brightness', 'Integer [Integer]'),
+    ('hue', 'Integer [Integer]'),
+    ('saturation', 'Integer [Integer]'),
+    ('frame_drop', '[Integer]'),
+    ('sub_pos', 'Integer [Integer]'),
+    ('sub_alignment', '[Integer]'),
+    ('sub_visibility', '[Integer]'),
+    ('sub_load', 'String'),
+    ('sub_remove', '[Integer]'),
+    ('vobsub_lang', '[Integer]'),
+    ('sub_select', '[Integer]'),
+    ('sub_source', '[Integer]'),
+    ('sub_vob', '[Integer]'),
+    ('sub_demux', '[Integer]'),
+    ('sub_file', '[Integer]'),
+    ('sub_log', ''),
+    ('sub_scale', 'Float [Integer]'),
+    ('get_percent_pos', ''),
+    ('get_time_length', ''),
+    ('get_file_name', ''),
+    ('get_video_codec', ''),
+    ('get_video_bitrate', ''),
+    ('get_video_resolution', ''),
+    ('get_audio_codec', ''),
+    ('get_audio_bitrate', ''),
+    ('get_audio_samples', ''),
+    ('get_meta_title', ''),
+    ('get_meta_artist', ''),
+    ('get_time_pos', ''),
+    ('get_sub_visibility', ''),
+    ('get_property', 'String'),
+    ('set_property', 'String String'),
+    ('step_property', 'String [Float] [Integer]'),
+    ('switch_audio', '[Integer]'),
+    ('switch_angle', '[Integer]'),
+    ('switch_title', '[Integer]'),
+    ('capturing', ''),
+    ('vo_fullscreen', '[Integer]'),
+    ('vo_ontop', '[Integer]'),
+    ('vo_rootwin', '[Integer]'),
+    ('vo_border', '[Integer]'),
+    ('screenshot', '[Integer]'),
+    ('panscan', 'Float [Integer]'),
+    ('switch_vsync', '[Integer]'),
+    ('loadfile', 'String [Integer]'),
+    ('loadlist', 'String [Integer]'),
+    ('run', 'String'),
+    ('change_rectangle', 'Integer Integer'),
+    ('dvdnav', 'String'),
+    ('menu', 'String'),
+    ('set_menu', 'String [String]'),
+    ('help', ''),
+    ('exit', ''),
+    ('hide', '[Integer]'),
+    ('get_vo_fullscreen', ''),
+    ('key_down_event', 'Integer'),
+    ('set_mouse_pos', 'Integer Integer'),
+    ('af_switch', 'String'),
+    ('af_add', 'String'),
+    ('af_del', 'String'),
+    ('af_clr', ''),
+    ('af_cmdline', 'String String'),
+]
+
+_STATUS = 'A:{0:7.1f} V:{0:7.1f} A-V:  0.000 ct:  0.000   0/  0  1%  0%  0.2% 0 0\n'
+
+
+def _format(ptype, value):
+    if ptype == 'Flag':
+        return 'yes' if value else 'no'
+    if ptype in ('Integer', 'Position'):
+        return '{0:d}'.format(value)
+    if ptype == 'Float':
+        return '{0:f}'.format(value)
+    if ptype == 'Time':
+        return '{0:.2f}'.format(value)
+    if ptype == 'String list':
+        return ','.join(value)
+    return value
+
+
+def _parse(ptype, text):
+    if ptype == 'Flag':
+        return text not in ('0', 'no')
+    if ptype in ('Integer', 'Position'):
+        return int(float(text))
+    if ptype in ('Float', 'Time'):
+        return float(text)
+    if ptype == 'String list':
+        return text.split(',')
+    return text
+
+
+def _unquote(text):
+    if len(text) > 1 and text[0] == text[-1] and text[0] in '\'"':
+        return text[1:-1]
+    return text
+
+
+class FakeMPlayer(object):
+
+    def __init__(self, out, latency=0.0, noise=0, duration=0.0):
+        super(FakeMPlayer, self).__init__()
+        self.out = out
+        self.latency = latency
+        self.noise = noise
+        self.duration = duration
+        # Ends the loaded file; (timer, started at, seconds left) while playing
+        self.timer = None
+        self.remaining = None
+        self.started = None
+        self.types = {}
+        self.limits = {}
+        self.state = {}
+        for name, ptype, pmin, pmax, value in PROPERTIES:
+            self.types[name] = ptype
+            self.limits[name] = (None if pmin == 'No' else float(pmin),
+                                 None if pmax == 'No' else float(pmax))
+            self.state[name] = value
+        self.exit_code = None
+
+    def write(self, line):
+        self.out.write(line.encode('utf-8'))
+
+    def answer(self, line):
+        if self.noise:
+            status = _STATUS.format(self.state['time_pos'])
+            self.write(status * self.noise)
+        self.write(line)
+
+    def clamp(self, name, value):
+        pmin, pmax = self.limits[name]
+        if pmin is not None and value < pmin:
+            value = type(value)(pmin)
+        if pmax is not None and value > pmax:
+            value = type(value)(pmax)
+        return value
+
+    def handle(self, line):
+        cmd, _, rest = line.strip().partition(' ')
+        if cmd.startswith('pausing'):
+            cmd, _, rest = rest.strip().partition(' ')
+        if not cmd:
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        handler = getattr(self, 'cmd_' + cmd, None)
+        if handler is not None:
+            handler(rest.strip())
+
+    def cmd_get_property(self, args):
+        name = args
+        if name not in self.types:
+            self.answer('ANS_ERROR=PROPERTY_UNKNOWN\n')
+        elif self.state[name] is None:
+            self.answer('ANS_ERROR=PROPERTY_UNAVAILABLE\n')
+        else:
+            value = _format(self.types[name], self.state[name])
+            self.answer('ANS_{0}={1}\n'.format(name, value))
+
+    def cmd_set_property(self, args):
+        name, _, value = args.partition(' ')
+        if name not in self.types:
+            return
+        ptype = self.types[name]
+        try:
+            value = _parse(ptype, _unquote(value.strip()))
+        except ValueError:
+            return
+        if ptype in ('Integer', 'Position', 'Float', 'Time'):
+            value = self.clamp(name, value)
+        self.state[name] = value
+
+    def cmd_step_property(self, args):
+        args = args.split()
+        if not args or args[0] not in self.types:
+            return
+        name = args[0]
+        ptype = self.types[name]
+        value = self.state[name]
+        if value is None:
+            return
+        try:
+            step = float(args[1]) if len(args) > 1 else 1.0
+            direction = -1 if len(args) > 2 and int(args[2]) < 0 else 1
+        except ValueError:
+            return
+        if ptype == 'Flag':
+            self.state[name] = not value
+        elif ptype in ('Integer', 'Position', 'Float', 'Time'):
+            value += type(value)(step) * direction
+            self.state[name] = self.clamp(name, value)
+
+    def cmd_quit(self, args):
+        try:
+            self.exit_code = int(args) if args else 0
+        except ValueError:
+            self.exit_code = 0
+
+    def cmd_loadfile(self, args):
+        try:
+            path = shlex.split(args)[0]
+        except (ValueError, IndexError):
+            return
+        self.state['path'] = path
+        self.state['filename'] = os.path.basename(path)
+        self.state['time_pos'] = 0.0
+        self.state['pause'] = False
+        self.write('\nPlaying {0}.\nStarting playback...\n'.format(path))
+        self.stop_timer()
+        if self.duration:
+            self.remaining = self.duration
+            self.start_timer()
+
+    def cmd_pause(self, args):
+        self.state['pause'] = not self.state['pause']
+        if self.state['pause']:
+            if self.stop_timer():
+                self.remaining -= time.time() - self.started
+        elif self.remaining is not None:
+            self.start_timer()
+
+    def cmd_seek(self, args):
+        args = args.split()
+        if not args or self.state['time_pos'] is None:
+            return
+        try:
+            value = float(args[0])
+            mode = int(args[1]) if len(args) > 1 else 0
+        except ValueError:
+            return
+        if mode == 2:
+            self.state['time_pos'] = self.clamp('time_pos', value)
+        elif mode == 0:
+            self.state['time_pos'] = self.clamp('time_pos', self.state['time_pos'] + value)
+
+    def cmd_stop(self, args):
+        self.stop_timer()
+        self.remaining = None
+        self.unload()
+        self.write('\nEOF code: 4\n')
+
+    def unload(self):
+        # Idle; nothing is loaded anymore
+        self.state['path'] = None
+        self.state['filename'] = None
+
+    def start_timer(self):
+        self.started = time.time()
+        self.timer = threading.Timer(max(self.remaining, 0.0), self.end_of_file)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def stop_timer(self):
+        """Returns True if the file was playing"""
+        timer, self.timer = self.timer, None
+        if timer is None:
+            return False
+        timer.cancel()
+        return True
+
+    def end_of_file(self):
+        self.timer = None
+        self.remaining = None
+        self.unload()
+        self.write('\nEOF code: 1\n')
+        self.out.flush()
+
+    def run(self, stdin):
+        while self.exit_code is None:
+            line = stdin.readline()
+            if not line:
+                return 0
+            self.handle(line.decode('utf-8', 'ignore'))
+            self.out.flush()
+        return self.exit_code
+
+
+def main(argv):
+    startup = float(os.environ.get('FAKE_MPLAYER_STARTUP', '0') or 0)
+    if startup:
+        time.sleep(startup)
+    out = getattr(sys.stdout, 'buffer', sys.stdout)
+    if '-list-properties' in argv:
+        lines = [VERSION, '', ' Name                 Type            Min        Max']
+        lines.extend(' {0:<20} {1:<15} {2:<10} {3}'.format(*prop[:4])
+                     for prop in PROPERTIES)
+        lines.append('\nExiting... (End of file)\n')
+        out.write('\n'.join(lines).encode('utf-8'))
+        return 0
+    if 'cmdlist' in argv:
+        lines = ['{0:<20} {1}'.format(name, args) for name, args in COMMANDS]
+        out.write(('\n'.join(lines) + '\n').encode('utf-8'))
+        return 0
+    fake = FakeMPlayer(out, float(os.environ.get('FAKE_MPLAYER_LATENCY', '0') or 0),
+                       int(os.environ.get('FAKE_MPLAYER_NOISE', '0') or 0),
+                       float(os.environ.get('FAKE_MPLAYER_DURATION', '0') or 0))
+    if '-slave' not in argv:
+        # Nothing to play; behave like MPlayer with a file that ends at once
+        out.write(b'\nExiting... (End of file)\n')
+        return 0
+    return fake.run(getattr(sys.stdin, 'buffer', sys.stdin))
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except (KeyboardInterrupt, BrokenPipeError):
+        sys.exit(1)
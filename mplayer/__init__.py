@@ -6,13 +6,42 @@ Classes:
 
 Player -- provides a clean, Pythonic interface to MPlayer
 CmdPrefix -- contains the prefixes that can be used with MPlayer commands
+Overflow -- contains the policies for a full command queue
 Step -- use with property access to implement the 'step_property' command
 
 AsyncPlayer -- Player subclass with asyncore integration (POSIX only)
+AsyncioPlayer -- Player subclass with native asyncio integration
+MuxPlayer -- Player subclass whose I/O is multiplexed over shared threads
 GPlayer -- Player subclass with GTK/GObject integration
 GeventPlayer -- Player subclass with gevent integration
 QtPlayer -- Player subclass with Qt integration
 
+PlayerPool -- keeps a number of idle Player instances ready for use
+Playlist -- gapless playback of a list of files (see mplayer.playlist)
+Supervisor -- respawns a Player whose MPlayer crashed and restores its state
+             (see mplayer.supervisor)
+MediaInfo -- media properties of a file, as returned by identify()
+MediaIndex -- persistent SQLite index of MediaInfo records (see mplayer.index)
+
+Exceptions:
+
+PlayerError -- base class of the errors of Player.submit() and Player.get_async()
+AnswerTimeout -- MPlayer didn't answer in time
+PlayerExited -- MPlayer isn't running or exited before completing a request
+RequestDropped -- a request was discarded by an overflow policy
+AnswerLost -- MPlayer answered a later request instead of a request
+
+Functions:
+
+identify -- identify many files concurrently (see mplayer.probe)
+
+Modules:
+
+events -- typed events parsed from MPlayer's output (see Player.stdout.subscribe)
+thumbnail -- concurrent extraction of single frames as PNG or JPEG bytes
+frames -- decoded audio and video streamed through a pipe into reusable buffers
+analysis -- waveform peaks and loudness of a file's audio (requires NumPy)
+
 GtkPlayerView -- provides a basic (as of now) PyGTK widget that embeds MPlayer
 QPlayerView -- provides a PyQt4 widget similar to GtkPlayerView in functionality
 
@@ -30,10 +59,20 @@ __all__ = [
     'STDOUT',
     'Player',
     'CmdPrefix',
-    'Step'
+    'Overflow',
+    'Step',
+    'PlayerError',
+    'AnswerTimeout',
+    'PlayerExited',
+    'RequestDropped',
+    'AnswerLost',
+    'MediaInfo',
+    'identify'
     ]
 
 # Import here for convenience.
 from subprocess import PIPE, STDOUT
 from mplayer.core import Player, Step
-from mplayer.misc import CmdPrefix
+from mplayer.misc import CmdPrefix, Overflow, PlayerError, AnswerTimeout, PlayerExited, \
+    RequestDropped, AnswerLost
+from mplayer.probe import MediaInfo, identify
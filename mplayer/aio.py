@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import asyncio
+import traceback
+from subprocess import PIPE
+
+from mplayer.core import Player
+from mplayer import core, mtypes, misc
+
+
+__all__ = ['AsyncioPlayer']
+
+
+class AsyncioPlayer(Player):
+    """Player subclass with native asyncio integration.
+
+    The MPlayer process is started with asyncio.create_subprocess_exec() and
+    its stdout and stderr are read by tasks of the running event loop, so a
+    single loop can drive many players without any threads. Property reads
+    and generated methods return awaitables:
+
+        p = AsyncioPlayer()
+        await p.spawn()
+        await p.loadfile('/path/to/file.mkv')
+        length = await p.length
+        pos = await p.get('time_pos')
+        async for line in p.stdout:
+            print(line)
+
+    Property writes are sent immediately and need not be awaited. Instances
+    are also asynchronous context managers which spawn() on entry and quit()
+    on exit. observe(), get_async() and submit() are backed by tasks of the
+    running event loop instead of threads.
+
+    Note that before Python 3.12, asyncio's default child watcher uses a
+    thread per child process. Install asyncio.PidfdChildWatcher (Linux) to
+    avoid that when running many players.
+
+    """
+
+    def __init__(self, args=(), stdout=PIPE, stderr=None):
+        """Arguments:
+
+        args -- additional MPlayer arguments (default: ())
+        stdout -- handle for MPlayer's stdout (default: subprocess.PIPE)
+        stderr -- handle for MPlayer's stderr (default: None)
+
+        """
+        super(AsyncioPlayer, self).__init__(args, autospawn=False)
+        self._stdout = _StdoutWrapper(handle=stdout)
+        self._stderr = _StderrWrapper(handle=stderr)
+        self._loop = None
+        self._exited = None
+        # (name, callback) -> task which polls the property
+        self._observers = {}
+
+    async def __aenter__(self):
+        await self.spawn()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        exited = self.quit()
+        if exited is not None:
+            await exited
+
+    async def spawn(self):
+        """Spawn the underlying MPlayer process."""
+        if self.is_alive():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._proc = await asyncio.create_subprocess_exec(self.exec_path,
+            *self._args, stdin=PIPE, stdout=self._stdout._handle,
+            stderr=self._stderr._handle)
+        self._exited = self._loop.create_task(self._proc.wait())
+        # Overflow.BLOCK can't wait inside the event loop; it drops stale
+        # requests instead
+        self._stdout._router.configure(self.answer_queue_size, self.answer_overflow)
+        if self._propcache is not None:
+            self._propcache.invalidate()
+        if self._proc.stdout is not None:
+            self._stdout._attach(self._proc.stdout)
+        if self._proc.stderr is not None:
+            self._stderr._attach(self._proc.stderr)
+
+    def quit(self, retcode=0):
+        """Terminate the underlying MPlayer process.
+        Returns an awaitable for the exit status of MPlayer, or None if
+        MPlayer was never spawned or its event loop is closed.
+
+        """
+        if not isinstance(retcode, mtypes.IntegerType.type):
+            raise TypeError('expected int for retcode')
+        if not self.is_alive():
+            return self._exited
+        if self._loop.is_closed():
+            # Outlived its event loop, e.g. when called from __del__() or
+            # at exit; the pipes can't be written anymore
+            return
+        if self._proc.stdout is not None:
+            self._stdout._detach()
+        if self._proc.stderr is not None:
+            self._stderr._detach()
+        self._send(self._format_command('quit', mtypes.IntegerType.adapt(retcode)))
+        return self._exited
+
+    def is_alive(self):
+        """Check if MPlayer process is alive.
+        Returns True if alive, else, returns False.
+
+        """
+        # The returncode is set by the event loop's child watcher
+        return self._proc is not None and self._proc.returncode is None
+
+    async def get(self, name, timeout=None):
+        """Get the value of a property (see Player.get())."""
+        return (await self.get_properties([name], timeout))[name]
+
+    async def get_properties(self, names, timeout=None):
+        """Get the values of several properties in a single round trip
+        (see Player.get_properties()).
+
+        """
+        result = dict.fromkeys(names)
+        props = [(name, ) + self._lookup_property(name) for name in result]
+        cache = self._propcache
+        if cache is not None:
+            props = cache.fill(result, props)
+            epoch = cache.epoch
+        waiters = self._send_queries([pname for name, pname, ptype in props])
+        if waiters is None:
+            return result
+        futures = [waiter.future for waiter in waiters]
+        if timeout is None:
+            timeout = self.timeout
+        done, pending = await asyncio.wait(futures, timeout=timeout)
+        for fut in pending:
+            # The router discards the answer if it arrives later
+            fut.cancel()
+        if pending:
+            self._stdout._router.timed_out(len(pending))
+        for (name, pname, ptype), fut in zip(props, futures):
+            # Failed requests (see _Waiter.fail()) have no value either
+            if fut in done and fut.exception() is None:
+                ans = self._parse_answer(fut.result())
+                if ans is not None:
+                    result[name] = ptype.convert(ans)
+                    if cache is not None:
+                        cache.put(pname, result[name], epoch)
+        return result
+
+    def get_async(self, name, timeout=None):
+        """Get the value of a property without waiting for it.
+
+        Returns an asyncio.Task of the converted value, which is None if
+        the property is unavailable. Like the future of Player.get_async(),
+        it fails with AnswerTimeout, PlayerExited, RequestDropped or
+        AnswerLost.
+
+        """
+        return asyncio.ensure_future(self._get_async(name, timeout))
+
+    async def _get_async(self, name, timeout):
+        pname, ptype = self._lookup_property(name)
+        cache = self._propcache
+        if cache is not None:
+            res = cache.get(pname, misc._MISSING)
+            if res is not misc._MISSING:
+                return res
+            epoch = cache.epoch
+        waiters = self._send_queries([pname])
+        if waiters is None:
+            raise misc.PlayerExited('MPlayer is not running')
+        future = waiters[0].future
+        if timeout is None:
+            timeout = self.timeout
+        done, pending = await asyncio.wait([future], timeout=timeout)
+        if pending:
+            # The router discards the answer if it arrives later
+            future.cancel()
+            self._stdout._router.timed_out()
+            raise misc.AnswerTimeout('no answer for {0!r}'.format(pname))
+        ans = self._parse_answer(future.result())
+        if ans is None:
+            return
+        res = ptype.convert(ans)
+        if cache is not None:
+            cache.put(pname, res, epoch)
+        return res
+
+    def submit(self, name, *args):
+        """Send a command without waiting for it (see Player.submit()).
+        Returns an asyncio.Future which resolves to None once the command
+        is queued for writing, or fails with PlayerExited if MPlayer isn't
+        running.
+
+        """
+        method = getattr(self, name, None)
+        if getattr(getattr(method, '__func__', None), '_encode', None) is None:
+            raise ValueError('unknown command: {0}'.format(name))
+        # Called first for the checks of args
+        future = asyncio.ensure_future(method(*args))
+        if self.is_alive():
+            return future
+        future = asyncio.get_running_loop().create_future()
+        future.set_exception(misc.PlayerExited('MPlayer is not running'))
+        return future
+
+    def observe(self, name, callback, interval=1.0):
+        """Call callback(name, value) whenever the value of a property
+        changes (see Player.observe()).
+
+        The property is polled every interval seconds by a task of the
+        running event loop, from which callback is called.
+
+        """
+        if not hasattr(callback, '__call__'):
+            raise TypeError('expected callable for callback')
+        if interval <= 0:
+            raise ValueError('interval must be positive')
+        key = (name, callback)
+        if key not in self._observers:
+            self._observers[key] = asyncio.ensure_future(
+                self._observe(name, callback, interval))
+
+    def unobserve(self, name=None, callback=None):
+        """Stop observing one or all properties, for one or all callbacks"""
+        pname = self._lookup_property(name)[0] if name is not None else None
+        for key in list(self._observers):
+            if pname is not None and self._lookup_property(key[0])[0] != pname:
+                continue
+            if callback is None or key[1] == callback:
+                self._observers.pop(key).cancel()
+
+    async def _observe(self, name, callback, interval):
+        value = misc._MISSING
+        while True:
+            if self.is_alive():
+                new = await self.get(name)
+                if value is misc._MISSING or new != value:
+                    value = new
+                    try:
+                        callback(name, value)
+                    except Exception:
+                        traceback.print_exc(file=sys.stderr)
+            await asyncio.sleep(interval)
+
+    def _propget(self, pname, ptype):
+        return self.get(pname)
+
+    def _send_queries(self, pnames):
+        if not pnames or not self.is_alive() or self._proc.stdout is None:
+            return
+        waiters = [_Waiter(pname, self._loop) for pname in pnames]
+        if self._metrics is not None:
+            sent = misc._clock()
+            for waiter in waiters:
+                waiter.sent = sent
+        self._send(self._encode_queries(pnames), waiters)
+        return waiters
+
+    def _send(self, cmd, waiters=(), force=False):
+        if not isinstance(cmd, bytes):
+            cmd = cmd.encode('utf-8', 'ignore')
+        # Writes are buffered by the transport and never block the loop
+        for waiter in waiters:
+            self._stdout._router.register(waiter)
+        self._proc.stdin.write(cmd)
+
+    def _run_command(self, name, *args):
+        """Send a command to MPlayer.
+        Returns an awaitable which resolves to None once the command
+        is queued for writing.
+
+        """
+        return self._run_encoded(name, *core._encode_command(name, args))
+
+    def _run_encoded(self, name, cmd, prefixed=True):
+        if self.is_alive():
+            if self._propcache is not None and not name.endswith('_property'):
+                self._propcache.command(name)
+            if prefixed:
+                cmd = core._encode_prefix(self.cmd_prefix) + cmd
+            self._send(cmd)
+        loop = self._loop or asyncio.get_running_loop()
+        fut = loop.create_future()
+        fut.set_result(None)
+        return fut
+
+
+class _Waiter(object):
+    """Future-based counterpart of misc._Waiter"""
+
+    __slots__ = ('key', 'future', 'sent')
+
+    def __init__(self, key, loop):
+        super(_Waiter, self).__init__()
+        self.key = key
+        self.future = loop.create_future()
+        self.sent = None
+
+    @property
+    def cancelled(self):
+        return self.future.done()
+
+    def set(self, value):
+        if not self.future.done():
+            self.future.set_result(value)
+
+    def fail(self, exc):
+        """The request failed with exc (a PlayerError) before it was
+        answered. get_properties() turns this into None.
+
+        """
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+class _StderrWrapper(misc._StderrWrapper):
+
+    def __init__(self, **kwargs):
+        super(_StderrWrapper, self).__init__(**kwargs)
+        self._task = None
+        self._iterators = []
+
+    def __aiter__(self):
+        """Iterate over the lines until MPlayer exits"""
+        return self._iter_lines()
+
+    async def _iter_lines(self):
+        if self._source is None:
+            return
+        lines = asyncio.Queue()
+        self._iterators.append(lines)
+        self.connect(lines.put_nowait)
+        try:
+            while True:
+                line = await lines.get()
+                # None is put by _detach()
+                if line is None:
+                    return
+                yield line
+        finally:
+            self.disconnect(lines.put_nowait)
+            if lines in self._iterators:
+                self._iterators.remove(lines)
+
+    def _attach(self, source):
+        super(_StderrWrapper, self)._attach(source)
+        # The task may only start after quit() detached this wrapper
+        self._task = asyncio.ensure_future(self._task_func(source))
+
+    def _detach(self):
+        super(_StderrWrapper, self)._detach()
+        iterators, self._iterators = self._iterators, []
+        for lines in iterators:
+            lines.put_nowait(None)
+
+    async def _task_func(self, source):
+        while self._source is source:
+            lines = self._reader.feed(await source.read(65536))
+            # Don't publish anything after quit() detached this wrapper
+            if self._source is not source:
+                break
+            if lines is None:
+                # Automatically detach when MPlayer dies unexpectedly
+                self._detach()
+                break
+            self._process_lines(lines)
+
+
+class _StdoutWrapper(_StderrWrapper, misc._StdoutWrapper):
+    pass
+
+
+if __name__ == '__main__':
+
+    async def main(path):
+        async with AsyncioPlayer(['-msglevel', 'global=6']) as player:
+            await player.loadfile(path)
+
+            async def status():
+                while player.is_alive():
+                    print('time_pos = {0}'.format(await player.time_pos))
+                    await asyncio.sleep(1.0)
+            task = asyncio.ensure_future(status())
+            async for line in player.stdout:
+                if line.startswith('EOF code'):
+                    break
+                print('LOG: {0}'.format(line))
+            task.cancel()
+
+    asyncio.run(main(sys.argv[1]))
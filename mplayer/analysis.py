@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+"""Waveform and loudness analysis of the audio of a file
+
+The audio is decoded by MPlayer (see mplayer.frames.AudioStream) and
+processed chunk by chunk with NumPy, so memory use doesn't depend on the
+length of the track. Loudness is measured as in ITU-R BS.1770 (K-weighted,
+gated); the K-weighting filter requires SciPy and is skipped without it.
+
+    info = analyze('/path/to/track.flac')
+    player.loadfile(info.path)
+    player.volume = ...  # or start MPlayer with -af volume=<info.gain()>
+
+NumPy is required.
+
+"""
+
+import os
+import json
+import math
+import hashlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    from scipy.signal import lfilter
+except ImportError:
+    lfilter = None
+
+from mplayer.core import Player
+from mplayer.frames import AudioStream
+
+
+__all__ = ['AudioAnalysis', 'analyze']
+
+
+class AudioAnalysis(object):
+    """Results of analyze()
+
+    path -- the path or URL which was analyzed
+    duration -- length of the decoded audio in seconds
+    samplerate, channels -- format the audio was decoded to
+    peak -- sample peak in dBFS (None for digital silence)
+    loudness -- integrated loudness in LUFS (None if too short or silent)
+    k_weighted -- False if loudness was measured without K-weighting
+                  (SciPy not available)
+    peaks_per_second -- resolution of peaks
+    peaks -- waveform summary; list of (min, max) tuples of the samples of
+             all channels, scaled to -1.0..1.0
+
+    """
+
+    __slots__ = ('path', 'duration', 'samplerate', 'channels', 'peak',
+                 'loudness', 'k_weighted', 'peaks_per_second', 'peaks')
+
+    def __init__(self, **kwargs):
+        super(AudioAnalysis, self).__init__()
+        for name in self.__slots__:
+            setattr(self, name, kwargs.get(name))
+
+    def __repr__(self):
+        return '<AudioAnalysis {0!r} loudness={1!r} peak={2!r}>'.format(
+            self.path, self.loudness, self.peak)
+
+    def gain(self, target=-23.0):
+        """Returns the gain in dB which brings the loudness to target LUFS,
+        limited so that the peak stays at or below 0 dBFS.
+        Returns 0.0 if the loudness is unknown.
+
+        """
+        if self.loudness is None:
+            return 0.0
+        gain = target - self.loudness
+        if self.peak is not None:
+            gain = min(gain, -self.peak)
+        return gain
+
+    def _to_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+# Version of the cache entries; bump when the analysis changes
+_CACHE_FORMAT = 1
+# Length of the BS.1770 gating blocks (400 ms) in steps of 100 ms
+_BLOCK_STEPS = 4
+
+
+def analyze(path, peaks_per_second=10, samplerate=48000, channels=2,
+            cache_dir=None, args=(), exec_path=None):
+    """Decode the audio of path and analyze it. Returns an AudioAnalysis.
+
+    Results for local files are cached in cache_dir, keyed on the path,
+    size and mtime of the file and the parameters of the analysis.
+    Raises OSError if MPlayer fails or decodes no audio at all; such
+    results aren't cached.
+
+    peaks_per_second -- resolution of the waveform summary (default: 10)
+    samplerate -- decode at this rate in Hz (default: 48000)
+    channels -- decode to this number of channels (default: 2)
+    cache_dir -- directory of the cache; '' disables caching
+                 (default: Player.cache_dir)
+    args -- additional MPlayer arguments (default: ())
+    exec_path -- path to the MPlayer executable (default: Player.exec_path)
+
+    """
+    if numpy is None:
+        raise ImportError('mplayer.analysis requires NumPy')
+    if peaks_per_second <= 0:
+        raise ValueError('peaks_per_second must be positive')
+    if cache_dir is None:
+        cache_dir = Player.cache_dir
+    cache_file = None
+    if cache_dir:
+        cache_file = _cache_file(cache_dir, path, peaks_per_second, samplerate,
+                                 channels, args)
+    if cache_file is not None:
+        result = _load(cache_file)
+        if result is not None:
+            return result
+    stream = AudioStream(path, samplerate, channels, chunk_frames=samplerate,
+                         args=args, exec_path=exec_path, as_array=True)
+    result = _Analyzer(samplerate, channels, peaks_per_second).run(stream)
+    if stream.returncode or not result.duration:
+        raise OSError('MPlayer failed to decode {0!r} (exit status {1})'.format(
+            path, stream.returncode))
+    result.path = path
+    if cache_file is not None:
+        _save(cache_file, result)
+    return result
+
+
+class _Analyzer(object):
+
+    def __init__(self, samplerate, channels, peaks_per_second):
+        super(_Analyzer, self).__init__()
+        self.samplerate = samplerate
+        self.channels = channels
+        self.peaks_per_second = peaks_per_second
+        self.bucket = max(int(round(samplerate / float(peaks_per_second))), 1)
+        self.step = samplerate // 10
+        self.filters = _k_weighting(samplerate) if lfilter is not None else []
+        # Channel weights of BS.1770; surround channels count more, LFE not at all
+        self.weights = numpy.ones(channels)
+        if channels == 6:
+            # MPlayer's 5.1 order: L R Ls Rs C LFE
+            self.weights[:] = [1.0, 1.0, 1.41, 1.41, 1.0, 0.0]
+
+    def run(self, stream):
+        frames = 0
+        peak = 0.0
+        lows, highs = [], []
+        wave = numpy.empty((0, 2))
+        power = numpy.empty((0, self.channels))
+        steps = []
+        zi = [numpy.zeros((2, self.channels)) for _ in self.filters]
+        for chunk in stream:
+            x = chunk.astype(numpy.float64)
+            x /= 32768.0
+            frames += len(x)
+            peak = max(peak, float(numpy.abs(x).max()))
+            # Waveform: min and max of all channels per bucket
+            wave = numpy.concatenate([wave, numpy.column_stack([x.min(axis=1), x.max(axis=1)])])
+            n = len(wave) - len(wave) % self.bucket
+            if n:
+                buckets = wave[:n].reshape(-1, self.bucket, 2)
+                lows.append(buckets[:, :, 0].min(axis=1))
+                highs.append(buckets[:, :, 1].max(axis=1))
+                wave = wave[n:]
+            # Loudness: mean square per channel per 100 ms step
+            for i, (b, a) in enumerate(self.filters):
+                x, zi[i] = lfilter(b, a, x, axis=0, zi=zi[i])
+            power = numpy.concatenate([power, x * x])
+            n = len(power) - len(power) % self.step
+            if n:
+                steps.append(power[:n].reshape(-1, self.step, self.channels).mean(axis=1))
+                power = power[n:]
+        if len(wave):
+            lows.append(wave[:, 0].min(keepdims=True))
+            highs.append(wave[:, 1].max(keepdims=True))
+        peaks = []
+        if lows:
+            peaks = [(round(float(lo), 4), round(float(hi), 4)) for lo, hi in
+                     zip(numpy.concatenate(lows), numpy.concatenate(highs))]
+        return AudioAnalysis(
+            duration=frames / float(self.samplerate),
+            samplerate=self.samplerate, channels=self.channels,
+            peak=20 * math.log10(peak) if peak > 0 else None,
+            loudness=self._loudness(steps), k_weighted=bool(self.filters),
+            peaks_per_second=self.peaks_per_second, peaks=peaks)
+
+    def _loudness(self, steps):
+        if not steps:
+            return
+        steps = numpy.concatenate(steps)
+        if len(steps) < _BLOCK_STEPS:
+            return
+        # 400 ms blocks overlapping by 75%
+        blocks = sum(steps[i:len(steps) - _BLOCK_STEPS + 1 + i]
+                     for i in range(_BLOCK_STEPS)) / _BLOCK_STEPS
+        power = (blocks * self.weights).sum(axis=1)
+        with numpy.errstate(divide='ignore'):
+            loudness = -0.691 + 10 * numpy.log10(power)
+        # Absolute gate at -70 LUFS, then relative gate 10 LU below
+        gated = power[loudness > -70.0]
+        if not len(gated):
+            return
+        relative = -0.691 + 10 * math.log10(gated.mean()) - 10.0
+        gated = power[(loudness > -70.0) & (loudness > relative)]
+        if not len(gated):
+            return
+        return -0.691 + 10 * math.log10(gated.mean())
+
+
+def _k_weighting(samplerate):
+    """Returns the (b, a) coefficients of the two K-weighting biquads
+    (high shelf and high pass) for samplerate, as in libebur128
+
+    """
+    f0, gain, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = math.tan(math.pi * f0 / samplerate)
+    vh = 10 ** (gain / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf = ([(vh + vb * k / q + k * k) / a0, 2.0 * (k * k - vh) / a0,
+              (vh - vb * k / q + k * k) / a0],
+             [1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0])
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = math.tan(math.pi * f0 / samplerate)
+    a0 = 1.0 + k / q + k * k
+    highpass = ([1.0, -2.0, 1.0],
+                [1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0])
+    return [shelf, highpass]
+
+
+def _cache_file(cache_dir, path, peaks_per_second, samplerate, channels, args):
+    try:
+        st = os.stat(path)
+    except OSError:
+        # Not a local file (e.g. a URL); don't cache
+        return
+    key = json.dumps([_CACHE_FORMAT, os.path.abspath(path), st.st_size, st.st_mtime,
+                      peaks_per_second, samplerate, channels, list(args),
+                      lfilter is not None])
+    name = hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json'
+    return os.path.join(cache_dir, 'analysis', name)
+
+
+def _load(cache_file):
+    try:
+        with open(cache_file) as f:
+            data = json.load(f)
+    except (OSError, IOError, ValueError):
+        return
+    try:
+        data['peaks'] = [tuple(p) for p in data['peaks']]
+    except (KeyError, TypeError):
+        # Malformed; analyze the file again
+        return
+    return AudioAnalysis(**data)
+
+
+def _save(cache_file, result):
+    try:
+        os.makedirs(os.path.dirname(cache_file))
+    except OSError:
+        pass
+    tmp = '{0}.{1}'.format(cache_file, os.getpid())
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(result._to_dict(), f)
+        os.rename(tmp, cache_file)
+    except (OSError, IOError):
+        # The cache is an optimization only
+        pass
@@ -22,6 +22,7 @@ import asyncore
 from subprocess import PIPE
 
 from mplayer.core import Player
+from mplayer.events import EofEvent
 from mplayer import misc
 
 
@@ -85,31 +86,26 @@ class _FileDispatcher(asyncore.file_dispatcher):
 
 if __name__ == '__main__':
     import sys
-    import time
-    from threading import Thread
 
     player = AsyncPlayer(['-really-quiet', '-msglevel', 'global=6'] + sys.argv[1:], stderr=PIPE)
 
     # Called for every line read from stdout
     def handle_data(line):
-        if not line.startswith('EOF code'):
-            print('LOG: {0}'.format(line))
-        else:
-            player.quit()
+        print('LOG: {0}'.format(line))
+    # Called for the 'EOF code: N' line
+    def handle_eof(event):
+        player.quit()
     # Called for every line read from stderr
     def log_error(msg):
         print('ERROR: {0}'.format(msg))
     # Connect subscribers
     player.stdout.connect(handle_data)
     player.stderr.connect(log_error)
+    player.stdout.subscribe(EofEvent, handle_eof)
 
-    # Print time_pos every 1.0 second, just to demonstrate multithreading
-    def status(p):
-        while p.is_alive():
-            print('time_pos = {0}'.format(p.time_pos))
-            time.sleep(1.0)
-    t = Thread(target=status, args=(player,))
-    t.daemon = True
-    t.start()
+    # Print time_pos whenever it changes (checked every 1.0 second)
+    def status(name, value):
+        print('{0} = {1}'.format(name, value))
+    player.observe('time_pos', status, interval=1.0)
     # Enter loop
     asyncore.loop()
@@ -17,24 +17,72 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with mplayer.py.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import json
 import shlex
 import atexit
+import hashlib
+import tempfile
 import weakref
 import subprocess
 import sys
+import time
 from functools import partial
-from threading import Thread
+from operator import methodcaller
+from threading import Thread, Lock
+try:
+    from concurrent.futures import Future
+except ImportError:
+    # Python 2 without the 'futures' backport; see get_async() and submit()
+    Future = None
 try:
     import queue
 except ImportError:
     import Queue as queue
-
-from mplayer import mtypes, misc
+try:
+    from shutil import which as _shutil_which
+except ImportError:
+    # Python 2
+    _shutil_which = None
+from mplayer import mtypes, misc, events
 
 
 __all__ = ['Player', 'Step']
 
 
+# Commands which are never prefixed
+_UNPREFIXED = frozenset(['quit', 'pause', 'stop', 'loadfile'])
+# cmd_prefix -> encoded prefix, including the separating space
+_prefixes = {None: b'', '': b''}
+# pname -> encoded 'get_property' command, without the prefix
+_queries = {}
+
+
+def _encode_prefix(prefix):
+    try:
+        return _prefixes[prefix]
+    except KeyError:
+        encoded = _prefixes[prefix] = prefix.encode('utf-8') + b' '
+        return encoded
+
+
+def _encode_command(name, args):
+    """Returns the command (bytes, without the prefix) and whether it
+    should be prefixed. args are strings.
+
+    """
+    cmd = ' '.join((name, ) + tuple(args)).encode('utf-8', 'ignore') + b'\n'
+    return cmd, name not in _UNPREFIXED
+
+
+def _encode_query(pname):
+    try:
+        return _queries[pname]
+    except KeyError:
+        encoded = _queries[pname] = 'get_property {0}\n'.format(pname).encode('utf-8')
+        return encoded
+
+
 def _quit(player):
     try:
         player.quit()
@@ -42,6 +90,106 @@ def _quit(player):
         pass
 
 
+def _exited(ref, proc):
+    player = ref()
+    if player is not None:
+        player._handle_exit(proc)
+
+
+def _which(path):
+    """Resolve path to the absolute path of an executable in PATH"""
+    if os.path.dirname(path):
+        return os.path.abspath(path)
+    if _shutil_which is not None:
+        found = _shutil_which(path)
+        return os.path.abspath(found) if found is not None else None
+    # Like shutil.which(), also try the extensions of PATHEXT on Windows
+    suffixes = ['']
+    if sys.platform == 'win32':
+        suffixes.extend(os.environ.get('PATHEXT', '.COM;.EXE;.BAT;.CMD').split(os.pathsep))
+    for directory in os.environ.get('PATH', os.defpath).split(os.pathsep):
+        for suffix in suffixes:
+            candidate = os.path.join(directory, path + suffix)
+            if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                return os.path.abspath(candidate)
+
+
+def _default_cache_dir():
+    # An empty MPLAYER_PY_CACHE_DIR disables the introspection cache
+    path = os.environ.get('MPLAYER_PY_CACHE_DIR')
+    if path is None:
+        base = os.environ.get('XDG_CACHE_HOME') or \
+               os.path.join(os.path.expanduser('~'), '.cache')
+        path = os.path.join(base, 'mplayer.py')
+    return path or None
+
+
+class _IntrospectionCache(object):
+    """On-disk cache of the parsed introspection output.
+
+    Entries are keyed on the resolved path of the executable and are only
+    valid for as long as its mtime and size don't change. The cache format
+    and the MPlayer version are stored alongside the tables.
+
+    """
+
+    FORMAT = 1
+
+    def __init__(self, exec_path, cache_dir):
+        super(_IntrospectionCache, self).__init__()
+        self._path = None
+        self._key = None
+        path = _which(exec_path)
+        if cache_dir is None or path is None:
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        self._key = {'format': self.FORMAT, 'exec_path': path,
+                     'mtime': st.st_mtime, 'size': st.st_size}
+        digest = hashlib.sha1(path.encode('utf-8')).hexdigest()
+        self._path = os.path.join(cache_dir, 'introspect-{0}.json'.format(digest))
+
+    def load(self):
+        """Returns the cached data or None if missing or stale"""
+        if self._path is None:
+            return
+        try:
+            with open(self._path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if any(data.get(k) != v for k, v in self._key.items()):
+            return
+        if 'version' not in data:
+            return
+        return data
+
+    def save(self, data):
+        """Atomically store data. Failures are silently ignored."""
+        if self._path is None:
+            return
+        entry = dict(self._key)
+        entry.update(data)
+        cache_dir = os.path.dirname(self._path)
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        except (IOError, OSError):
+            return
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            getattr(os, 'replace', os.rename)(tmp, self._path)
+        except (IOError, OSError):
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
 class Step(object):
     """A vector which contains information about the step size and direction.
 
@@ -68,6 +216,8 @@ class Step(object):
             raise TypeError('expected int for direction')
         self._val = mtypes.FloatType.adapt(value)
         self._dir = mtypes.IntegerType.adapt(direction)
+        # Arguments of 'step_property', ready to be sent
+        self._encoded = '{0} {1}\n'.format(self._val, self._dir).encode('utf-8')
 
 
 class Player(object):
@@ -75,20 +225,46 @@ class Player(object):
 
     It exposes MPlayer commands and properties as Python methods and properties,
     respectively. threading.Thread objects are used for processing the data in
-    MPlayer's stdout and stderr.
+    MPlayer's stdout and stderr, and for writing commands to its stdin.
 
     Class attributes:
     cmd_prefix -- prefix for MPlayer commands (default: CmdPrefix.PAUSING_KEEP_FORCE)
+    cmd_queue_size -- maximum number of unsent commands; 0 means unbounded
+                      (default: 256)
+    cmd_overflow -- what to do when the command queue is full
+                    (default: Overflow.BLOCK)
+    answer_queue_size -- maximum number of requests waiting for an answer;
+                         0 means unbounded (default: 1024)
+    answer_overflow -- what to do when that many requests are waiting:
+                       Overflow.DROP_STALE, DROP_OLDEST or BLOCK (wait for
+                       room for up to timeout seconds, then drop stale
+                       requests) (default: Overflow.DROP_STALE)
     exec_path -- path to the MPlayer executable (default: 'mplayer')
     version -- version of the introspected MPlayer executable (default: None)
+    cache_dir -- directory of the introspection cache; None disables caching
+                 (default: $MPLAYER_PY_CACHE_DIR or $XDG_CACHE_HOME/mplayer.py)
+    timeout -- seconds to wait for the value of a property (default: 1.0)
 
     """
 
     _base_args = ('-slave', '-idle', '-really-quiet', '-msglevel', 'global=4',
                   '-input', 'nodefault-bindings')
     cmd_prefix = misc.CmdPrefix.PAUSING_KEEP_FORCE
+    cmd_queue_size = 256
+    cmd_overflow = misc.Overflow.BLOCK
+    answer_queue_size = 1024
+    answer_overflow = misc.Overflow.DROP_STALE
     exec_path = 'mplayer'
     version = None
+    cache_dir = _default_cache_dir()
+    timeout = 1.0
+    _introspected = False
+    # Set once lazy introspection failed, so that it isn't retried
+    _introspection_failed = False
+    _proptable = {}
+    # Have the exit of MPlayer polled where it isn't reported right away
+    # (see misc._ExitWatcher); set by Supervisor
+    _poll_exits = False
 
     def __init__(self, args=(), stdout=subprocess.PIPE, stderr=None, autospawn=True):
         """Arguments:
@@ -104,6 +280,12 @@ class Player(object):
         self._stdout = _StdoutWrapper(handle=stdout)
         self._stderr = _StderrWrapper(handle=stderr)
         self._proc = None
+        # The process watched by misc._exits and the one quit() was called for
+        self._watched = None
+        self._quit_proc = None
+        self._channel = None
+        self._propcache = None
+        self._metrics = None
         # Terminate the MPlayer process when Python terminates
         atexit.register(_quit, weakref.proxy(self))
         if autospawn:
@@ -146,22 +328,149 @@ class Player(object):
             args = map(str, args)
         self._args = self._base_args + tuple(args)
 
+    @property
+    def property_cache(self):
+        """the property cache or None if disabled
+        (see enable_property_cache())
+
+        """
+        return self._propcache
+
+    def enable_property_cache(self, ttls=None, default_ttl=1.0, volatile_ttl=0.1):
+        """Cache the values of properties.
+
+        Static properties (e.g. 'length' or 'metadata') are cached until the
+        loaded file changes. Volatile properties (e.g. 'time_pos') are cached
+        for volatile_ttl seconds, all others for default_ttl seconds. ttls
+        maps MPlayer property names to TTLs which override these defaults;
+        None means until the file changes and 0 disables caching.
+
+        Writing a property updates the cached value, while other commands
+        invalidate all but the static values. Returns the cache, which keeps
+        hit and miss counters (see its stats() method).
+
+        """
+        self._propcache = misc._PropertyCache(ttls, default_ttl, volatile_ttl)
+        return self._propcache
+
+    def disable_property_cache(self):
+        """Stop caching the values of properties."""
+        self._propcache = None
+
+    def enable_stats(self, exporter=None):
+        """Record latency histograms (see stats()).
+
+        If exporter is not None, it's also called as
+        exporter(kind, name, seconds) for every single measurement, from
+        whichever thread made it (e.g. the writer or the reader thread), and
+        should return quickly. kind is one of 'commands', 'properties',
+        'writes' and 'dispatch'.
+
+        Calling this again starts over with empty histograms.
+
+        """
+        self._metrics = misc._Metrics(exporter)
+        self._bind_metrics()
+
+    def disable_stats(self):
+        """Stop recording latency histograms."""
+        self._metrics = None
+        self._bind_metrics()
+
+    def stats(self):
+        """Returns a dict of counters, which are always kept:
+
+        stdout_lines, stderr_lines -- lines read from stdout and stderr
+        dropped_lines -- lines (and events) discarded by full subscriber queues
+        queued_commands -- commands waiting to be written
+        pending_answers -- requests waiting for an answer
+        max_pending_answers -- highest number of requests waiting at once
+        dropped_answers -- requests discarded because too many were pending
+        late_answers -- answers which arrived after their request timed out
+        error_answers -- ANS_ERROR answers
+        timeouts -- requests whose answer didn't arrive in time
+
+        and, if enabled (see enable_stats()), of latency histograms:
+
+        commands -- command name -> time from queueing a command until it
+                    was written to MPlayer's stdin
+        properties -- property name -> time from sending 'get_property'
+                      until the answer was read
+        writes -- 'stdin' -> duration of the writes to MPlayer's stdin
+        dispatch -- 'stdout'/'stderr' -> time spent handling each chunk of
+                    output (routing answers, calling subscribers)
+
+        (AsyncioPlayer records neither commands nor writes, since its
+        writes are buffered by the event loop.) Each histogram is a dict of
+        count, sum, mean, max, p50, p90, p99 (in seconds; percentiles are
+        accurate to a bucket, i.e. within 41%) and buckets, a list of
+        (upper bound, count) pairs of its non-empty buckets.
+
+        """
+        stats = self._stdout.stats()
+        stats['stdout_lines'] = stats.pop('lines')
+        stderr = self._stderr.stats()
+        stats['stderr_lines'] = stderr['lines']
+        stats['dropped_lines'] += stderr['dropped_lines']
+        stats['queued_commands'] = self._channel.qsize() if self._channel is not None else 0
+        if self._metrics is not None:
+            stats.update(self._metrics.snapshot())
+        return stats
+
+    def _bind_metrics(self):
+        metrics = self._metrics
+        self._stdout._metrics = metrics
+        self._stdout._router._metrics = metrics
+        self._stderr._metrics = metrics
+        if self._channel is not None:
+            self._channel._metrics = metrics
+
     def _propget(self, pname, ptype):
+        cache = self._propcache
+        if cache is not None:
+            res = cache.get(pname, misc._MISSING)
+            if res is not misc._MISSING:
+                return res
+            epoch = cache.epoch
         res = self._run_command('get_property', pname)
         if res is not None:
-            return ptype.convert(res)
+            res = ptype.convert(res)
+            if cache is not None:
+                cache.put(pname, res, epoch)
+            return res
+
+    @staticmethod
+    def _gen_propset(pname, ptype, pmin, pmax):
+        """Returns the fset of a property, with the encoded heads of its
+        'set_property' and 'step_property' commands bound once
 
-    def _propset(self, value, pname, ptype, pmin, pmax):
-        if not isinstance(value, Step):
+        """
+        set_head = 'set_property {0} '.format(pname).encode('utf-8')
+        step_head = 'step_property {0} '.format(pname).encode('utf-8')
+        cache_values = ptype in (mtypes.FlagType, mtypes.IntegerType, mtypes.FloatType)
+
+        def propset(self, value):
+            if isinstance(value, Step):
+                self._run_encoded('step_property', step_head + value._encoded)
+                if self._propcache is not None:
+                    self._propcache.invalidate(pname)
+                return
             if not isinstance(value, ptype.type):
                 raise TypeError('expected {0}'.format(ptype.name))
             if pmin is not None and value < pmin:
                 raise ValueError('value must be at least {0}'.format(pmin))
             if pmax is not None and value > pmax:
                 raise ValueError('value must be at most {0}'.format(pmax))
-            self._run_command('set_property', pname, ptype.adapt(value))
-        else:
-            self._run_command('step_property', pname, value._val, value._dir)
+            value = ptype.adapt(value)
+            self._run_encoded('set_property', set_head +
+                              value.encode('utf-8', 'ignore') + b'\n')
+            cache = self._propcache
+            if cache is not None:
+                if cache_values:
+                    cache.update(pname, ptype.convert(value))
+                else:
+                    cache.invalidate(pname)
+        return propset
 
     @staticmethod
     def _gen_propdoc(ptype, pmin, pmax, propset):
@@ -175,21 +484,23 @@ class Player(object):
             doc.append('(read-only)')
         return '\n'.join(doc)
 
-    @classmethod
-    def _generate_properties(cls):
-        # Properties that don't have pmin == pmax == None but are actually read-only
-        read_only = ['length', 'pause', 'stream_end', 'stream_length',
-            'stream_start', 'stream_time_pos']
-        rename = {'pause': 'paused'}
-        proc = subprocess.Popen([cls.exec_path, '-list-properties'],
-                                bufsize=-1, stdout=subprocess.PIPE)
+    @staticmethod
+    def _parse_properties(output):
+        """Parse the output of 'mplayer -list-properties'.
+        Returns a (version, table) tuple where table is a list of
+        [name, type, min, max] string lists.
+
+        """
+        lines = output.decode('utf-8', 'ignore').splitlines()
+        version = None
         # Try to get the version of this executable
         try:
-            cls.version = proc.stdout.readline().decode('utf-8', 'ignore').split()[1]
+            version = lines[0].split()[1]
         except IndexError:
             pass
-        for line in proc.stdout:
-            line = line.decode('utf-8', 'ignore').split()
+        table = []
+        for line in lines[1:]:
+            line = line.split()
             # All property names in -list-properties are in lowercase
             if not line or not line[0].islower():
                 continue
@@ -198,12 +509,24 @@ class Player(object):
             except ValueError:
                 pname, ptype, ptype2, pmin, pmax = line
                 ptype += ' ' + ptype2
+            table.append([pname, ptype, pmin, pmax])
+        return version, table
+
+    @classmethod
+    def _generate_properties(cls, table):
+        # Properties that don't have pmin == pmax == None but are actually read-only
+        read_only = ['length', 'pause', 'stream_end', 'stream_length',
+            'stream_start', 'stream_time_pos']
+        rename = {'pause': 'paused'}
+        cls._proptable = dict(cls._proptable)
+        for pname, ptype, pmin, pmax in table:
             # Get the corresponding Python type and convert pmin and pmax
             ptype = mtypes.type_map[ptype]
             pmin = ptype.convert(pmin) if pmin != 'No' else None
             pmax = ptype.convert(pmax) if pmax != 'No' else None
-            # Generate property fget
-            propget = partial(cls._propget, pname=pname, ptype=ptype)
+            # Generate property fget (looked up on the instance so that
+            # subclasses can override _propget)
+            propget = methodcaller('_propget', pname=pname, ptype=ptype)
             # Most properties with pmin == pmax == None are read-only
             # except for 'sub_delay'
             if (pmin is None and pmax is None and pname != 'sub_delay') or \
@@ -213,70 +536,96 @@ class Player(object):
                 # Min and max values don't make sense for FlagType
                 if ptype is mtypes.FlagType:
                     pmin = pmax = None
-                propset = partial(cls._propset, pname=pname, ptype=ptype,
-                                  pmin=pmin, pmax=pmax)
+                propset = cls._gen_propset(pname, ptype, pmin, pmax)
             # Generate property doc
             propdoc = cls._gen_propdoc(ptype, pmin, pmax, propset)
             prop = property(propget, propset, doc=propdoc)
             # Rename some properties to avoid conflict
-            if pname in rename:
-                pname = rename[pname]
+            name = rename.get(pname, pname)
             # There shouldn't be any naming conflict with hardcoded properties,
             # methods, class attributes, etc.
-            assert not hasattr(cls, pname), "name conflict for '{0}'".format(pname)
-            setattr(cls, pname, prop)
-
-    @staticmethod
-    def _process_args(req, types, *args):
-        """Performs type checking and adaptation of arguments"""
-        # Discard None only from optional args
-        args = list(args[:req]) + [x for x in args[req:] if x is not None]
-        for i, arg in enumerate(args):
-            if not isinstance(arg, types[i].type):
-                msg = 'expected {0} for argument {1}'.format(types[i].name, i + 1)
-                raise TypeError(msg)
-            args[i] = types[i].adapt(arg)
-        return tuple(args)
+            assert not hasattr(cls, name), "name conflict for '{0}'".format(name)
+            setattr(cls, name, prop)
+            # Used by get_properties(), which accepts both names
+            cls._proptable[name] = cls._proptable[pname] = (pname, ptype)
 
     @staticmethod
     def _gen_method_func(name, args):
         sig = []
+        # Code which checks and adapts the required arguments
+        checks = []
+        optional = []
         types = []
-        required = 0
         for i, arg in enumerate(args):
-            if not arg.startswith('['):
-                optional = ''
-                required += 1
+            opt = arg.startswith('[')
+            t = mtypes.type_map[arg.strip('[]')]
+            param = '{0}{1}'.format(t.name, i)
+            types.append(t)
+            if not opt:
+                sig.append(param)
+                checks.append(
+                    '    if not isinstance({param}, _types[{i}].type):\n'
+                    '        raise TypeError(\'expected {tname} for argument {n}\')\n'
+                    '    args.append(_types[{i}].adapt({param}))\n'.format(
+                        param=param, i=i, tname=t.name, n=i + 1))
             else:
-                arg = arg.strip('[]')
-                optional = '=None'
-            t = mtypes.type_map[arg]
-            sig.append('{0}{1}{2}'.format(t.name, i, optional))
-            types.append('mtypes.{0},'.format(t.__name__))
-        sig = ','.join(sig)
-        params = sig.replace('=None', '')
-        types = ''.join(types)
-        args = ', '.join(args)
+                sig.append(param + '=None')
+                optional.append(param)
+        if optional:
+            # None is discarded from the optional args, so their types
+            # are looked up by their position after that
+            checks.append(
+                '    for arg in ({0}, ):\n'
+                '        if arg is not None:\n'
+                '            t = _types[len(args)]\n'
+                '            if not isinstance(arg, t.type):\n'
+                '                raise TypeError(\'expected {{0}} for argument {{1}}\'.format(t.name, len(args) + 1))\n'
+                '            args.append(t.adapt(arg))\n'.format(', '.join(optional)))
+        doc = '{0}({1})'.format(name, ', '.join(args))
+        prefixed = name not in _UNPREFIXED
+        if not args:
+            # Nothing to adapt; the whole command is a constant
+            code = ('def {name}(self):\n'
+                    '    """{doc}"""\n'
+                    '    return self._run_encoded(_name, _cmd, {prefixed})\n'
+                    'def _encode():\n'
+                    '    return _cmd\n')
+        else:
+            encode = ('_head + \' \'.join(args)'
+                      '.encode(\'utf-8\', \'ignore\') + b\'\\n\'')
+            code = ('def {name}({sig}):\n'
+                    '    """{doc}"""\n'
+                    '    args = []\n'
+                    '{checks}'
+                    '    return self._run_encoded(_name, {encode}, {prefixed})\n'
+                    # The same checks, for submit()
+                    'def _encode({encode_sig}):\n'
+                    '    args = []\n'
+                    '{checks}'
+                    '    return {encode}\n')
+        code = code.format(name=name, sig=', '.join(['self'] + sig), doc=doc,
+                           checks=''.join(checks), prefixed=prefixed,
+                           encode=encode if args else None, encode_sig=', '.join(sig))
+        # The byte templates and types are bound once, here
+        namespace = {'_name': name, '_types': tuple(types),
+                     '_cmd': '{0}\n'.format(name).encode('utf-8'),
+                     '_head': '{0} '.format(name).encode('utf-8')}
         # As of now, there's no way of specifying a function's signature
         # without dynamically generating code
-        code = '''
-        def {name}(self, {sig}):
-            """{name}({args})"""
-            args = self._process_args({required}, ({types}), {params})
-            return self._run_command('{name}', *args)
-        '''.format(**locals())
-        local = {}
-        exec(code.strip(), globals(), local)
-        return local[name]
+        exec(code, namespace)
+        func = namespace[name]
+        func._encode = namespace['_encode']
+        func._prefixed = prefixed
+        return func
 
-    @classmethod
-    def _generate_methods(cls):
-        # Commands which have truncated names in -input cmdlist
-        truncated = {'osd_show_property_te': 'osd_show_property_text'}
-        proc = subprocess.Popen([cls.exec_path, '-input', 'cmdlist'],
-                                bufsize=-1, stdout=subprocess.PIPE)
-        for line in proc.stdout:
-            line = line.decode('utf-8', 'ignore')
+    @staticmethod
+    def _parse_commands(output):
+        """Parse the output of 'mplayer -input cmdlist'.
+        Returns a list of [name, args] lists.
+
+        """
+        table = []
+        for line in output.decode('utf-8', 'ignore').splitlines():
             # skip version string at end of mplayer2 output
             if line.startswith("MPlayer"):
                 continue
@@ -285,6 +634,14 @@ class Player(object):
                 continue
             # Separate command name from command args
             name = args.pop(0)
+            table.append([name, args])
+        return table
+
+    @classmethod
+    def _generate_methods(cls, table):
+        # Commands which have truncated names in -input cmdlist
+        truncated = {'osd_show_property_te': 'osd_show_property_text'}
+        for name, args in table:
             # Exclude conflicts with properties or defined attributes
             if hasattr(cls, name):
                 continue
@@ -297,6 +654,17 @@ class Player(object):
             func = cls._gen_method_func(name, args)
             setattr(cls, name, func)
 
+    @classmethod
+    def _run_introspection(cls):
+        """Run the introspection subprocesses concurrently and parse their output"""
+        procs = [subprocess.Popen([cls.exec_path] + args, bufsize=-1,
+                                  stdout=subprocess.PIPE)
+                 for args in (['-list-properties'], ['-input', 'cmdlist'])]
+        props, cmds = [proc.communicate()[0] for proc in procs]
+        version, properties = cls._parse_properties(props)
+        return {'version': version, 'properties': properties,
+                'commands': cls._parse_commands(cmds)}
+
     @classmethod
     def introspect(cls):
         """Introspect the MPlayer executable
@@ -305,12 +673,25 @@ class Player(object):
         $ mplayer -list-properties
         $ mplayer -input cmdlist
 
+        This is done on module load, or on first use if the MPLAYER_PY_LAZY
+        environment variable is set.
+
+        The parsed output is stored in cache_dir and is reused for as long as
+        the executable stays the same (see _IntrospectionCache).
+
         See also http://www.mplayerhq.hu/DOCS/tech/slave.txt
 
         """
         if cls.version is None:
-            cls._generate_properties()
-            cls._generate_methods()
+            cache = _IntrospectionCache(cls.exec_path, cls.cache_dir)
+            data = cache.load()
+            if data is None:
+                data = cls._run_introspection()
+                cache.save(data)
+            cls.version = data['version']
+            cls._generate_properties(data['properties'])
+            cls._generate_methods(data['commands'])
+            cls._introspected = True
 
     def spawn(self):
         """Spawn the underlying MPlayer process."""
@@ -322,10 +703,40 @@ class Player(object):
         self._proc = subprocess.Popen(args, stdin=subprocess.PIPE,
             stdout=self._stdout._handle, stderr=self._stderr._handle,
             close_fds=(sys.platform != 'win32'))
+        self._stdout._router.configure(self.answer_queue_size, self.answer_overflow)
+        if self._channel is not None:
+            # Let the writer thread of the previous process finish
+            self._channel.close()
+        self._channel = self._open_channel()
+        self._channel._metrics = self._metrics
+        if self._propcache is not None:
+            self._propcache.invalidate()
         if self._proc.stdout is not None:
             self._stdout._attach(self._proc.stdout)
         if self._proc.stderr is not None:
             self._stderr._attach(self._proc.stderr)
+        self._watch_exit()
+
+    def _watch_exit(self):
+        """Have the exit of the current process reported to _handle_exit()"""
+        proc = self._proc
+        if self._watched is not proc and misc._exits.watch(
+                proc, partial(_exited, weakref.ref(self)), self._poll_exits):
+            self._watched = proc
+
+    def _handle_exit(self, proc):
+        """Called from the exit watcher thread once proc has exited.
+        Publishes an ExitEvent on stdout.
+
+        """
+        if proc is self._proc and self._channel is not None:
+            # Fail the queued commands now instead of on the next write
+            self._channel.close()
+        self._stdout._publish(events.ExitEvent(proc.returncode, proc is self._quit_proc))
+
+    def _open_channel(self):
+        return misc._CommandChannel(self._proc.stdin, self._stdout._router,
+                                    self.cmd_queue_size, self.cmd_overflow)
 
     def quit(self, retcode=0):
         """Terminate the underlying MPlayer process.
@@ -336,11 +747,15 @@ class Player(object):
             raise TypeError('expected int for retcode')
         if not self.is_alive():
             return
+        self._quit_proc = self._proc
         if self._proc.stdout is not None:
             self._stdout._detach()
         if self._proc.stderr is not None:
             self._stderr._detach()
-        self._run_command('quit', mtypes.IntegerType.adapt(retcode))
+        # Don't let the overflow policy get in the way of quitting
+        cmd = self._format_command('quit', mtypes.IntegerType.adapt(retcode))
+        self._send(cmd, force=True)
+        self._channel.close()
         return self._proc.wait()
 
     def is_alive(self):
@@ -348,51 +763,259 @@ class Player(object):
         Returns True if alive, else, returns False.
 
         """
-        if self._proc is not None:
-            return (self._proc.poll() is None)
-        else:
+        proc = self._proc
+        if proc is None or proc.returncode is not None:
             return False
+        # The exit watcher reaps the process as soon as it exits
+        if self._watched is proc and misc._exits.precise:
+            return True
+        return proc.poll() is None
+
+    def get(self, name, timeout=None):
+        """Get the value of a property.
+
+        name may be a generated property name (e.g. 'paused') or an MPlayer
+        property name (e.g. 'pause'). Returns the converted value, or None if
+        the property is unavailable or the answer didn't arrive within
+        timeout seconds (default: Player.timeout).
+
+        """
+        return self.get_properties([name], timeout)[name]
+
+    def get_properties(self, names, timeout=None):
+        """Get the values of several properties in a single round trip.
+
+        All 'get_property' commands are written at once and the answers are
+        collected in a single pass. Both generated property names (e.g.
+        'paused') and MPlayer property names (e.g. 'pause') are accepted.
+        Returns a dict which maps each name to its converted value, or None
+        if the property is unavailable or the answer didn't arrive within
+        timeout seconds (default: Player.timeout).
+
+        """
+        result = dict.fromkeys(names)
+        props = [(name, ) + self._lookup_property(name) for name in result]
+        cache = self._propcache
+        if cache is not None:
+            props = cache.fill(result, props)
+            epoch = cache.epoch
+        waiters = self._send_queries([pname for name, pname, ptype in props])
+        if waiters is None:
+            return result
+        answers = self._collect_answers(waiters, timeout)
+        for (name, pname, ptype), ans in zip(props, answers):
+            if ans is not None:
+                result[name] = ptype.convert(ans)
+                if cache is not None:
+                    cache.put(pname, result[name], epoch)
+        return result
+
+    def get_async(self, name, timeout=None):
+        """Get the value of a property without waiting for it.
+
+        Returns a concurrent.futures.Future of the converted value, which is
+        None if the property is unavailable (see get()). The future fails
+        with AnswerTimeout if the answer doesn't arrive within timeout
+        seconds (default: Player.timeout), with PlayerExited if MPlayer
+        isn't running or exits first, with RequestDropped if the request is
+        discarded by an overflow policy and with AnswerLost if MPlayer
+        answers a later request instead. It's completed from the reader
+        thread, so callbacks added to it should return quickly.
+
+        With answer_overflow set to Overflow.BLOCK, this call itself waits
+        for room among the pending requests (for up to Player.timeout
+        seconds) before the future is returned.
+
+        """
+        if Future is None:
+            raise ImportError('get_async() requires concurrent.futures')
+        pname, ptype = self._lookup_property(name)
+        future = Future()
+        cache = self._propcache
+        if cache is not None:
+            res = cache.get(pname, misc._MISSING)
+            if res is not misc._MISSING:
+                future.set_result(res)
+                return future
+            epoch = cache.epoch
+
+        def convert(ans):
+            ans = self._parse_answer(ans)
+            if ans is None:
+                return
+            res = ptype.convert(ans)
+            if cache is not None:
+                cache.put(pname, res, epoch)
+            return res
+
+        waiter = misc._FutureWaiter(pname, future, convert)
+        if self._send_queries([pname], [waiter]) is None:
+            future.set_exception(misc.PlayerExited('MPlayer is not running'))
+            return future
+        if timeout is None:
+            timeout = self.timeout
+        misc._timeouts.add(waiter, timeout, self._stdout._router)
+        return future
+
+    def submit(self, name, *args):
+        """Send a command without waiting for it to be written.
+
+        name is the name of a generated method (e.g. 'seek') and args are
+        checked just like that method checks them (TypeError is raised
+        right away). Returns a concurrent.futures.Future which is completed
+        with None once the command is written to MPlayer's stdin. It fails
+        with PlayerExited if MPlayer isn't running or exits first and with
+        RequestDropped or queue.Full if the command queue is full (see
+        Player.cmd_overflow).
+
+        """
+        if Future is None:
+            raise ImportError('submit() requires concurrent.futures')
+        method = getattr(self, name, None)
+        encode = getattr(getattr(method, '__func__', None), '_encode', None)
+        if encode is None:
+            raise ValueError('unknown command: {0}'.format(name))
+        cmd = encode(*args)
+        future = Future()
+        try:
+            self._run_encoded(name, cmd, method._prefixed, future)
+        except queue.Full as e:
+            future.set_exception(e)
+        return future
+
+    def observe(self, name, callback, interval=1.0):
+        """Call callback(name, value) whenever the value of a property changes.
+
+        The property is polled every interval seconds by a scheduler thread
+        which is shared by all players. Properties of the same player that
+        are due at the same time are requested in a single write. Callbacks
+        are called from the scheduler thread, the first time with the
+        initial value, and should return quickly.
+
+        """
+        if not hasattr(callback, '__call__'):
+            raise TypeError('expected callable for callback')
+        if interval <= 0:
+            raise ValueError('interval must be positive')
+        pname, ptype = self._lookup_property(name)
+        misc._scheduler.add(self, name, pname, ptype, callback, interval)
+
+    def unobserve(self, name=None, callback=None):
+        """Stop observing one or all properties, for one or all callbacks"""
+        pname = self._lookup_property(name)[0] if name is not None else None
+        misc._scheduler.remove(self, pname, callback)
+
+    def _send_queries(self, pnames, waiters=None):
+        """Send 'get_property' commands for pnames in a single write.
+        Returns the list of waiters for the answers (new misc._Waiters
+        unless given), or None if the answers can't be read.
+
+        """
+        if not pnames or not self.is_alive() or self._proc.stdout is None:
+            return
+        if waiters is None:
+            waiters = [misc._Waiter(pname) for pname in pnames]
+        if self.answer_overflow == misc.Overflow.BLOCK:
+            self._stdout._router.reserve(waiters, self.timeout)
+        if self._metrics is not None:
+            sent = misc._clock()
+            for waiter in waiters:
+                waiter.sent = sent
+        self._send(self._encode_queries(pnames), waiters)
+        return waiters
+
+    def _collect_answers(self, waiters, timeout=None):
+        """Wait for the answers to the queries sent by _send_queries().
+        The timeout applies to the whole batch.
+
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.time() + timeout
+        answers = []
+        timeouts = 0
+        for waiter in waiters:
+            ans = waiter.wait(max(deadline - time.time(), 0))
+            if waiter.cancelled:
+                timeouts += 1
+            answers.append(self._parse_answer(ans))
+        if timeouts:
+            self._stdout._router.timed_out(timeouts)
+        return answers
+
+    @classmethod
+    def _lookup_property(cls, name):
+        """Returns the (MPlayer name, type) pair of a property"""
+        try:
+            return cls._proptable[name]
+        except KeyError:
+            pass
+        if not cls._introspected and _lazy_introspect():
+            return cls._lookup_property(name)
+        # Unknown to introspection; let MPlayer decide.
+        return name, mtypes.StringType
+
+    def _format_command(self, name, *args):
+        """Returns the encoded command (bytes). args are strings."""
+        cmd, prefixed = _encode_command(name, args)
+        if prefixed:
+            cmd = _encode_prefix(self.cmd_prefix) + cmd
+        return cmd
+
+    def _encode_queries(self, pnames):
+        """Returns the encoded 'get_property' commands for pnames"""
+        prefix = _encode_prefix(self.cmd_prefix)
+        return b''.join([prefix + _encode_query(pname) for pname in pnames])
+
+    def _send(self, cmd, waiters=(), force=False):
+        # The command channel expects bytes. In Python 2.x, str is already
+        # bytes, but unicode has to be encoded just like str in Py3k.
+        if not isinstance(cmd, bytes):
+            cmd = cmd.encode('utf-8', 'ignore')
+        self._channel.put(cmd, waiters, force)
+
+    @staticmethod
+    def _parse_answer(ans):
+        if ans is None:
+            return
+        ans = ans.strip('\'"')
+        if ans == '(null)':
+            ans = None
+        return ans
 
     def _run_command(self, name, *args):
         """Send a command to MPlayer. The result, if any, is returned.
         args is assumed to be a tuple of strings.
 
+        Only 'get_property' waits for a result. Other commands are queued
+        for the writer thread and this returns immediately.
+
         """
-        if not self.is_alive():
-            return
-        cmd = [self.cmd_prefix, name]
-        cmd.extend(args)
-        cmd.append('\n')
-        # Don't prefix the following commands
-        if name in ['quit', 'pause', 'stop', 'loadfile']:
-            cmd.pop(0)
-        cmd = ' '.join(cmd)
-        # In Py3k, TypeErrors will be raised because cmd is a string but stdin
-        # expects bytes. In Python 2.x on the other hand, UnicodeEncodeErrors
-        # will be raised if cmd is unicode. In both cases, encoding the string
-        # will fix the problem.
-        try:
-            self._proc.stdin.write(cmd)
-        except (TypeError, UnicodeEncodeError):
-            self._proc.stdin.write(cmd.encode('utf-8', 'ignore'))
-        self._proc.stdin.flush()
         # Expect a response for 'get_property' only
-        if name == 'get_property' and self._proc.stdout is not None:
-            # The reponses for properties start with 'ANS_<property name>='
-            key = 'ANS_{0}='.format(args[0])
-            while True:
-                try:
-                    res = self._stdout._answers.get(timeout=1.0)
-                except queue.Empty:
-                    return
-                if res.startswith(key):
-                    break
-                if res.startswith('ANS_ERROR='):
-                    return
-            ans = res.partition('=')[2].strip('\'"')
-            if ans == '(null)':
-                ans = None
-            return ans
+        if name == 'get_property':
+            waiters = self._send_queries(args[:1])
+            if waiters is not None:
+                return self._collect_answers(waiters)[0]
+        return self._run_encoded(name, *_encode_command(name, args))
+
+    def _run_encoded(self, name, cmd, prefixed=True, future=None):
+        """Send a command which is already encoded (bytes, including the
+        newline but without the prefix). Used by the generated methods and
+        property setters, which precompute as much of cmd as possible.
+        future, if not None, is completed once cmd is written.
+
+        """
+        # Cheaper than is_alive(), which may poll the process. Commands
+        # which reach a dead process are discarded by the command channel.
+        if self._proc is None or self._proc.returncode is not None:
+            if future is not None:
+                future.set_exception(misc.PlayerExited('MPlayer is not running'))
+            return
+        if self._propcache is not None and not name.endswith('_property'):
+            self._propcache.command(name)
+        if prefixed:
+            cmd = _encode_prefix(self.cmd_prefix) + cmd
+        self._channel.put(cmd, future=future)
 
 
 class _StderrWrapper(misc._StderrWrapper):
@@ -412,11 +1035,57 @@ class _StdoutWrapper(_StderrWrapper, misc._StdoutWrapper):
     pass
 
 
-# Introspect on module load
-try:
-    Player.introspect()
-except OSError:
-    pass
+_introspect_lock = Lock()
+
+
+def _lazy_introspect():
+    """Introspect on first use and remove the lazy attribute hooks.
+    Returns True if introspection succeeded.
+
+    """
+    with _introspect_lock:
+        if Player._introspected:
+            return True
+        if Player._introspection_failed:
+            return False
+        try:
+            Player.introspect()
+        except OSError:
+            Player._introspection_failed = True
+            return False
+        # The hooks are only installed in lazy mode, but this is also
+        # reached through _lookup_property()
+        if '__getattr__' in Player.__dict__:
+            del Player.__getattr__, Player.__setattr__
+        return True
+
+
+def _lazy_getattr(self, name):
+    # Only reached when the normal attribute lookup fails
+    if name.startswith('_') or not _lazy_introspect():
+        raise AttributeError("'{0}' object has no attribute '{1}'".format(
+            self.__class__.__name__, name))
+    return getattr(self, name)
+
+
+def _lazy_setattr(self, name, value):
+    # Generated properties have to exist before they can be set
+    if not name.startswith('_') and not hasattr(type(self), name):
+        _lazy_introspect()
+    object.__setattr__(self, name, value)
+
+
+# Introspect on module load, unless lazy introspection is requested. In lazy
+# mode, properties and methods are generated upon first access of a missing
+# attribute of a Player instance. Use Player.introspect() for class-level access.
+if os.environ.get('MPLAYER_PY_LAZY', '0') not in ('', '0'):
+    Player.__getattr__ = _lazy_getattr
+    Player.__setattr__ = _lazy_setattr
+else:
+    try:
+        Player.introspect()
+    except OSError:
+        pass
 
 
 if __name__ == '__main__':
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+"""Typed events parsed from MPlayer's output
+
+Subscribe to events of a certain type (or to Event for all of them) with
+the subscribe() method of Player.stdout and Player.stderr:
+
+    def on_eof(event):
+        print('EOF code: {0}'.format(event.code))
+    player.stdout.subscribe(EofEvent, on_eof)
+
+Each line is parsed at most once, no matter how many subscribers there are,
+and only if there are any.
+
+"""
+
+import re
+
+
+__all__ = ['Event', 'EofEvent', 'IdentifyEvent', 'AnswerEvent',
+           'PlaybackStartEvent', 'CacheFillEvent', 'ErrorEvent', 'ExitEvent',
+           'RespawnEvent', 'parse']
+
+
+class Event(object):
+    """Base class of all events
+
+    line -- the line of output the event was parsed from
+
+    """
+
+    __slots__ = ('line', )
+
+    def __init__(self, line):
+        super(Event, self).__init__()
+        self.line = line
+
+    def __repr__(self):
+        return '<{0} {1!r}>'.format(self.__class__.__name__, self.line)
+
+
+class EofEvent(Event):
+    """End of file ('EOF code: 1')
+
+    code -- the EOF code (int)
+
+    """
+
+    __slots__ = ('code', )
+
+    def __init__(self, line, code):
+        super(EofEvent, self).__init__(line)
+        self.code = code
+
+
+class IdentifyEvent(Event):
+    """A field printed by -identify ('ID_VIDEO_WIDTH=640')
+
+    name -- the field name without the 'ID_' prefix (e.g. 'VIDEO_WIDTH')
+    value -- the value (str)
+
+    """
+
+    __slots__ = ('name', 'value')
+
+    def __init__(self, line, name, value):
+        super(IdentifyEvent, self).__init__(line)
+        self.name = name
+        self.value = value
+
+
+class AnswerEvent(Event):
+    """An answer to a query ('ANS_volume=50.000000')
+
+    name -- the property name
+    value -- the raw value (str)
+
+    """
+
+    __slots__ = ('name', 'value')
+
+    def __init__(self, line, name, value):
+        super(AnswerEvent, self).__init__(line)
+        self.name = name
+        self.value = value
+
+
+class PlaybackStartEvent(Event):
+    """Playback started ('Starting playback...')"""
+
+    __slots__ = ()
+
+
+class CacheFillEvent(Event):
+    """Progress of filling the cache ('Cache fill: 12.50% (1048576 bytes)')
+
+    percent -- how much of the cache is filled (float)
+    size -- the number of bytes in the cache (int or None)
+
+    """
+
+    __slots__ = ('percent', 'size')
+
+    def __init__(self, line, percent, size):
+        super(CacheFillEvent, self).__init__(line)
+        self.percent = percent
+        self.size = size
+
+
+class ErrorEvent(Event):
+    """An error reported by MPlayer (e.g. 'Failed to open ...' or the
+    answer 'ANS_ERROR=PROPERTY_UNKNOWN')
+
+    message -- the error message
+
+    """
+
+    __slots__ = ('message', )
+
+    def __init__(self, line, message):
+        super(ErrorEvent, self).__init__(line)
+        self.message = message
+
+
+class ExitEvent(Event):
+    """MPlayer exited. Published on Player.stdout by the exit watcher
+    thread; line is None.
+
+    returncode -- the exit status of MPlayer
+    expected -- True if MPlayer exited because of Player.quit()
+
+    """
+
+    __slots__ = ('returncode', 'expected')
+
+    def __init__(self, returncode, expected):
+        super(ExitEvent, self).__init__(None)
+        self.returncode = returncode
+        self.expected = expected
+
+    def __repr__(self):
+        return '<ExitEvent returncode={0!r} expected={1!r}>'.format(
+            self.returncode, self.expected)
+
+
+class RespawnEvent(Event):
+    """MPlayer was respawned by a Supervisor after an unexpected exit;
+    line is None.
+
+    returncode -- the exit status of the previous process
+    state -- dict of the restored state (see Supervisor)
+    elapsed -- seconds from the exit being noticed until MPlayer was
+               respawned and the restoring commands were queued
+
+    """
+
+    __slots__ = ('returncode', 'state', 'elapsed')
+
+    def __init__(self, returncode, state, elapsed):
+        super(RespawnEvent, self).__init__(None)
+        self.returncode = returncode
+        self.state = state
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return '<RespawnEvent returncode={0!r} state={1!r}>'.format(
+            self.returncode, self.state)
+
+
+def _parse_eof(line):
+    try:
+        return EofEvent(line, int(line[9:]))
+    except ValueError:
+        return
+
+
+def _parse_identify(line):
+    name, sep, value = line[3:].partition('=')
+    if sep:
+        return IdentifyEvent(line, name, value)
+
+
+def _parse_answer(line):
+    name, sep, value = line[4:].partition('=')
+    if not sep:
+        return
+    if name == 'ERROR':
+        return ErrorEvent(line, value)
+    return AnswerEvent(line, name, value)
+
+
+def _parse_playback_start(line):
+    return PlaybackStartEvent(line)
+
+
+_cache_fill = re.compile(r'Cache fill:\s*([\d.]+)%(?:\s*\((\d+) bytes\))?')
+
+
+def _parse_cache_fill(line):
+    m = _cache_fill.match(line)
+    if m is not None:
+        size = m.group(2)
+        return CacheFillEvent(line, float(m.group(1)),
+                              int(size) if size is not None else None)
+
+
+def _parse_error(line):
+    return ErrorEvent(line, line)
+
+
+# Line prefix -> parser. All prefixes are combined into a single regular
+# expression so that classifying a line takes one match() call.
+_parsers = [
+    ('EOF code:', _parse_eof),
+    ('ID_', _parse_identify),
+    ('ANS_', _parse_answer),
+    ('Starting playback', _parse_playback_start),
+    ('Cache fill:', _parse_cache_fill),
+    ('Failed to', _parse_error),
+    ('Error', _parse_error),
+    ('Cannot', _parse_error),
+    ("Couldn't", _parse_error),
+    ('No stream found', _parse_error),
+    ('File not found', _parse_error),
+]
+_dispatch = re.compile('|'.join(['(?P<p{0}>{1})'.format(i, re.escape(prefix))
+                                 for i, (prefix, parser) in enumerate(_parsers)]))
+_group_parsers = dict(('p{0}'.format(i), parser)
+                      for i, (prefix, parser) in enumerate(_parsers))
+
+
+def parse(line):
+    """Parse a line of MPlayer's output (str).
+    Returns an Event or None if the line isn't recognized.
+
+    """
+    m = _dispatch.match(line)
+    if m is not None:
+        return _group_parsers[m.lastgroup](line)
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+"""Decoded audio and video straight from MPlayer, without temporary files
+
+MPlayer writes raw PCM (-ao pcm) or YUV4MPEG (-vo yuv4mpeg) output into a
+pipe which is read into a preallocated buffer. The buffer is reused for
+every chunk or frame, so each byte is copied exactly once (by the kernel,
+from the pipe into the buffer). Consumers must copy what they need to
+keep before advancing the iterator.
+
+    with AudioStream('/path/to/file.flac', samplerate=48000) as stream:
+        for chunk in stream:
+            process(chunk)
+
+If NumPy is available, as_array=True yields NumPy arrays which are views
+of the same buffer. /dev/fd is required (POSIX only).
+
+"""
+
+import os
+import subprocess
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mplayer.core import Player
+
+
+__all__ = ['AudioStream', 'VideoStream']
+
+
+class _RawStream(object):
+    """Spawns MPlayer with its raw output redirected into a pipe"""
+
+    def __init__(self, path, args=(), exec_path=None, as_array=False):
+        super(_RawStream, self).__init__()
+        if as_array and numpy is None:
+            raise ImportError('as_array=True requires NumPy')
+        self._path = path
+        self._args = tuple(args)
+        self._exec_path = exec_path if exec_path is not None else Player.exec_path
+        self._as_array = as_array
+        self._proc = None
+        self._pipe = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        if self._proc is not None:
+            raise RuntimeError('a stream can only be iterated once')
+        self._spawn()
+        try:
+            for chunk in self._chunks():
+                yield chunk
+            # At the end of the output, MPlayer exits on its own; let it,
+            # so that returncode tells whether it succeeded
+            try:
+                self._proc.wait(timeout=5.0)
+            except subprocess.TimeoutExpired:
+                pass
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop MPlayer and close the pipe"""
+        if self._pipe is not None:
+            self._pipe.close()
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+
+    @property
+    def returncode(self):
+        """Exit status of MPlayer (None while it's running)"""
+        return self._proc.returncode if self._proc is not None else None
+
+    def _output_args(self, fd):
+        raise NotImplementedError
+
+    def _chunks(self):
+        raise NotImplementedError
+
+    def _spawn(self):
+        r, w = os.pipe()
+        path = self._path
+        cmd = ([self._exec_path, '-really-quiet', '-noconsolecontrols'] +
+               self._output_args(w) + list(self._args) +
+               ['./' + path if path.startswith('-') else path])
+        try:
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                pass_fds=(w, ))
+        except Exception:
+            os.close(r)
+            raise
+        finally:
+            # Only MPlayer writes; EOF arrives once it exits
+            os.close(w)
+        self._pipe = os.fdopen(r, 'rb', buffering=0)
+
+    def _fill(self, view):
+        """Read into view until it's full or EOF.
+        Returns the number of bytes read.
+
+        """
+        size = len(view)
+        n = 0
+        while n < size:
+            got = self._pipe.readinto(view[n:])
+            if not got:
+                break
+            n += got
+        return n
+
+
+class AudioStream(_RawStream):
+    """Decoded audio as interleaved signed 16-bit native-endian samples.
+
+    Iterating yields chunks of up to chunk_frames frames (one sample per
+    channel), as memoryviews cast to 'h' or, with as_array=True, NumPy
+    int16 arrays of shape (frames, channels).
+
+    """
+
+    def __init__(self, path, samplerate=44100, channels=2, chunk_frames=65536,
+                 args=(), exec_path=None, as_array=False):
+        """Arguments:
+
+        path -- path or URL of the file
+        samplerate -- resample to this rate in Hz (default: 44100)
+        channels -- down- or upmix to this number of channels (default: 2)
+        chunk_frames -- maximum number of frames per chunk (default: 65536)
+        args -- additional MPlayer arguments (default: ())
+        exec_path -- path to the MPlayer executable (default: Player.exec_path)
+        as_array -- yield NumPy arrays instead of memoryviews (default: False)
+
+        """
+        super(AudioStream, self).__init__(path, args, exec_path, as_array)
+        self.samplerate = samplerate
+        self.channels = channels
+        self._buf = bytearray(chunk_frames * channels * 2)
+
+    def _output_args(self, fd):
+        return ['-novideo', '-vc', 'null', '-vo', 'null',
+                '-ao', 'pcm:fast:nowaveheader:file=/dev/fd/{0}'.format(fd),
+                '-af', 'format=s16ne', '-srate', str(self.samplerate),
+                '-channels', str(self.channels)]
+
+    def _chunks(self):
+        view = memoryview(self._buf)
+        frame_size = self.channels * 2
+        if self._as_array:
+            array = numpy.frombuffer(self._buf, dtype=numpy.int16).reshape(-1, self.channels)
+        while True:
+            n = self._fill(view)
+            # Drop a trailing partial frame
+            frames = n // frame_size
+            if not frames:
+                return
+            if self._as_array:
+                yield array[:frames]
+            else:
+                yield view[:frames * frame_size].cast('h')
+            if n < len(view):
+                return
+
+
+class VideoStream(_RawStream):
+    """Decoded video frames in planar YUV (as written by -vo yuv4mpeg).
+
+    The width, height, fps and chroma attributes are set once the stream
+    header is read, i.e. when the first frame is yielded. Each frame is a
+    memoryview of all planes or, with as_array=True, a flat NumPy uint8
+    array; planes() splits a frame into its Y, U and V planes.
+
+    """
+
+    # chroma subsampling -> (horizontal, vertical) divisor of U and V
+    _SUBSAMPLING = {'420': (2, 2), '420jpeg': (2, 2), '420mpeg2': (2, 2),
+                    '420paldv': (2, 2), '422': (2, 1), '444': (1, 1)}
+
+    def __init__(self, path, args=(), exec_path=None, as_array=False):
+        """Arguments:
+
+        path -- path or URL of the file
+        args -- additional MPlayer arguments, e.g. ['-vf', 'scale=320:-2']
+                (default: ())
+        exec_path -- path to the MPlayer executable (default: Player.exec_path)
+        as_array -- yield NumPy arrays instead of memoryviews (default: False)
+
+        """
+        super(VideoStream, self).__init__(path, args, exec_path, as_array)
+        self.width = None
+        self.height = None
+        self.fps = None
+        self.chroma = '420'
+        self._buf = None
+
+    def planes(self, frame):
+        """Returns the (Y, U, V) planes of frame. For NumPy frames, these
+        are 2-D views of shape (rows, columns).
+
+        """
+        xdiv, ydiv = self._SUBSAMPLING[self.chroma]
+        w, h = self.width, self.height
+        cw, ch = -(-w // xdiv), -(-h // ydiv)
+        y, u = w * h, w * h + cw * ch
+        planes = (frame[:y], frame[y:u], frame[u:u + cw * ch])
+        if self._as_array:
+            planes = (planes[0].reshape(h, w), planes[1].reshape(ch, cw),
+                      planes[2].reshape(ch, cw))
+        return planes
+
+    def _output_args(self, fd):
+        return ['-nosound', '-ao', 'null',
+                '-vo', 'yuv4mpeg:file=/dev/fd/{0}'.format(fd)]
+
+    def _read_line(self, line=b''):
+        """Read the rest of a line which starts with line.
+        Returns None at EOF before the line.
+
+        """
+        line = bytearray(line)
+        while not line.endswith(b'\n'):
+            c = self._pipe.read(1)
+            if not c:
+                if line:
+                    raise ValueError('truncated YUV4MPEG2 stream')
+                return None
+            line += c
+        return bytes(line[:-1])
+
+    def _parse_header(self, header):
+        fields = header.split()
+        if not fields or fields[0] != b'YUV4MPEG2':
+            raise ValueError('not a YUV4MPEG2 stream: {0!r}'.format(header[:32]))
+        for field in fields[1:]:
+            tag, value = field[:1], field[1:].decode('ascii')
+            if tag == b'W':
+                self.width = int(value)
+            elif tag == b'H':
+                self.height = int(value)
+            elif tag == b'F':
+                num, _, den = value.partition(':')
+                den = float(den or 1)
+                self.fps = float(num) / den if den else None
+            elif tag == b'C':
+                self.chroma = value
+        if self.width is None or self.height is None:
+            raise ValueError('YUV4MPEG2 header without dimensions')
+        if self.chroma not in self._SUBSAMPLING:
+            raise ValueError('unsupported chroma: {0}'.format(self.chroma))
+        xdiv, ydiv = self._SUBSAMPLING[self.chroma]
+        chroma_size = -(-self.width // xdiv) * -(-self.height // ydiv)
+        return self.width * self.height + 2 * chroma_size
+
+    def _chunks(self):
+        header = self._read_line()
+        if header is None:
+            return
+        frame_size = self._parse_header(header)
+        self._buf = bytearray(frame_size)
+        view = memoryview(self._buf)
+        frame = numpy.frombuffer(self._buf, dtype=numpy.uint8) if self._as_array else view
+        tag = bytearray(6)
+        tag_view = memoryview(tag)
+        while True:
+            # Each frame is preceded by 'FRAME' and optional parameters
+            n = self._fill(tag_view)
+            if not n:
+                return
+            if n < len(tag):
+                raise ValueError('truncated YUV4MPEG2 stream')
+            if tag != b'FRAME\n':
+                if not tag.startswith(b'FRAME'):
+                    raise ValueError('expected a FRAME header: {0!r}'.format(bytes(tag)))
+                # Skip the frame parameters
+                self._read_line(tag)
+            if self._fill(view) < frame_size:
+                return
+            yield frame
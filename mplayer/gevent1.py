@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import gevent
-from gevent.fileobject import FileObject
+import gevent.os
 from subprocess import PIPE
 
 from mplayer.core import Player
@@ -37,9 +37,14 @@ class GeventPlayer(Player):
 class _StderrWrapper(misc._StderrWrapper):
 
     def _attach(self, source):
-        super(_StderrWrapper, self)._attach(FileObject(source))
+        super(_StderrWrapper, self)._attach(source)
+        gevent.os.make_nonblocking(source.fileno())
         gevent.spawn(self._greenlet_func)
 
+    def _read_lines(self):
+        # Cooperative read; only blocks the current greenlet
+        return self._reader.feed(gevent.os.nb_read(self._source.fileno(), 65536))
+
     def _greenlet_func(self):
         while self._source is not None:
             self._process_output()
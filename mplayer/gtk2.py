@@ -23,6 +23,7 @@ import gtk
 import gobject
 
 from mplayer.core import Player
+from mplayer.events import EofEvent
 from mplayer import misc
 
 
@@ -69,7 +70,7 @@ class GtkPlayerView(gtk.Socket):
         super(GtkPlayerView, self).__init__()
         self._player = GPlayer(('-msglevel', 'global=6', '-fixed-vo', '-fs') + args,
                                stderr=stderr, autospawn=False)
-        self._player.stdout.connect(self._handle_data)
+        self._player.stdout.subscribe(EofEvent, self._handle_eof)
         self.connect('destroy', self._on_destroy)
         self.connect('hierarchy-changed', self._on_hierarchy_changed)
 
@@ -88,10 +89,8 @@ class GtkPlayerView(gtk.Socket):
     def _on_destroy(self, *args):
         self._player.quit()
 
-    def _handle_data(self, data):
-        if data.startswith('EOF code:'):
-            code = data.partition(':')[2].strip()
-            self.emit('eof', int(code))
+    def _handle_eof(self, event):
+        self.emit('eof', event.code)
 
 
 class _StderrWrapper(misc._StderrWrapper):
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import sqlite3
+
+from mplayer.probe import MediaInfo, identify
+
+
+__all__ = ['MediaIndex', 'MEDIA_EXTENSIONS']
+
+
+# Files with other extensions are skipped by MediaIndex.scan() by default
+MEDIA_EXTENSIONS = frozenset([
+    '.3gp', '.aac', '.ac3', '.asf', '.avi', '.flac', '.flv', '.m2ts', '.m4a',
+    '.m4v', '.mka', '.mkv', '.mov', '.mp2', '.mp3', '.mp4', '.mpeg', '.mpg',
+    '.mts', '.ogg', '.ogm', '.ogv', '.opus', '.rm', '.rmvb', '.ts', '.vob',
+    '.wav', '.webm', '.wma', '.wmv'])
+
+# MediaInfo attribute -> SQL type of its column
+_COLUMNS = [
+    ('length', 'REAL'),
+    ('demuxer', 'TEXT'),
+    ('video_codec', 'TEXT'),
+    ('video_format', 'TEXT'),
+    ('width', 'INTEGER'),
+    ('height', 'INTEGER'),
+    ('fps', 'REAL'),
+    ('video_bitrate', 'INTEGER'),
+    ('audio_codec', 'TEXT'),
+    ('audio_format', 'TEXT'),
+    ('audio_bitrate', 'INTEGER'),
+    ('samplerate', 'INTEGER'),
+    ('channels', 'INTEGER'),
+]
+_INDEXED = ('length', 'video_codec', 'audio_codec', 'width', 'height')
+_FILTERABLE = frozenset(['path', 'size', 'mtime', 'error'] +
+                        [name for name, sqltype in _COLUMNS])
+_OPERATORS = {'eq': '=', 'ne': '!=', 'lt': '<', 'le': '<=', 'gt': '>',
+              'ge': '>=', 'like': 'LIKE'}
+_SCHEMA_VERSION = 1
+# Number of rows per transaction during scans
+_BATCH_SIZE = 500
+
+
+class MediaIndex(object):
+    """Persistent index of media properties, stored in an SQLite file.
+
+    Entries are keyed on the path and remember the size and mtime of the
+    file when it was identified, so rescanning a library only identifies
+    new and changed files. Files which fail to identify are stored too
+    (with MediaInfo.error set) and are retried once they change.
+
+        with MediaIndex('/var/cache/library.db') as index:
+            index.scan(['/srv/media'], workers=8)
+            for info in index.find(length__gt=3600, video_codec='ffh264'):
+                print(info.path)
+
+    """
+
+    def __init__(self, path, exec_path=None, args=(), timeout=30.0):
+        """Arguments:
+
+        path -- path to the SQLite file (created if it doesn't exist)
+        exec_path -- path to the MPlayer executable (default: Player.exec_path)
+        args -- additional MPlayer arguments for identification (default: ())
+        timeout -- seconds after which identifying a file is aborted
+                   (default: 30.0)
+
+        """
+        super(MediaIndex, self).__init__()
+        self._exec_path = exec_path
+        self._args = args
+        self._timeout = timeout
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._create_schema()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM media').fetchone()[0]
+
+    def __contains__(self, path):
+        return self._db.execute('SELECT 1 FROM media WHERE path = ?',
+                                (path, )).fetchone() is not None
+
+    def close(self):
+        """Close the SQLite file"""
+        self._db.close()
+
+    def get(self, path):
+        """Returns the MediaInfo of path or None if it isn't indexed"""
+        row = self._db.execute('SELECT path, fields, error FROM media WHERE path = ?',
+                               (path, )).fetchone()
+        return self._to_info(row) if row is not None else None
+
+    def find(self, order_by=None, limit=None, **filters):
+        """Returns a generator of the MediaInfo of the indexed files which
+        match all filters.
+
+        Filters are MediaInfo attributes (plus 'size' and 'mtime' of the
+        file), optionally followed by an operator: __eq (default), __ne,
+        __lt, __le, __gt, __ge, __like and __in (any of a sequence).
+        A value of None matches missing properties.
+
+            index.find(length__gt=3600)
+            index.find(video_codec__in=['ffh264', 'ffhevc'], error=None)
+
+        order_by -- attribute to sort by; prefix with '-' for descending order
+        limit -- maximum number of results
+
+        """
+        where, params = self._where(filters)
+        sql = 'SELECT path, fields, error FROM media' + where
+        if order_by is not None:
+            column = order_by.lstrip('-')
+            if column not in _FILTERABLE:
+                raise ValueError('cannot order by {0!r}'.format(order_by))
+            sql += ' ORDER BY {0} {1}'.format(column, 'DESC' if order_by.startswith('-') else 'ASC')
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        for row in self._db.execute(sql, params):
+            yield self._to_info(row)
+
+    def count(self, **filters):
+        """Returns the number of indexed files which match all filters
+        (see find())
+
+        """
+        where, params = self._where(filters)
+        return self._db.execute('SELECT COUNT(*) FROM media' + where, params).fetchone()[0]
+
+    def remove(self, path):
+        """Remove path from the index"""
+        with self._db:
+            self._db.execute('DELETE FROM media WHERE path = ?', (path, ))
+
+    def scan(self, roots, workers=None, extensions=MEDIA_EXTENSIONS, prune=True):
+        """Bring the index up to date with the files under roots.
+        Returns a dict of counts: 'seen', 'identified', 'unchanged',
+        'failed' and 'removed'.
+
+        roots -- iterable of files and directories (searched recursively)
+        workers -- number of concurrent MPlayer processes
+                   (default: the number of CPUs)
+        extensions -- only index files with these extensions (lower case,
+                      with the dot); None indexes all files
+                      (default: MEDIA_EXTENSIONS)
+        prune -- remove indexed files under roots which no longer exist
+                 (default: True)
+
+        """
+        roots = [os.path.abspath(root) for root in roots]
+        stats = {'seen': 0, 'identified': 0, 'unchanged': 0, 'failed': 0,
+                 'removed': 0}
+        known = dict(((path, (size, mtime)) for path, size, mtime in
+                      self._db.execute('SELECT path, size, mtime FROM media')))
+        # path -> (size, mtime) of the files which need identification
+        changed = {}
+        seen = set()
+        for path, st in self._walk(roots, extensions):
+            stats['seen'] += 1
+            seen.add(path)
+            if known.get(path) == (st.st_size, st.st_mtime):
+                stats['unchanged'] += 1
+            else:
+                changed[path] = (st.st_size, st.st_mtime)
+        rows = []
+        for info in identify(changed, workers=workers, timeout=self._timeout,
+                             args=self._args, exec_path=self._exec_path):
+            stats['identified'] += 1
+            if info.error is not None:
+                stats['failed'] += 1
+            rows.append(self._to_row(info, *changed[info.path]))
+            if len(rows) >= _BATCH_SIZE:
+                self._upsert(rows)
+                rows = []
+        self._upsert(rows)
+        if prune:
+            prefixes = tuple([os.path.join(root, '') for root in roots])
+            gone = [(path, ) for path in known if path not in seen and
+                    (path.startswith(prefixes) or path in roots)]
+            with self._db:
+                self._db.executemany('DELETE FROM media WHERE path = ?', gone)
+            stats['removed'] = len(gone)
+        return stats
+
+    def _create_schema(self):
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version == _SCHEMA_VERSION:
+            return
+        with self._db:
+            # Nothing in the index can't be recreated by a scan
+            self._db.execute('DROP TABLE IF EXISTS media')
+            self._db.execute('CREATE TABLE media (path TEXT PRIMARY KEY, '
+                             'size INTEGER, mtime REAL, {0}, metadata TEXT, '
+                             'fields TEXT, error TEXT)'.format(
+                                 ', '.join(['{0} {1}'.format(name, sqltype)
+                                            for name, sqltype in _COLUMNS])))
+            for name in _INDEXED:
+                self._db.execute('CREATE INDEX media_{0} ON media ({0})'.format(name))
+            self._db.execute('PRAGMA user_version = {0}'.format(_SCHEMA_VERSION))
+
+    @staticmethod
+    def _walk(roots, extensions):
+        """Yields (path, stat result) of the files under roots (absolute)"""
+        for root in roots:
+            if not os.path.isdir(root):
+                try:
+                    yield root, os.stat(root)
+                except OSError:
+                    pass
+                continue
+            for dirpath, dirnames, filenames in os.walk(root):
+                for filename in filenames:
+                    if (extensions is not None and
+                            os.path.splitext(filename)[1].lower() not in extensions):
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        # Vanished or a dangling symlink
+                        continue
+                    yield path, st
+
+    @staticmethod
+    def _to_row(info, size, mtime):
+        return ((info.path, size, mtime) +
+                tuple([getattr(info, name) for name, sqltype in _COLUMNS]) +
+                (json.dumps(info.metadata), json.dumps(info.fields), info.error))
+
+    @staticmethod
+    def _to_info(row):
+        path, fields, error = row
+        return MediaInfo(path, json.loads(fields), error)
+
+    def _upsert(self, rows):
+        if not rows:
+            return
+        with self._db:
+            self._db.executemany('INSERT OR REPLACE INTO media VALUES ({0})'.format(
+                ', '.join(['?'] * len(rows[0]))), rows)
+
+    @staticmethod
+    def _where(filters):
+        clauses = []
+        params = []
+        for key, value in sorted(filters.items()):
+            name, _, op = key.partition('__')
+            if name not in _FILTERABLE or (op and op not in _OPERATORS and op != 'in'):
+                raise ValueError('invalid filter: {0!r}'.format(key))
+            if op == 'in':
+                value = list(value)
+                clauses.append('{0} IN ({1})'.format(name, ', '.join(['?'] * len(value))))
+                params.extend(value)
+            elif value is None and op in ('', 'eq', 'ne'):
+                clauses.append('{0} IS {1}NULL'.format(name, 'NOT ' if op == 'ne' else ''))
+            else:
+                clauses.append('{0} {1} ?'.format(name, _OPERATORS[op or 'eq']))
+                params.append(value)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
@@ -17,13 +17,35 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with mplayer.py.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import re
+import sys
+import math
+import time
+import heapq
+import weakref
+import traceback
+from bisect import bisect_left
+from itertools import count
+from collections import deque
+from threading import Condition, Event, Lock, Thread
 try:
     import queue
 except ImportError:
     import Queue as queue
+try:
+    from concurrent.futures import InvalidStateError
+except ImportError:
+    # Before Python 3.8, completing a done future doesn't raise at all
+    # (and without concurrent.futures, there are no futures to complete)
+    class InvalidStateError(Exception):
+        pass
 
+from mplayer import events
 
-__all__ = ['CmdPrefix']
+
+__all__ = ['CmdPrefix', 'Overflow', 'PlayerError', 'AnswerTimeout', 'PlayerExited',
+           'RequestDropped']
 
 
 class CmdPrefix(object):
@@ -35,70 +57,1395 @@ class CmdPrefix(object):
     PAUSING_KEEP_FORCE = 'pausing_keep_force'
 
 
+# Marks missing entries where None is a valid value
+_MISSING = object()
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class Overflow(object):
+    """Policies for when a bounded queue is full
+
+    BLOCK -- wait until there's room in the queue
+    DROP_OLDEST -- discard the oldest entry
+    DROP_STALE -- discard the requests which already timed out; if there
+                  are none, discard the oldest entry (answer queue only)
+    RAISE -- raise queue.Full (command queue only)
+
+    """
+
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop-oldest'
+    DROP_STALE = 'drop-stale'
+    RAISE = 'raise'
+
+
+class PlayerError(Exception):
+    """Base class of the errors of Player.submit() and Player.get_async()"""
+
+
+class AnswerTimeout(PlayerError):
+    """MPlayer didn't answer in time"""
+
+
+class PlayerExited(PlayerError):
+    """MPlayer isn't running or exited before completing the request"""
+
+
+class RequestDropped(PlayerError):
+    """The request was discarded by an overflow policy"""
+
+
+class AnswerLost(PlayerError):
+    """MPlayer answered a later request instead"""
+
+
+def _complete(future, result=None, exception=None):
+    """Complete future unless it's done already (e.g. cancelled)"""
+    # Older versions would overwrite the state of a cancelled future
+    if future.done():
+        return
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class _Waiter(object):
+    """A request waiting for the answer to a 'get_property' command"""
+
+    __slots__ = ('key', 'value', 'cancelled', 'sent', '_event')
+
+    def __init__(self, key):
+        super(_Waiter, self).__init__()
+        self.key = key
+        self.value = None
+        self.cancelled = False
+        # When the request was sent, if stats are enabled
+        self.sent = None
+        self._event = Event()
+
+    def set(self, value):
+        self.value = value
+        self._event.set()
+
+    def fail(self, exc):
+        """The request failed with exc (a PlayerError) before it was answered"""
+        self.set(None)
+
+    def wait(self, timeout):
+        """Returns the raw answer or None if it didn't arrive in time"""
+        if not self._event.wait(timeout):
+            # The answer may still arrive. Keep this waiter queued so that
+            # the late answer is discarded instead of being misrouted.
+            self.cancelled = True
+        return self.value
+
+
+class _FutureWaiter(_Waiter):
+    """A request whose answer completes a concurrent.futures.Future.
+    The raw answer is passed through convert() first.
+
+    """
+
+    __slots__ = ('future', 'convert')
+
+    def __init__(self, key, future, convert):
+        super(_FutureWaiter, self).__init__(key)
+        self.future = future
+        self.convert = convert
+
+    def set(self, value):
+        super(_FutureWaiter, self).set(value)
+        try:
+            value = self.convert(value)
+        except Exception as e:
+            _complete(self.future, exception=e)
+        else:
+            _complete(self.future, value)
+
+    def fail(self, exc):
+        self._event.set()
+        _complete(self.future, exception=exc)
+
+    def expire(self):
+        """Fail with AnswerTimeout unless answered.
+        Returns True if the request timed out.
+
+        """
+        if self.future.done():
+            return False
+        # Keep this waiter queued so that the late answer is discarded
+        self.cancelled = True
+        self.fail(AnswerTimeout('no answer for {0!r}'.format(self.key)))
+        return True
+
+
+class _AnswerRouter(object):
+    """Routes ANS_ lines to the waiters of the corresponding requests.
+
+    MPlayer answers 'get_property' commands in the order they were received,
+    so waiters are kept in a FIFO and matched by property name. ANS_ERROR
+    carries no property name and always belongs to the oldest request.
+    Waiters of timed-out requests remain queued until their answer, or the
+    answer to a later request, arrives.
+
+    If maxsize is positive, the FIFO never grows beyond maxsize waiters.
+    When it's full, register() discards waiters according to the overflow
+    policy (Overflow.BLOCK behaves like DROP_STALE there; callers should
+    reserve() room before sending their queries instead). The answer to
+    a discarded request may still be taken by a later request for the
+    same property.
+
+    """
+
+    def __init__(self, maxsize=0, overflow=Overflow.DROP_STALE):
+        super(_AnswerRouter, self).__init__()
+        self._lock = Lock()
+        self._not_full = Condition(self._lock)
+        self._pending = deque()
+        # Waiters which were given room by reserve() but aren't registered
+        self._reserved = set()
+        self.configure(maxsize, overflow)
+        self.dropped = 0
+        self.late = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.max_pending = 0
+        self._metrics = None
+
+    def configure(self, maxsize, overflow):
+        if overflow not in (Overflow.BLOCK, Overflow.DROP_OLDEST, Overflow.DROP_STALE):
+            raise ValueError('invalid overflow policy: {0}'.format(overflow))
+        with self._lock:
+            self._maxsize = maxsize
+            self._overflow = overflow
+
+    def register(self, waiter):
+        dropped = []
+        with self._lock:
+            self._reserved.discard(waiter)
+            # The room reserved for other waiters isn't available
+            maxsize = self._maxsize - len(self._reserved)
+            if self._maxsize > 0 and len(self._pending) >= maxsize:
+                if self._overflow != Overflow.DROP_OLDEST:
+                    stale = [w for w in self._pending if w.cancelled]
+                    if stale:
+                        self._pending = deque([w for w in self._pending
+                                               if not w.cancelled])
+                        dropped.extend(stale)
+                while self._pending and len(self._pending) >= maxsize:
+                    dropped.append(self._pending.popleft())
+                self.dropped += len(dropped)
+            self._pending.append(waiter)
+            if len(self._pending) > self.max_pending:
+                self.max_pending = len(self._pending)
+        for waiter in dropped:
+            waiter.fail(RequestDropped('too many requests waiting for an answer'))
+
+    def reserve(self, waiters, timeout=None):
+        """Wait until waiters fit without discarding any and keep the room
+        for them until they're registered or released. Returns False if the
+        timeout expired; waiters are registered all the same.
+
+        """
+        with self._not_full:
+            end = None if timeout is None else _clock() + timeout
+            while 0 < self._maxsize < len(self._pending) + len(self._reserved) + len(waiters):
+                remaining = None if end is None else end - _clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._not_full.wait(remaining)
+            self._reserved.update(waiters)
+            return True
+
+    def release(self, waiters):
+        """Give up the room reserved for waiters which won't be registered"""
+        with self._lock:
+            if self._reserved:
+                self._reserved.difference_update(waiters)
+                self._not_full.notify_all()
+
+    def dispatch(self, line):
+        key, _, value = line[4:].partition('=')
+        lost = []
+        with self._lock:
+            if not self._pending:
+                return
+            if key == 'ERROR':
+                waiter, value = self._pending.popleft(), None
+                self.errors += 1
+            else:
+                for waiter in self._pending:
+                    if waiter.key == key:
+                        break
+                else:
+                    # Not an answer to any known request
+                    return
+                # The answers to the preceding requests were lost
+                while self._pending[0] is not waiter:
+                    lost.append(self._pending.popleft())
+                self._pending.popleft()
+            if waiter.cancelled:
+                self.late += 1
+            self._not_full.notify_all()
+        # Completed outside of the lock, since futures run callbacks
+        for lost_waiter in lost:
+            lost_waiter.fail(AnswerLost('no answer for {0!r}'.format(lost_waiter.key)))
+        if self._metrics is not None and waiter.sent is not None:
+            self._metrics.observe('properties', waiter.key, _clock() - waiter.sent)
+        if not waiter.cancelled:
+            waiter.set(value)
+
+    def timed_out(self, count=1):
+        """Count requests whose answer didn't arrive in time"""
+        with self._lock:
+            self.timeouts += count
+
+    def cancel_all(self):
+        with self._lock:
+            pending, self._pending = self._pending, deque()
+            self._not_full.notify_all()
+        for waiter in pending:
+            waiter.fail(PlayerExited('MPlayer exited'))
+
+    def stats(self):
+        with self._lock:
+            return {'pending_answers': len(self._pending),
+                    'max_pending_answers': self.max_pending,
+                    'dropped_answers': self.dropped,
+                    'late_answers': self.late,
+                    'error_answers': self.errors,
+                    'timeouts': self.timeouts}
+
+
+class _Histogram(object):
+    """Histogram of durations with fixed, logarithmic buckets"""
+
+    # Upper bounds in seconds: 10 us to ~84 s, two buckets per doubling
+    BOUNDS = tuple(1e-5 * 2 ** (i / 2.0) for i in range(47))
+
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self):
+        super(_Histogram, self).__init__()
+        # The last bucket holds everything above the largest bound
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, pct):
+        """Returns the upper bound of the bucket holding the pct-th
+        percentile (at most the maximum), or None if empty
+
+        """
+        if not self.count:
+            return
+        rank = max(int(math.ceil(self.count * pct / 100.0)), 1)
+        seen = 0
+        for bound, n in zip(self.BOUNDS, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        """Returns a dict of count, sum, mean, max, p50, p90, p99 (seconds)
+        and buckets, a list of (upper bound, count) pairs of the non-empty
+        buckets (the bound of the last one is None, for infinity)
+
+        """
+        bounds = self.BOUNDS + (None, )
+        return {'count': self.count, 'sum': self.sum,
+                'mean': self.sum / self.count if self.count else None,
+                'max': self.max, 'p50': self.percentile(50),
+                'p90': self.percentile(90), 'p99': self.percentile(99),
+                'buckets': [(bound, count) for bound, count in
+                            zip(bounds, self.counts) if count]}
+
+
+class _Metrics(object):
+    """Latency histograms of a player, keyed on kind and name:
+
+    commands -- command name -> time from queueing a command until it was
+                written to MPlayer's stdin
+    properties -- property name -> time from sending 'get_property' until
+                  the answer was read
+    writes -- 'stdin' -> duration of the writes to MPlayer's stdin
+    dispatch -- 'stdout'/'stderr' -> time spent handling each chunk of
+                output (routing answers, calling subscribers)
+
+    Each observation is also passed to exporter(kind, name, seconds), if
+    set, from whichever thread made it.
+
+    """
+
+    KINDS = ('commands', 'properties', 'writes', 'dispatch')
+
+    def __init__(self, exporter=None):
+        super(_Metrics, self).__init__()
+        if exporter is not None and not hasattr(exporter, '__call__'):
+            raise TypeError('expected callable for exporter')
+        self.exporter = exporter
+        self._lock = Lock()
+        self._histograms = dict((kind, {}) for kind in self.KINDS)
+
+    def observe(self, kind, name, seconds):
+        with self._lock:
+            histograms = self._histograms[kind]
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = histograms[name] = _Histogram()
+            histogram.observe(seconds)
+        if self.exporter is not None:
+            try:
+                self.exporter(kind, name, seconds)
+            except Exception:
+                traceback.print_exc(file=sys.stderr)
+
+    def snapshot(self):
+        with self._lock:
+            return dict((kind, dict((name, histogram.snapshot())
+                                    for name, histogram in histograms.items()))
+                        for kind, histograms in self._histograms.items())
+
+
+def _command_name(data):
+    """Returns the name of the first command in data (bytes)"""
+    words = data.split(None, 2)
+    if len(words) > 1 and words[0].startswith(b'pausing'):
+        words = words[1:]
+    return words[0].decode('utf-8', 'replace') if words else ''
+
+
+class _PropertyCache(object):
+    """Cache of property values with per-property TTLs.
+
+    Entries are keyed on MPlayer property names. A TTL of None means that
+    the value is cached until the next file change (e.g. 'loadfile' or
+    'stop') while a TTL of 0 disables caching of that property. Values
+    fetched before an invalidation are never stored.
+
+    Attributes:
+    hits -- number of reads served from the cache
+    misses -- number of reads which had to ask MPlayer
+
+    """
+
+    # Properties which don't change for as long as the same file is loaded
+    STATIC = frozenset(['angle', 'aspect', 'audio_bitrate', 'audio_codec',
+        'audio_format', 'channels', 'chapters', 'demuxer', 'filename',
+        'fps', 'height', 'length', 'metadata', 'path', 'samplerate',
+        'stream_end', 'stream_length', 'stream_start', 'video_bitrate',
+        'video_codec', 'video_format', 'width'])
+    # Properties which change during playback
+    VOLATILE = frozenset(['chapter', 'percent_pos', 'stream_pos',
+        'stream_time_pos', 'time_pos'])
+    # Commands which change the loaded file
+    FILE_CHANGE = frozenset(['loadfile', 'loadlist', 'pt_step', 'pt_up_step',
+        'quit', 'stop'])
+
+    def __init__(self, ttls=None, default_ttl=1.0, volatile_ttl=0.1):
+        super(_PropertyCache, self).__init__()
+        self._ttls = dict.fromkeys(self.STATIC)
+        self._ttls.update(dict.fromkeys(self.VOLATILE, volatile_ttl))
+        if ttls is not None:
+            self._ttls.update(ttls)
+        self._default_ttl = default_ttl
+        # put() is called from the reader thread, everything else from
+        # the threads of the callers
+        self._lock = Lock()
+        # pname -> (value, expiry time or None)
+        self._entries = {}
+        self._counts = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def epoch(self):
+        """Changes whenever cached values become unreliable"""
+        return self._epoch
+
+    def get(self, pname, default=None):
+        with self._lock:
+            return self._get(pname, default)
+
+    def fill(self, result, props):
+        """Fill result with the cached values of props, a list of
+        (name, pname, ptype) tuples. Returns the props which weren't cached.
+
+        """
+        missing = []
+        with self._lock:
+            for prop in props:
+                value = self._get(prop[1], _MISSING)
+                if value is _MISSING:
+                    missing.append(prop)
+                else:
+                    result[prop[0]] = value
+        return missing
+
+    def put(self, pname, value, epoch):
+        """Cache value if nothing was invalidated since epoch"""
+        with self._lock:
+            self._put(pname, value, epoch)
+
+    def update(self, pname, value):
+        """Store a value which has just been written to MPlayer"""
+        with self._lock:
+            self._epoch += 1
+            self._put(pname, value, self._epoch)
+
+    def invalidate(self, pname=None):
+        """Drop one or all cached values"""
+        with self._lock:
+            self._epoch += 1
+            if pname is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(pname, None)
+
+    def command(self, name):
+        """Invalidate what the command with the given name may change"""
+        if name in self.FILE_CHANGE:
+            self.invalidate()
+            return
+        # Other commands (e.g. 'seek' or 'volume') may change any
+        # property of the current file, but not the static ones
+        with self._lock:
+            self._epoch += 1
+            for pname in list(self._entries):
+                if self._entries[pname][1] is not None:
+                    del self._entries[pname]
+
+    def stats(self):
+        """Returns the hit and miss counters, in total and per property"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'properties': dict((pname, tuple(counts))
+                                       for pname, counts in self._counts.items())}
+
+    def _get(self, pname, default):
+        entry = self._entries.get(pname)
+        if entry is not None and (entry[1] is None or entry[1] > _clock()):
+            self.hits += 1
+            self._count(pname, 0)
+            return entry[0]
+        self.misses += 1
+        self._count(pname, 1)
+        return default
+
+    def _put(self, pname, value, epoch):
+        if epoch != self._epoch:
+            return
+        ttl = self._ttls.get(pname, self._default_ttl)
+        if ttl is None:
+            self._entries[pname] = (value, None)
+        elif ttl > 0:
+            self._entries[pname] = (value, _clock() + ttl)
+
+    def _count(self, pname, index):
+        try:
+            self._counts[pname][index] += 1
+        except KeyError:
+            self._counts[pname] = [0, 0]
+            self._counts[pname][index] += 1
+
+
+class _CommandChannel(object):
+    """Writes commands to MPlayer's stdin from a dedicated thread.
+
+    Commands are queued as bytes along with the waiters for their answers,
+    if any. The writer thread drains the queue, registers the waiters with
+    the answer router and sends everything it got in a single write, so
+    callers never wait on pipe I/O unless the queue is full and the
+    overflow policy is Overflow.BLOCK. Subclasses may drain the queue by
+    other means by overriding _start().
+
+    """
+
+    def __init__(self, stream, router=None, maxsize=0, overflow=Overflow.BLOCK):
+        super(_CommandChannel, self).__init__()
+        if overflow not in (Overflow.BLOCK, Overflow.DROP_OLDEST, Overflow.RAISE):
+            raise ValueError('invalid overflow policy: {0}'.format(overflow))
+        self._stream = stream
+        self._router = router
+        self._maxsize = maxsize
+        self._overflow = overflow
+        self._queue = deque()
+        self._closed = False
+        self._metrics = None
+        lock = Lock()
+        self._not_empty = Condition(lock)
+        self._not_full = Condition(lock)
+        self._start()
+
+    def put(self, data, waiters=(), force=False, future=None):
+        """Queue data (bytes) for writing.
+        If force is True, the size limit is ignored. If future is not
+        None, it's completed once data is written.
+
+        """
+        with self._not_full:
+            if self._maxsize > 0 and not force:
+                while len(self._queue) >= self._maxsize and not self._closed:
+                    if self._overflow == Overflow.DROP_OLDEST:
+                        self._discard(self._queue.popleft(),
+                                      RequestDropped('command queue is full'))
+                    elif self._overflow == Overflow.RAISE:
+                        raise queue.Full('command queue is full')
+                    else:
+                        self._not_full.wait()
+            if self._closed:
+                self._discard((data, waiters, None, future), PlayerExited('MPlayer exited'))
+                return
+            # Queued at, if stats are enabled
+            stamp = _clock() if self._metrics is not None else None
+            self._queue.append((data, waiters, stamp, future))
+            self._not_empty.notify()
+
+    def qsize(self):
+        """Returns the number of unsent commands"""
+        return len(self._queue)
+
+    def close(self):
+        """Stop accepting commands. Queued commands are still written."""
+        with self._not_empty:
+            self._closed = True
+            self._not_empty.notify()
+            self._not_full.notify_all()
+
+    def _discard(self, entry, exc):
+        if entry[1] and self._router is not None:
+            self._router.release(entry[1])
+        for waiter in entry[1]:
+            waiter.fail(exc)
+        if entry[3] is not None:
+            _complete(entry[3], exception=exc)
+
+    def _take(self, block=True):
+        """Remove all queued commands and register their waiters.
+        Returns None once the channel is closed and drained, or an empty
+        list if block is False and nothing is queued.
+
+        """
+        with self._not_empty:
+            while block and not self._queue and not self._closed:
+                self._not_empty.wait()
+            if not self._queue:
+                return None if self._closed else []
+            batch = list(self._queue)
+            self._queue.clear()
+            self._not_full.notify_all()
+        # Waiters must be registered in the same order as the commands are sent
+        for entry in batch:
+            for waiter in entry[1]:
+                self._router.register(waiter)
+        return batch
+
+    def _fail(self, batch):
+        # MPlayer is gone; fail everything that's still pending
+        self.close()
+        with self._not_empty:
+            batch.extend(self._queue)
+            self._queue.clear()
+        exc = PlayerExited('MPlayer exited')
+        for entry in batch:
+            self._discard(entry, exc)
+
+    def _written(self, batch, started=None):
+        """Complete the futures of a batch which was written completely
+        and record its latencies
+
+        """
+        metrics = self._metrics
+        if metrics is not None:
+            now = _clock()
+            if started is not None:
+                metrics.observe('writes', 'stdin', now - started)
+            for data, waiters, stamp, future in batch:
+                if stamp is not None:
+                    metrics.observe('commands', _command_name(data), now - stamp)
+        for entry in batch:
+            if entry[3] is not None:
+                _complete(entry[3])
+
+    def _start(self):
+        t = Thread(target=self._thread_func)
+        t.daemon = True
+        t.start()
+
+    def _thread_func(self):
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            started = _clock() if self._metrics is not None else None
+            try:
+                self._stream.write(b''.join([entry[0] for entry in batch]))
+                self._stream.flush()
+            except (IOError, OSError, ValueError):
+                self._fail(batch)
+                return
+            self._written(batch, started)
+
+
+class _Observation(object):
+    """A property which is polled at a fixed interval"""
+
+    __slots__ = ('pname', 'ptype', 'interval', 'due', 'callbacks', 'value')
+
+    def __init__(self, pname, ptype, interval):
+        super(_Observation, self).__init__()
+        self.pname = pname
+        self.ptype = ptype
+        self.interval = interval
+        self.due = _clock()
+        # List of (name, callback) pairs
+        self.callbacks = []
+        self.value = _MISSING
+
+
+class _ObserverScheduler(object):
+    """Polls observed properties of all players from a single thread.
+
+    On each tick, the due properties of every player are requested with a
+    single pipelined write per player, then the answers of all players are
+    collected. Callbacks are only called when a value changed.
+
+    """
+
+    def __init__(self):
+        super(_ObserverScheduler, self).__init__()
+        self._lock = Lock()
+        self._wakeup = Condition(self._lock)
+        # id(player) -> (weakref to player, list of observations)
+        self._players = {}
+        self._thread = None
+
+    def add(self, player, name, pname, ptype, callback, interval):
+        with self._lock:
+            entry = self._players.get(id(player))
+            if entry is None or entry[0]() is not player:
+                entry = self._players[id(player)] = (weakref.ref(player), [])
+            for obs in entry[1]:
+                if obs.pname == pname and obs.interval == interval:
+                    break
+            else:
+                obs = _Observation(pname, ptype, interval)
+                entry[1].append(obs)
+            if (name, callback) not in obs.callbacks:
+                obs.callbacks.append((name, callback))
+            if self._thread is None:
+                self._thread = Thread(target=self._thread_func)
+                self._thread.daemon = True
+                self._thread.start()
+            self._wakeup.notify()
+
+    def remove(self, player, pname=None, callback=None):
+        with self._lock:
+            entry = self._players.get(id(player))
+            if entry is None or entry[0]() is not player:
+                return
+            for obs in list(entry[1]):
+                if pname is not None and obs.pname != pname:
+                    continue
+                obs.callbacks = [(n, cb) for n, cb in obs.callbacks
+                                 if callback is not None and cb != callback]
+                if not obs.callbacks:
+                    entry[1].remove(obs)
+            if not entry[1]:
+                del self._players[id(player)]
+
+    def _thread_func(self):
+        while True:
+            with self._lock:
+                now = _clock()
+                due = []
+                next_due = None
+                for key, (ref, observations) in list(self._players.items()):
+                    player = ref()
+                    if player is None:
+                        del self._players[key]
+                        continue
+                    ready = [obs for obs in observations if obs.due <= now]
+                    if ready:
+                        due.append((player, ready))
+                    for obs in observations:
+                        if obs.due > now and (next_due is None or obs.due < next_due):
+                            next_due = obs.due
+                if not due:
+                    self._wakeup.wait(None if next_due is None else next_due - now)
+                    continue
+            self._tick(due, now)
+            # Don't keep the players alive while waiting
+            del due, player
+
+    def _tick(self, due, now):
+        # The answers of all players are collected within one timeout, so
+        # that a stalled player doesn't delay the others any further
+        started = _clock()
+        batches = []
+        for player, observations in due:
+            pnames = list(set([obs.pname for obs in observations]))
+            waiters = player._send_queries(pnames)
+            batches.append((player, observations, pnames, waiters))
+            for obs in observations:
+                obs.due += obs.interval
+                if obs.due <= now:
+                    obs.due = now + obs.interval
+        for player, observations, pnames, waiters in batches:
+            if waiters is None:
+                continue
+            remaining = max(started + player.timeout - _clock(), 0)
+            answers = dict(zip(pnames, player._collect_answers(waiters, remaining)))
+            for obs in observations:
+                value = answers[obs.pname]
+                if value is not None:
+                    value = obs.ptype.convert(value)
+                if obs.value is not _MISSING and value == obs.value:
+                    continue
+                obs.value = value
+                for name, callback in obs.callbacks:
+                    try:
+                        callback(name, value)
+                    except Exception:
+                        # Don't let one callback stop the polling of all players
+                        traceback.print_exc(file=sys.stderr)
+
+
+_scheduler = _ObserverScheduler()
+
+
+class _TimeoutScheduler(object):
+    """Expires the _FutureWaiters of all players from a single thread"""
+
+    def __init__(self):
+        super(_TimeoutScheduler, self).__init__()
+        self._lock = Lock()
+        self._wakeup = Condition(self._lock)
+        # (deadline, sequence number, waiter, router) heap
+        self._heap = []
+        self._seq = count()
+        self._thread = None
+
+    def add(self, waiter, timeout, router):
+        """Expire waiter after timeout seconds and count the timeout in
+        router, unless it's answered by then
+
+        """
+        with self._lock:
+            entry = (_clock() + timeout, next(self._seq), waiter, router)
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = Thread(target=self._thread_func)
+                self._thread.daemon = True
+                self._thread.start()
+            # Only wake up if the earliest deadline changed
+            if self._heap[0] is entry:
+                self._wakeup.notify()
+
+    def _thread_func(self):
+        while True:
+            with self._lock:
+                now = _clock()
+                expired = []
+                while self._heap and self._heap[0][0] <= now:
+                    expired.append(heapq.heappop(self._heap))
+                if not expired:
+                    self._wakeup.wait(self._heap[0][0] - now if self._heap else None)
+                    continue
+            for deadline, seq, waiter, router in expired:
+                if waiter.expire():
+                    router.timed_out()
+            del expired, waiter, router
+
+
+_timeouts = _TimeoutScheduler()
+
+
+def _pidfd_supported():
+    if not hasattr(os, 'pidfd_open'):
+        return False
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        # Kernel older than 5.3
+        return False
+    return True
+
+
+class _ExitWatcher(object):
+    """Reports the exit of child processes of all players from a single
+    thread.
+
+    Where pidfds are available (Linux 5.3+, Python 3.9+), the thread waits
+    on one per process and reports an exit as soon as it happens, so every
+    process is watched. Elsewhere, only processes watched with poll=True
+    are polled every poll_interval seconds.
+
+    """
+
+    poll_interval = 0.05
+
+    def __init__(self):
+        super(_ExitWatcher, self).__init__()
+        self.precise = _pidfd_supported()
+        self._lock = Lock()
+        self._wakeup = Condition(self._lock)
+        # (process, callback) pairs to be picked up by the thread
+        self._added = []
+        self._pipe = None
+        self._thread = None
+
+    def watch(self, proc, callback, poll=False):
+        """Call callback(proc) from the watcher thread once proc (a
+        subprocess.Popen) has exited; proc.returncode is set by then.
+        Returns False if proc isn't watched (see poll).
+
+        """
+        if not (self.precise or poll):
+            return False
+        with self._lock:
+            self._added.append((proc, callback))
+            if self._thread is None:
+                if self.precise:
+                    self._pipe = os.pipe()
+                    target = self._select_loop
+                else:
+                    target = self._poll_loop
+                self._thread = Thread(target=target)
+                self._thread.daemon = True
+                self._thread.start()
+            if self.precise:
+                os.write(self._pipe[1], b'\0')
+            else:
+                self._wakeup.notify()
+        return True
+
+    def _take_added(self):
+        with self._lock:
+            added, self._added = self._added, []
+        return added
+
+    def _select_loop(self):
+        # Only used with pidfds (Python 3.9+); every backend imports this
+        # module, some of them on Python 2
+        import selectors
+
+        selector = selectors.DefaultSelector()
+        selector.register(self._pipe[0], selectors.EVENT_READ)
+        # Processes which exited but couldn't be reaped yet (e.g. because
+        # quit() is waiting for them in another thread)
+        polled = []
+        while True:
+            ready = selector.select(self.poll_interval if polled else None)
+            for key, mask in ready:
+                if key.data is None:
+                    os.read(key.fd, 4096)
+                    continue
+                selector.unregister(key.fd)
+                os.close(key.fd)
+                polled.append(key.data)
+            for entry in self._take_added():
+                try:
+                    fd = os.pidfd_open(entry[0].pid)
+                except OSError:
+                    # Already reaped
+                    polled.append(entry)
+                    continue
+                selector.register(fd, selectors.EVENT_READ, entry)
+            polled = self._check(polled)
+
+    def _poll_loop(self):
+        entries = []
+        while True:
+            with self._lock:
+                if not self._added:
+                    self._wakeup.wait(self.poll_interval if entries else None)
+            entries.extend(self._take_added())
+            entries = self._check(entries)
+
+    @staticmethod
+    def _check(entries):
+        """Report the processes of entries which exited.
+        Returns the entries of the others.
+
+        """
+        running = []
+        for proc, callback in entries:
+            if proc.poll() is None:
+                running.append((proc, callback))
+                continue
+            try:
+                callback(proc)
+            except Exception:
+                # Don't let one callback stop the watching of all processes
+                traceback.print_exc(file=sys.stderr)
+        return running
+
+
+_exits = _ExitWatcher()
+
+
+class _LineReader(object):
+    """Splits the output of MPlayer into lines.
+
+    Data is read in large chunks into a reusable buffer. All complete lines
+    of a chunk are split off at once and a trailing partial line is kept at
+    the start of the buffer for the next chunk. Lines are returned as bytes
+    without the newline; decoding is left to the consumer.
+
+    """
+
+    def __init__(self, size=65536):
+        super(_LineReader, self).__init__()
+        self._buf = bytearray(size)
+        # Length of the partial line at the start of the buffer
+        self._len = 0
+
+    def read(self, fd):
+        """Read once from fd. Returns a list of lines or None at EOF."""
+        if self._len == len(self._buf):
+            # A single line fills the whole buffer
+            self._buf.extend(bytearray(len(self._buf)))
+        if _readv is None:
+            return self.feed(os.read(fd, len(self._buf) - self._len))
+        view = memoryview(self._buf)[self._len:]
+        try:
+            count = _readv(fd, [view])
+        finally:
+            # The buffer can't be resized while it's viewed. Deleting the
+            # view also works where memoryview has no release() (Python 2).
+            del view
+        if not count:
+            return self._eof()
+        return self._split(self._len + count)
+
+    def feed(self, data):
+        """Add data read by other means. Returns a list of lines or None
+        if data is empty (i.e. at EOF).
+
+        """
+        if not data:
+            return self._eof()
+        end = self._len + len(data)
+        if end > len(self._buf):
+            self._buf.extend(bytearray(end - len(self._buf)))
+        self._buf[self._len:end] = data
+        return self._split(end)
+
+    def _split(self, end):
+        buf = self._buf
+        last = buf.rfind(b'\n', 0, end)
+        if last < 0:
+            self._len = end
+            return []
+        view = memoryview(buf)[:last]
+        try:
+            # tobytes(), since bytes() of a memoryview is its repr on Python 2
+            lines = view.tobytes().split(b'\n')
+        finally:
+            del view
+        # Move the partial line to the start of the buffer
+        self._len = end - last - 1
+        buf[:self._len] = buf[last + 1:end]
+        return lines
+
+    def _eof(self):
+        if not self._len:
+            return
+        # Return the unterminated last line first
+        line = bytes(self._buf[:self._len])
+        self._len = 0
+        return [line]
+
+
+_readv = getattr(os, 'readv', None)
+
+# Patterns with backreferences can't be safely combined with others
+_backref = re.compile(r'\\[1-9]|\(\?P=')
+
+
+class _LineFilter(object):
+    """Routes lines to the subscribers whose prefix and/or regex matches.
+
+    Prefixes are bucketed by length, so finding the subscribers of a line
+    takes one dict lookup per distinct prefix length rather than one call
+    per subscriber. Regex-only filters are combined into a single pattern
+    which rejects most lines with one search(). Instances are immutable;
+    the publisher replaces its filter on every change.
+
+    """
+
+    def __init__(self, entries=()):
+        super(_LineFilter, self).__init__()
+        # (subscriber, prefix, regex) tuples in the order of connect()
+        self.entries = tuple(entries)
+        # length -> {prefix: [(subscriber, regex)]}
+        prefixes = {}
+        self._regexes = []
+        for subscriber, prefix, regex in self.entries:
+            if prefix is None:
+                self._regexes.append((subscriber, regex))
+            else:
+                table = prefixes.setdefault(len(prefix), {})
+                table.setdefault(prefix, []).append((subscriber, regex))
+        self._prefixes = sorted(prefixes.items())
+        self._prefilter = None
+        patterns = [regex for subscriber, regex in self._regexes]
+        if len(patterns) > 1 and all(r.flags == patterns[0].flags and
+                                     not _backref.search(r.pattern)
+                                     for r in patterns):
+            try:
+                self._prefilter = re.compile('|'.join(['(?:{0})'.format(r.pattern)
+                                                       for r in patterns]),
+                                             patterns[0].flags)
+            except (re.error, TypeError, ValueError):
+                pass
+
+    def route(self, line):
+        for length, table in self._prefixes:
+            matches = table.get(line[:length])
+            if matches is not None:
+                for subscriber, regex in matches:
+                    if regex is None or regex.search(line) is not None:
+                        subscriber(line)
+        if self._regexes and (self._prefilter is None or
+                              self._prefilter.search(line) is not None):
+            for subscriber, regex in self._regexes:
+                if regex.search(line) is not None:
+                    subscriber(line)
+
+
+class _QueuedSubscriber(object):
+    """Calls a subscriber from its own thread through a bounded queue.
+
+    Compares equal to the wrapped subscriber so that it can be disconnected
+    by passing the original callable.
+
+    """
+
+    def __init__(self, subscriber, maxsize=0, overflow=Overflow.DROP_OLDEST):
+        super(_QueuedSubscriber, self).__init__()
+        if overflow not in (Overflow.BLOCK, Overflow.DROP_OLDEST):
+            raise ValueError('invalid overflow policy: {0}'.format(overflow))
+        self.subscriber = subscriber
+        self.dropped = 0
+        self._maxsize = maxsize
+        self._overflow = overflow
+        self._queue = deque()
+        self._closed = False
+        lock = Lock()
+        self._not_empty = Condition(lock)
+        self._not_full = Condition(lock)
+        t = Thread(target=self._thread_func)
+        t.daemon = True
+        t.start()
+
+    def __call__(self, item):
+        with self._not_full:
+            while 0 < self._maxsize <= len(self._queue) and not self._closed:
+                if self._overflow == Overflow.DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    self._not_full.wait()
+            if self._closed:
+                return
+            self._queue.append(item)
+            self._not_empty.notify()
+
+    def __eq__(self, other):
+        if isinstance(other, _QueuedSubscriber):
+            other = other.subscriber
+        return self.subscriber == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.subscriber)
+
+    def close(self):
+        """Stop the thread; items which weren't delivered yet are discarded"""
+        with self._not_empty:
+            self._closed = True
+            self._queue.clear()
+            self._not_empty.notify()
+            self._not_full.notify_all()
+
+    def _thread_func(self):
+        while True:
+            with self._not_empty:
+                while not self._queue and not self._closed:
+                    self._not_empty.wait()
+                if self._closed:
+                    return
+                batch = list(self._queue)
+                self._queue.clear()
+                self._not_full.notify_all()
+            for item in batch:
+                try:
+                    self.subscriber(item)
+                except Exception:
+                    traceback.print_exc(file=sys.stderr)
+
+
 class _StderrWrapper(object):
 
+    # Name of the stream in stats
+    _name = 'stderr'
+
     def __init__(self, **kwargs):
         super(_StderrWrapper, self).__init__()
         self._handle = kwargs['handle']
         self._source = None
         self._subscribers = []
+        self._filter = _LineFilter()
+        # event type -> list of subscribers
+        self._event_subscribers = {}
+        # Lines dropped by the queues of disconnected subscribers
+        self._dropped = 0
+        self._lines = 0
+        self._metrics = None
+        self._reader = _LineReader()
 
     def _attach(self, source):
         self._source = source
+        self._reader = _LineReader()
 
     def _detach(self):
         self._source = None
 
     def _process_output(self, *args):
-        line = self._source.readline().decode('utf-8', 'ignore')
-        if line:
-            line = line.rstrip()
-            if line:
-                for subscriber in self._subscribers:
-                    subscriber(line)
+        lines = self._read_lines()
+        if lines is not None:
+            self._process_lines(lines)
             return True
         else:
             # Automatically detach when MPlayer dies unexpectedly
             self._detach()
             return False
 
-    def connect(self, subscriber):
-        """Connect a subscriber to this publisher"""
+    def _read_lines(self):
+        """Read the next chunk of output. Returns a list of lines (bytes)
+        or None at EOF.
+
+        """
+        return self._reader.read(self._source.fileno())
+
+    def _process_lines(self, lines):
+        self._lines += len(lines)
+        metrics = self._metrics
+        if metrics is None:
+            self._dispatch_lines(lines)
+        else:
+            start = _clock()
+            self._dispatch_lines(lines)
+            metrics.observe('dispatch', self._name, _clock() - start)
+
+    def _dispatch_lines(self, lines):
+        line_filter = self._filter
+        # Only decode if somebody is listening
+        if not (self._subscribers or line_filter.entries or self._event_subscribers):
+            return
+        subscribers = self._subscribers
+        route = line_filter.route if line_filter.entries else None
+        publish_events = bool(self._event_subscribers)
+        for line in lines:
+            line = line.decode('utf-8', 'ignore').rstrip()
+            if not line:
+                continue
+            # Each line reaches every subscriber before the next one does
+            for subscriber in subscribers:
+                subscriber(line)
+            if route is not None:
+                route(line)
+            if publish_events:
+                event = events.parse(line)
+                if event is not None:
+                    self._publish(event)
+
+    def _publish_events(self, lines):
+        # Parse each line once, regardless of the number of subscribers
+        for line in lines:
+            event = events.parse(line)
+            if event is not None:
+                self._publish(event)
+
+    def _publish(self, event):
+        event_subscribers = self._event_subscribers
+        # Subscribers of a base class (e.g. Event) get the subclasses too
+        for cls in type(event).__mro__[:-1]:
+            for subscriber in event_subscribers.get(cls, ()):
+                subscriber(event)
+
+    def connect(self, subscriber, prefix=None, regex=None, queue_size=None,
+                overflow=Overflow.DROP_OLDEST):
+        """Connect a subscriber to this publisher
+
+        prefix -- only pass the lines which start with prefix (default: None)
+        regex -- only pass the lines in which the regular expression (str or
+                 compiled) finds a match (default: None)
+        queue_size -- if not None, call subscriber from its own thread
+                      through a queue of at most queue_size lines (0 means
+                      unbounded) so that it can't stall the reader
+        overflow -- what to do when that queue is full: Overflow.DROP_OLDEST
+                    or Overflow.BLOCK (default: Overflow.DROP_OLDEST)
+
+        """
         if not hasattr(subscriber, '__call__'):
             # Raise TypeError
             subscriber()
-        if subscriber not in self._subscribers:
-            self._subscribers.append(subscriber)
+        if regex is not None:
+            regex = re.compile(regex)
+        if prefix is None and regex is None:
+            if subscriber not in self._subscribers:
+                self._subscribers.append(self._queued(subscriber, queue_size, overflow))
+            return
+        if not any(entry[0] == subscriber and entry[1:] == (prefix, regex)
+                   for entry in self._filter.entries):
+            entry = (self._queued(subscriber, queue_size, overflow), prefix, regex)
+            self._filter = _LineFilter(self._filter.entries + (entry, ))
 
     def disconnect(self, subscriber=None):
         """Disconnect one or all subscribers from this publisher"""
         if subscriber is None:
+            removed = self._subscribers + [entry[0] for entry in self._filter.entries]
             self._subscribers = []
-        elif subscriber in self._subscribers:
-            self._subscribers.remove(subscriber)
+            self._filter = _LineFilter()
+        else:
+            removed = [s for s in self._subscribers if s == subscriber]
+            if removed:
+                self._subscribers.remove(subscriber)
+            entries = [entry for entry in self._filter.entries if entry[0] != subscriber]
+            if len(entries) != len(self._filter.entries):
+                removed.extend([entry[0] for entry in self._filter.entries
+                                if entry[0] == subscriber])
+                self._filter = _LineFilter(entries)
+        self._close(removed)
+
+    def subscribe(self, event_type, subscriber, queue_size=None,
+                  overflow=Overflow.DROP_OLDEST):
+        """Call subscriber with each event of event_type (a subclass of
+        mplayer.events.Event) parsed from this publisher's output.
+        queue_size and overflow are the same as in connect().
+
+        """
+        if not (isinstance(event_type, type) and issubclass(event_type, events.Event)):
+            raise TypeError('expected a subclass of mplayer.events.Event')
+        if not hasattr(subscriber, '__call__'):
+            # Raise TypeError
+            subscriber()
+        subscribers = self._event_subscribers.get(event_type, [])
+        if subscriber not in subscribers:
+            # Copy on write; the reader thread may be iterating over these
+            event_subscribers = dict(self._event_subscribers)
+            event_subscribers[event_type] = subscribers + [
+                self._queued(subscriber, queue_size, overflow)]
+            self._event_subscribers = event_subscribers
+
+    def unsubscribe(self, event_type=None, subscriber=None):
+        """Unsubscribe subscriber (default: all) from event_type
+        (default: all event types)
+
+        """
+        event_subscribers = {}
+        removed = []
+        for cls, subscribers in self._event_subscribers.items():
+            if event_type is None or cls is event_type:
+                kept = [s for s in subscribers
+                        if subscriber is not None and s != subscriber]
+                removed.extend([s for s in subscribers if s not in kept])
+                subscribers = kept
+            if subscribers:
+                event_subscribers[cls] = subscribers
+        self._event_subscribers = event_subscribers
+        self._close(removed)
+
+    def stats(self):
+        """Returns a dict of counters:
+
+        lines -- lines read
+        dropped_lines -- lines (and events) discarded by full subscriber queues
+
+        """
+        subscribers = self._subscribers + [entry[0] for entry in self._filter.entries]
+        for event_type_subscribers in self._event_subscribers.values():
+            subscribers.extend(event_type_subscribers)
+        return {'lines': self._lines, 'dropped_lines': self._dropped + sum(
+            [s.dropped for s in subscribers if isinstance(s, _QueuedSubscriber)])}
+
+    @staticmethod
+    def _queued(subscriber, queue_size, overflow):
+        if queue_size is None:
+            return subscriber
+        return _QueuedSubscriber(subscriber, queue_size, overflow)
+
+    def _close(self, subscribers):
+        for subscriber in subscribers:
+            if isinstance(subscriber, _QueuedSubscriber):
+                subscriber.close()
+                self._dropped += subscriber.dropped
 
 
 class _StdoutWrapper(_StderrWrapper):
 
+    _name = 'stdout'
+
     def __init__(self, **kwargs):
         super(_StdoutWrapper, self).__init__(**kwargs)
-        self._answers = None
+        self._router = _AnswerRouter()
 
-    def _attach(self, source):
-        super(_StdoutWrapper, self)._attach(source)
-        self._answers = queue.Queue()
+    def _detach(self):
+        super(_StdoutWrapper, self)._detach()
+        # Nothing will answer the pending requests anymore
+        self._router.cancel_all()
 
-    def _process_output(self, *args):
-        line = self._source.readline().decode('utf-8', 'ignore')
-        if line:
-            line = line.rstrip()
-            if line.startswith('ANS_'):
-                self._answers.put_nowait(line)
-            elif line:
-                for subscriber in self._subscribers:
-                    subscriber(line)
-            return True
-        else:
-            # Automatically detach when MPlayer dies unexpectedly
-            self._detach()
-            return False
+    def stats(self):
+        """Returns a dict of counters:
+
+        lines -- lines read
+        dropped_lines -- lines (and events) discarded by full subscriber queues
+        pending_answers -- number of requests waiting for an answer
+        max_pending_answers -- highest number of requests waiting at once
+        dropped_answers -- requests discarded because too many were pending
+        late_answers -- answers which arrived after their request timed out
+        error_answers -- ANS_ERROR answers
+        timeouts -- requests whose answer didn't arrive in time
+
+        """
+        stats = super(_StdoutWrapper, self).stats()
+        stats.update(self._router.stats())
+        return stats
+
+    def _dispatch_lines(self, lines):
+        # Keep the order of the output: the lines before an answer are
+        # dispatched before the answer is routed and published
+        start = 0
+        for i, line in enumerate(lines):
+            if line.startswith(b'ANS_'):
+                if start < i:
+                    super(_StdoutWrapper, self)._dispatch_lines(lines[start:i])
+                start = i + 1
+                answer = line.decode('utf-8', 'ignore').rstrip()
+                self._router.dispatch(answer)
+                if self._event_subscribers:
+                    self._publish_events([answer])
+        if not start:
+            super(_StdoutWrapper, self)._dispatch_lines(lines)
+        elif start < len(lines):
+            super(_StdoutWrapper, self)._dispatch_lines(lines[start:])
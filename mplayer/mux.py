@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import selectors
+import traceback
+from collections import deque
+from itertools import count
+from subprocess import PIPE
+from threading import Lock, Thread, get_ident
+
+from mplayer.core import Player
+from mplayer import misc
+
+
+__all__ = ['MuxPlayer']
+
+
+class MuxPlayer(Player):
+    """Player subclass with multiplexed I/O.
+
+    Instead of a reader thread per pipe and a writer thread per process,
+    the pipes of all MuxPlayer instances are serviced by a small, fixed
+    number of selectors-based I/O threads (see MuxPlayer.io_threads).
+    The usual subscriber machinery of stdout and stderr is unchanged,
+    but subscribers are called from the shared I/O thread and should
+    return quickly.
+
+    Class attributes:
+    io_threads -- number of I/O threads shared by all instances (default: 1)
+
+    """
+
+    io_threads = 1
+
+    def __init__(self, args=(), stdout=PIPE, stderr=None, autospawn=True):
+        super(MuxPlayer, self).__init__(args, autospawn=False)
+        self._loop = _get_loop(self.io_threads)
+        self._stdout = _StdoutWrapper(handle=stdout, loop=self._loop)
+        self._stderr = _StderrWrapper(handle=stderr, loop=self._loop)
+        if autospawn:
+            self.spawn()
+
+    def _open_channel(self):
+        return _MuxChannel(self._loop, self._proc.stdin, self._stdout._router,
+                           self.cmd_queue_size, self.cmd_overflow)
+
+
+class _IOLoop(object):
+    """A selectors-based I/O thread.
+
+    The selector is only ever touched by the I/O thread. Other threads ask
+    for changes via call_soon(), which wakes the thread up through a pipe.
+
+    """
+
+    def __init__(self):
+        super(_IOLoop, self).__init__()
+        self._selector = selectors.DefaultSelector()
+        self._calls = deque()
+        self._lock = Lock()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._thread = Thread(target=self._thread_func)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def in_thread(self):
+        """Returns True if called from the I/O thread"""
+        return self._thread.ident == get_ident()
+
+    def call_soon(self, func, *args):
+        """Call func(*args) from the I/O thread"""
+        if self.in_thread():
+            func(*args)
+            return
+        with self._lock:
+            self._calls.append((func, args))
+        try:
+            os.write(self._wakeup_w, b'\0')
+        except BlockingIOError:
+            # A wakeup is already pending
+            pass
+
+    def set_events(self, fd, event, handler):
+        """Add (handler is not None) or remove interest in event for fd.
+        Must be called from the I/O thread.
+
+        """
+        try:
+            key = self._selector.get_key(fd)
+        except KeyError:
+            key = None
+        handlers = dict(key.data) if key is not None else {}
+        if handler is None:
+            handlers.pop(event, None)
+        else:
+            handlers[event] = handler
+        events = 0
+        for e in handlers:
+            events |= e
+        if key is None:
+            if events:
+                self._selector.register(fd, events, handlers)
+        elif not events:
+            self._selector.unregister(fd)
+        else:
+            self._selector.modify(fd, events, handlers)
+
+    def _thread_func(self):
+        while True:
+            for key, mask in self._selector.select():
+                if key.fd == self._wakeup_r:
+                    self._run_calls()
+                    continue
+                for event, handler in list(key.data.items()):
+                    if mask & event:
+                        self._call(handler)
+            # Run calls made by the handlers themselves
+            if self._calls:
+                self._run_calls()
+
+    def _run_calls(self):
+        try:
+            while os.read(self._wakeup_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self._lock:
+            calls = list(self._calls)
+            self._calls.clear()
+        for func, args in calls:
+            self._call(func, *args)
+
+    @staticmethod
+    def _call(func, *args):
+        try:
+            func(*args)
+        except Exception:
+            # Don't let a single player stop the I/O of all players
+            traceback.print_exc(file=sys.stderr)
+
+
+_loops = []
+_next_loop = count()
+_loops_lock = Lock()
+
+
+def _get_loop(io_threads):
+    """Returns the I/O loops round robin, starting them as needed"""
+    with _loops_lock:
+        while len(_loops) < max(io_threads, 1):
+            _loops.append(_IOLoop())
+        return _loops[next(_next_loop) % max(io_threads, 1)]
+
+
+class _MuxChannel(misc._CommandChannel):
+    """Command channel which is written to by the I/O loop"""
+
+    def __init__(self, loop, stream, router=None, maxsize=0,
+                 overflow=misc.Overflow.BLOCK):
+        self._loop = loop
+        self._fd = stream.fileno()
+        self._pending = b''
+        # Commands in _pending, completed once it's written
+        self._unwritten = []
+        os.set_blocking(self._fd, False)
+        super(_MuxChannel, self).__init__(stream, router, maxsize, overflow)
+
+    def _start(self):
+        pass
+
+    def put(self, data, waiters=(), force=False, future=None):
+        super(_MuxChannel, self).put(data, waiters, force, future)
+        self._loop.call_soon(self._loop.set_events, self._fd,
+                             selectors.EVENT_WRITE, self._on_writable)
+
+    def close(self):
+        super(_MuxChannel, self).close()
+        # Make sure the remaining commands are written
+        self._loop.call_soon(self._loop.set_events, self._fd,
+                             selectors.EVENT_WRITE, self._on_writable)
+
+    def _on_writable(self):
+        batch = self._take(block=False)
+        if batch:
+            self._pending += b''.join([entry[0] for entry in batch])
+            self._unwritten.extend(batch)
+        try:
+            if self._pending:
+                written = os.write(self._fd, self._pending)
+                self._pending = self._pending[written:]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self._pending = b''
+            unwritten, self._unwritten = self._unwritten, []
+            self._fail(unwritten)
+        if not self._pending:
+            if self._unwritten:
+                unwritten, self._unwritten = self._unwritten, []
+                self._written(unwritten)
+            self._loop.set_events(self._fd, selectors.EVENT_WRITE, None)
+
+
+class _StderrWrapper(misc._StderrWrapper):
+
+    def __init__(self, **kwargs):
+        super(_StderrWrapper, self).__init__(**kwargs)
+        self._loop = kwargs['loop']
+        self._fd = None
+
+    def _attach(self, source):
+        super(_StderrWrapper, self)._attach(source)
+        self._fd = source.fileno()
+        self._loop.call_soon(self._loop.set_events, self._fd,
+                             selectors.EVENT_READ, self._on_readable)
+
+    def _detach(self):
+        super(_StderrWrapper, self)._detach()
+        if self._fd is not None:
+            self._loop.call_soon(self._loop.set_events, self._fd,
+                                 selectors.EVENT_READ, None)
+            self._fd = None
+
+    def _on_readable(self):
+        # A single read never blocks once select() reported the pipe readable
+        if self._source is not None:
+            self._process_output()
+
+
+class _StdoutWrapper(_StderrWrapper, misc._StdoutWrapper):
+    pass
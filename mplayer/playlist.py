@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+
+"""Gapless playback of a list of files
+
+Loading a file only once the previous one ended leaves a gap while MPlayer
+opens and buffers it. A Playlist avoids it with a second MPlayer process:
+while one plays the current entry, the next one is loaded into the other
+(the standby) and paused at its start. When the current entry ends, the
+standby is resumed and the roles swap; the old process becomes the standby
+of the entry after.
+
+    playlist = Playlist(['/path/to/a.flac', '/path/to/b.flac'])
+    playlist.extend(more_paths)
+    playlist.shuffle()
+    playlist.play()
+
+Appending, skipping and shuffling take constant time, even for lists of
+100k entries; a shuffled order is drawn one entry at a time.
+
+"""
+
+import shlex
+import random
+from functools import partial
+from threading import Lock
+
+from mplayer.core import Player, _encode_command
+from mplayer import events, misc, mtypes
+
+
+__all__ = ['Playlist']
+
+
+# EOF code of a file which played until its end
+_EOF_END = 1
+
+
+class _Order(object):
+    """The play order of a list of entries.
+
+    While shuffled, the order is a random permutation of the entries which
+    is drawn lazily, Fisher-Yates style: each step fixes the next position
+    by swapping in a random one of the positions after it. Only the
+    positions touched so far are stored. Entries appended in the meantime
+    join the undrawn part.
+
+    """
+
+    def __init__(self):
+        super(_Order, self).__init__()
+        self.entries = []
+        # Position of the current entry; -1 before the first one
+        self.pos = -1
+        # position -> index into entries of the touched positions, or
+        # None if not shuffled
+        self._perm = None
+        # Positions below this one are drawn
+        self._drawn = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, entry):
+        self.entries.append(entry)
+
+    def index(self, pos):
+        """Returns the index into entries of the entry at pos (< len)"""
+        perm = self._perm
+        if perm is None:
+            return pos
+        while self._drawn <= pos:
+            i = self._drawn
+            j = random.randrange(i, len(self.entries))
+            perm[i], perm[j] = perm.get(j, j), perm.get(i, i)
+            self._drawn += 1
+        return perm.get(pos, pos)
+
+    def current(self):
+        if 0 <= self.pos < len(self.entries):
+            return self.entries[self.index(self.pos)]
+
+    def peek(self):
+        """Returns the entry after the current one, or None"""
+        if self.pos + 1 < len(self.entries):
+            return self.entries[self.index(self.pos + 1)]
+
+    def advance(self):
+        """Make the next entry the current one and return it.
+        Returns None at the end.
+
+        """
+        self.pos = min(self.pos + 1, len(self.entries))
+        return self.current()
+
+    def shuffle(self, enabled):
+        """Start a new random order after the current entry, or go back to
+        the list order, continuing after the current entry
+
+        """
+        current = self.index(self.pos) if self.current() is not None else None
+        if not enabled:
+            self._perm = None
+            if current is not None:
+                self.pos = current
+            return
+        if current is None:
+            # Not started or at the end; shuffle everything
+            self.pos = -1
+            self._perm = {}
+            self._drawn = 0
+        else:
+            # Keep the current entry at the first position
+            self.pos = 0
+            self._perm = {0: current, current: 0} if current else {}
+            self._drawn = 1
+
+
+class Playlist(object):
+    """Plays a list of files (paths or URLs) without gaps between them.
+
+    Two instances of player_class are spawned with args. Settings which
+    are changed through player while an entry plays (e.g. volume) aren't
+    carried over to the next entry; pass them in args instead.
+
+    The gap between two entries is measured from the EOF line of the old
+    entry being read (or skip() being called) until the command which
+    resumes the new entry has been written; see stats().
+
+    Only thread-based Player classes are supported.
+
+    """
+
+    def __init__(self, paths=(), args=(), player_class=Player, shuffle=False):
+        """Arguments:
+
+        paths -- initial entries (default: ())
+        args -- additional MPlayer arguments (default: ())
+        player_class -- Player (sub)class to instantiate (default: Player)
+        shuffle -- play in a random order (default: False)
+
+        """
+        super(Playlist, self).__init__()
+        try:
+            args = shlex.split(args)
+        except AttributeError:
+            args = [str(arg) for arg in args]
+        # MPlayer only reports the end of a file at verbosity level 6
+        args = list(args) + ['-msglevel', 'global=6']
+        self._lock = Lock()
+        self._order = _Order()
+        self._order.entries.extend(paths)
+        if shuffle:
+            self._order.shuffle(True)
+        self._players = [player_class(args), player_class(args)]
+        self._active, self._standby = self._players
+        # The entry which is loaded into the standby
+        self._preloaded = None
+        self._playing = False
+        self._gap = misc._Histogram()
+        self._stats = {'played': 0, 'skipped': 0, 'swaps': 0, 'misses': 0}
+        self._subscribers = []
+        for player in self._players:
+            subscriber = partial(self._on_eof, player)
+            player.stdout.subscribe(events.EofEvent, subscriber)
+            self._subscribers.append((player, subscriber))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._order)
+
+    @property
+    def player(self):
+        """the Player which plays the current entry"""
+        return self._active
+
+    @property
+    def current(self):
+        """the current entry or None"""
+        with self._lock:
+            return self._order.current()
+
+    def append(self, path):
+        """Add an entry at the end"""
+        with self._lock:
+            self._order.append(path)
+            if self._playing:
+                self._preload()
+
+    def extend(self, paths):
+        """Add entries at the end"""
+        with self._lock:
+            self._order.entries.extend(paths)
+            if self._playing:
+                self._preload()
+
+    def play(self):
+        """Play the current entry (initially the first one) from its start.
+        Returns the entry or None if there's nothing to play.
+
+        """
+        with self._lock:
+            path = self._order.current()
+            if path is None and self._order.pos < 0:
+                path = self._order.advance()
+            if path is None:
+                return
+            self._playing = True
+            self._active._run_command('loadfile', mtypes.StringType.adapt(path))
+            self._preload()
+        return path
+
+    def skip(self):
+        """Play the next entry now. Returns it or None at the end."""
+        with self._lock:
+            if not self._playing:
+                return
+            self._stats['skipped'] += 1
+        return self._advance(misc._clock())
+
+    def shuffle(self, enabled=True):
+        """Play the entries after the current one in a random order, or in
+        list order if enabled is False
+
+        """
+        with self._lock:
+            self._order.shuffle(enabled)
+            if self._playing:
+                self._preload()
+
+    def stats(self):
+        """Returns a dict of playlist metrics:
+
+        entries -- number of entries
+        position -- position of the current entry in the play order
+        played -- entries which played until their end
+        skipped -- entries which were left through skip()
+        swaps -- changes of entry which resumed the preloaded standby
+        misses -- changes of entry which had to load the entry first
+        gap -- histogram of the gaps between entries in seconds (count,
+               sum, mean, max, p50, p90, p99 and buckets, as in
+               Player.stats())
+
+        """
+        with self._lock:
+            return dict(self._stats, entries=len(self._order),
+                        position=self._order.pos, gap=self._gap.snapshot())
+
+    def close(self):
+        """Quit both MPlayer processes"""
+        with self._lock:
+            self._playing = False
+        for player, subscriber in self._subscribers:
+            player.stdout.unsubscribe(events.EofEvent, subscriber)
+            player.quit()
+
+    def _on_eof(self, player, event):
+        # Called from the reader thread of player
+        if event.code != _EOF_END:
+            return
+        started = misc._clock()
+        with self._lock:
+            if player is not self._active or not self._playing:
+                return
+            self._stats['played'] += 1
+        self._advance(started, player)
+
+    def _advance(self, started, player=None):
+        with self._lock:
+            # Ignore an EOF which raced with skip()
+            if player is not None and player is not self._active:
+                return
+            path = self._order.advance()
+            if path is None:
+                # Nothing left; also stop the entry which skip() left
+                self._active._run_command('stop')
+                self._playing = False
+                return
+            old, new = self._active, self._standby
+            new._run_command('set_property', 'mute', mtypes.FlagType.adapt(False))
+            if self._preloaded == path:
+                future = self._submit(new, 'pause')
+                self._stats['swaps'] += 1
+            else:
+                future = self._submit(new, 'loadfile', mtypes.StringType.adapt(path))
+                self._stats['misses'] += 1
+            # Silence the old entry (after skip()) even if there's nothing
+            # to preload; it's idle already if the entry ended
+            old._run_command('stop')
+            self._active, self._standby = new, old
+            self._preloaded = None
+            # Recycle the old process as the standby of the entry after
+            self._preload()
+        future.add_done_callback(partial(self._record_gap, started))
+        return path
+
+    def _preload(self):
+        path = self._order.peek()
+        if path is None or path == self._preloaded:
+            return
+        standby = self._standby
+        mute = mtypes.FlagType.adapt(True)
+        # Load the entry muted and pause it right away, back at its start
+        standby._run_command('set_property', 'mute', mute)
+        standby._run_command('loadfile', mtypes.StringType.adapt(path))
+        standby._run_command('pause')
+        standby._run_command('set_property', 'mute', mute)
+        standby._run_command('seek', mtypes.FloatType.adapt(0.0), mtypes.IntegerType.adapt(2))
+        self._preloaded = path
+
+    @staticmethod
+    def _submit(player, name, *args):
+        # Like Player.submit(), without relying on introspection. Imported
+        # here so that the module can be imported without concurrent.futures
+        from concurrent.futures import Future
+        future = Future()
+        cmd, prefixed = _encode_command(name, args)
+        player._run_encoded(name, cmd, prefixed, future)
+        return future
+
+    def _record_gap(self, started, future):
+        # Called from the writer thread of the new player
+        if future.exception() is None:
+            gap = misc._clock() - started
+            with self._lock:
+                self._gap.observe(gap)
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from contextlib import contextmanager
+from subprocess import PIPE
+from threading import Condition, Thread
+
+from mplayer.core import Player
+from mplayer import misc
+
+
+__all__ = ['PlayerPool']
+
+
+class PlayerPool(object):
+    """A pool of pre-spawned, idle Player instances.
+
+    All instances are spawned with the same arguments. acquire() hands out an
+    idle instance, blocking while all of them are in use, and release() resets
+    it (stops playback and restores the properties in reset) before putting it
+    back. Instances which die are replaced by a background thread.
+
+        pool = PlayerPool(4, ['-vo', 'null'])
+        with pool.player() as p:
+            p.loadfile('/path/to/file.mkv')
+
+    Only thread-based Player classes are supported.
+
+    """
+
+    def __init__(self, size, args=(), stdout=PIPE, stderr=None,
+                 player_class=Player, reset=None, check_interval=1.0):
+        """Arguments:
+
+        size -- number of MPlayer processes
+        args -- additional MPlayer arguments (default: ())
+        stdout -- handle for MPlayer's stdout (default: subprocess.PIPE)
+        stderr -- handle for MPlayer's stderr (default: None)
+        player_class -- Player (sub)class to instantiate (default: Player)
+        reset -- dict of property values to restore on release
+                 (default: {'speed': 1.0, 'mute': False} plus the
+                 initial volume of each instance)
+        check_interval -- seconds between liveness checks of idle
+                          instances (default: 1.0)
+
+        """
+        super(PlayerPool, self).__init__()
+        if size < 1:
+            raise ValueError('size must be at least 1')
+        self._size = size
+        self._args = args
+        self._stdout = stdout
+        self._stderr = stderr
+        self._player_class = player_class
+        self._reset = {'speed': 1.0, 'mute': False} if reset is None else reset
+        self._check_interval = check_interval
+        self._cond = Condition()
+        self._idle = deque()
+        # id(player) -> (player, reset values)
+        self._players = {}
+        self._replace = 0
+        self._closed = False
+        self._stats = {'acquired': 0, 'released': 0, 'exhausted': 0,
+                       'timeouts': 0, 'replaced': 0, 'wait_total': 0.0,
+                       'wait_max': 0.0}
+        self._idle.extend(self._spawn(size))
+        self._thread = Thread(target=self._thread_func)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def size(self):
+        """number of MPlayer processes in this pool"""
+        return self._size
+
+    def acquire(self, timeout=None):
+        """Get an idle Player, waiting up to timeout seconds (default: None;
+        wait indefinitely). Returns None if the timeout expires.
+
+        """
+        start = misc._clock()
+        with self._cond:
+            if not self._idle:
+                self._stats['exhausted'] += 1
+            while not self._idle:
+                if self._closed:
+                    raise ValueError('pool is closed')
+                remaining = None
+                if timeout is not None:
+                    remaining = start + timeout - misc._clock()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        return
+                self._cond.wait(remaining)
+            player = self._idle.popleft()
+            waited = misc._clock() - start
+            self._stats['acquired'] += 1
+            self._stats['wait_total'] += waited
+            self._stats['wait_max'] = max(self._stats['wait_max'], waited)
+        return player
+
+    def release(self, player):
+        """Reset player and return it to the pool"""
+        with self._cond:
+            if id(player) not in self._players or player in self._idle:
+                raise ValueError('player was not acquired from this pool')
+            self._stats['released'] += 1
+        if player.is_alive() and not self._closed:
+            self._reset_player(player)
+            with self._cond:
+                self._idle.append(player)
+                self._cond.notify()
+        else:
+            self._discard(player)
+
+    @contextmanager
+    def player(self, timeout=None):
+        """Context manager which acquires and releases a Player"""
+        player = self.acquire(timeout)
+        if player is None:
+            raise RuntimeError('no idle player within {0} seconds'.format(timeout))
+        try:
+            yield player
+        finally:
+            self.release(player)
+
+    def stats(self):
+        """Returns a dict of pool metrics:
+
+        size -- number of MPlayer processes
+        idle -- number of idle instances
+        acquired, released -- number of acquire() and release() calls
+        exhausted -- number of acquire() calls which found no idle instance
+        timeouts -- number of acquire() calls which timed out
+        replaced -- number of dead instances which were replaced
+        wait_total, wait_max -- total and maximum seconds spent in acquire()
+
+        """
+        with self._cond:
+            stats = dict(self._stats, size=self._size, idle=len(self._idle))
+        return stats
+
+    def close(self):
+        """Quit all idle instances. Instances in use quit upon release."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for player in idle:
+            self._discard(player)
+
+    def _spawn(self, count):
+        players = [self._player_class(self._args, stdout=self._stdout,
+                                      stderr=self._stderr) for _ in range(count)]
+        reset = dict(self._reset)
+        # Ask all new instances for their initial volume at once
+        queries = []
+        if 'volume' not in reset:
+            queries = [(player, player._send_queries(['volume'])) for player in players]
+        for player in players:
+            self._players[id(player)] = (player, reset)
+        for player, waiters in queries:
+            if waiters is None:
+                continue
+            volume = player._parse_answer(player._collect_answers(waiters)[0])
+            if volume is not None:
+                self._players[id(player)] = (player, dict(reset, volume=float(volume)))
+        return players
+
+    def _reset_player(self, player):
+        # Without relying on introspection, like the restores below
+        player._run_command('stop')
+        for name, value in self._players[id(player)][1].items():
+            pname, ptype = player._lookup_property(name)
+            player._run_command('set_property', pname, ptype.adapt(value))
+        player.stdout.disconnect()
+        player.stderr.disconnect()
+        player.unobserve()
+        if player.property_cache is not None:
+            player.disable_property_cache()
+
+    def _discard(self, player):
+        with self._cond:
+            self._players.pop(id(player), None)
+            if not self._closed:
+                self._replace += 1
+                self._cond.notify_all()
+        player.quit()
+
+    def _thread_func(self):
+        while True:
+            with self._cond:
+                if not self._replace and not self._closed:
+                    self._cond.wait(self._check_interval)
+                if self._closed:
+                    return
+                # Take dead instances out of the idle queue
+                for player in [p for p in self._idle if not p.is_alive()]:
+                    self._idle.remove(player)
+                    self._players.pop(id(player), None)
+                    self._replace += 1
+                count, self._replace = self._replace, 0
+            if not count:
+                continue
+            players = self._spawn(count)
+            with self._cond:
+                self._stats['replaced'] += count
+                self._idle.extend(players)
+                self._cond.notify(count)
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shlex
+import subprocess
+from threading import Timer
+from collections import deque
+
+from mplayer.core import Player
+from mplayer import events
+
+
+__all__ = ['MediaInfo', 'identify']
+
+
+class MediaInfo(object):
+    """Media properties of a single file, as reported by 'mplayer -identify'
+
+    path -- the path or URL which was identified
+    length -- duration in seconds (float)
+    demuxer -- name of the demuxer (e.g. 'mkv')
+    video_codec, video_format -- video codec and FourCC (str)
+    width, height -- video dimensions in pixels (int)
+    fps -- frames per second (float)
+    video_bitrate, audio_bitrate -- bitrates in bits per second (int)
+    audio_codec, audio_format -- audio codec and format tag (str)
+    samplerate -- audio sample rate in Hz (int)
+    channels -- number of audio channels (int)
+    metadata -- dict of the clip info (e.g. {'Title': '...'})
+    fields -- dict of all ID_* fields, without the 'ID_' prefix (str values)
+    error -- None on success, else a description of the failure
+
+    Properties which weren't reported are None.
+
+    """
+
+    __slots__ = ('path', 'length', 'demuxer', 'video_codec', 'video_format',
+                 'width', 'height', 'fps', 'video_bitrate', 'audio_codec',
+                 'audio_format', 'audio_bitrate', 'samplerate', 'channels',
+                 'metadata', 'fields', 'error')
+
+    # attribute -> (ID_* field, conversion)
+    _FIELDS = {
+        'length': ('LENGTH', float),
+        'demuxer': ('DEMUXER', str),
+        'video_codec': ('VIDEO_CODEC', str),
+        'video_format': ('VIDEO_FORMAT', str),
+        'width': ('VIDEO_WIDTH', int),
+        'height': ('VIDEO_HEIGHT', int),
+        'fps': ('VIDEO_FPS', float),
+        'video_bitrate': ('VIDEO_BITRATE', int),
+        'audio_codec': ('AUDIO_CODEC', str),
+        'audio_format': ('AUDIO_FORMAT', str),
+        'audio_bitrate': ('AUDIO_BITRATE', int),
+        'samplerate': ('AUDIO_RATE', int),
+        'channels': ('AUDIO_NCH', int),
+    }
+
+    def __init__(self, path, fields=None, error=None):
+        super(MediaInfo, self).__init__()
+        self.path = path
+        self.fields = fields if fields is not None else {}
+        self.error = error
+        for attr, (name, convert) in self._FIELDS.items():
+            value = self.fields.get(name)
+            if value is not None:
+                try:
+                    value = convert(value)
+                except ValueError:
+                    value = None
+            setattr(self, attr, value)
+        self.metadata = {}
+        for i in range(int(self.fields.get('CLIP_INFO_N', 0) or 0)):
+            name = self.fields.get('CLIP_INFO_NAME{0}'.format(i))
+            if name is not None:
+                self.metadata[name] = self.fields.get('CLIP_INFO_VALUE{0}'.format(i), '')
+
+    def __repr__(self):
+        if self.error is not None:
+            return '<MediaInfo {0!r} error={1!r}>'.format(self.path, self.error)
+        return '<MediaInfo {0!r} length={1!r} video={2!r} audio={3!r}>'.format(
+            self.path, self.length, self.video_codec, self.audio_codec)
+
+
+# Don't open any output devices, don't play anything and don't print
+# anything besides the ID_* fields
+_IDENTIFY_ARGS = ('-identify', '-frames', '0', '-vo', 'null', '-ao', 'null',
+                  '-msglevel', 'all=0:identify=4')
+
+
+def _identify_one(path, exec_path, args, timeout):
+    # MPlayer would treat a path starting with '-' as an option
+    arg = './' + path if path.startswith('-') else path
+    try:
+        proc = subprocess.Popen([exec_path] + list(_IDENTIFY_ARGS) + list(args) + [arg],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+    except OSError as e:
+        return MediaInfo(path, error=str(e))
+    result = _communicate(proc, timeout)
+    if result is None:
+        return MediaInfo(path, error='timed out after {0} seconds'.format(timeout))
+    out, err = result
+    fields = {}
+    for line in out.decode('utf-8', 'ignore').splitlines():
+        event = events.parse(line.rstrip())
+        if isinstance(event, events.IdentifyEvent):
+            fields[event.name] = event.value
+    if 'DEMUXER' not in fields:
+        lines = err.decode('utf-8', 'ignore').strip().splitlines()
+        error = lines[-1].strip() if lines else 'exit status {0}'.format(proc.returncode)
+        return MediaInfo(path, fields, error)
+    return MediaInfo(path, fields)
+
+
+def _communicate(proc, timeout):
+    """proc.communicate(), but kill proc after timeout seconds.
+    Returns (stdout, stderr) or None if proc was killed.
+
+    """
+    # A timer rather than communicate(timeout=...), which is Python 3 only
+    expired = []
+
+    def kill():
+        expired.append(True)
+        try:
+            proc.kill()
+        except OSError:
+            # Already exited
+            pass
+
+    timer = Timer(timeout, kill)
+    timer.daemon = True
+    timer.start()
+    try:
+        out, err = proc.communicate()
+    finally:
+        timer.cancel()
+    if expired:
+        return None
+    return out, err
+
+
+def _cpu_count():
+    try:
+        return os.cpu_count() or 1
+    except AttributeError:
+        # Python 2
+        import multiprocessing
+        try:
+            return multiprocessing.cpu_count()
+        except NotImplementedError:
+            return 1
+
+
+def identify(paths, workers=None, timeout=30.0, ordered=False, args=(), exec_path=None):
+    """Identify many files concurrently, one MPlayer process per file.
+    Returns a generator of MediaInfo records, which are yielded as soon as
+    they're ready (or in the order of paths if ordered is True).
+
+    Failures don't raise; the error attribute of the record is set instead.
+
+    paths -- iterable of paths or URLs; consumed lazily
+    workers -- number of concurrent MPlayer processes
+               (default: the number of CPUs)
+    timeout -- seconds after which a single identification is aborted
+               (default: 30.0)
+    ordered -- yield the records in the order of paths (default: False)
+    args -- additional MPlayer arguments, a string or a sequence
+            (default: ())
+    exec_path -- path to the MPlayer executable (default: Player.exec_path)
+
+    """
+    if exec_path is None:
+        exec_path = Player.exec_path
+    # Like Player.args
+    try:
+        args = shlex.split(args)
+    except AttributeError:
+        args = [str(arg) for arg in args]
+    return _imap(lambda path: _identify_one(path, exec_path, args, timeout),
+                 paths, workers, ordered)
+
+
+# Marks the end of the items in _imap()
+_END = object()
+
+
+def _imap(func, items, workers=None, ordered=False):
+    """Call func for each of items on a pool of workers threads.
+    Returns a generator of the results, in order of completion or, if
+    ordered is True, in the order of items.
+
+    """
+    # Imported here since the package imports this module, and importing
+    # mplayer must not require concurrent.futures (Python 2 without the
+    # 'futures' backport)
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+    if workers is None:
+        workers = _cpu_count()
+    if workers < 1:
+        raise ValueError('workers must be at least 1')
+    items = iter(items)
+    # Keep a bounded number of items in flight so that huge inputs
+    # don't turn into huge lists of futures
+    max_inflight = workers * 2
+    inflight = deque()
+    executor = ThreadPoolExecutor(workers)
+    try:
+        while True:
+            while len(inflight) < max_inflight:
+                item = next(items, _END)
+                if item is _END:
+                    break
+                inflight.append(executor.submit(func, item))
+            if not inflight:
+                return
+            if ordered:
+                yield inflight.popleft().result()
+            else:
+                done = wait(inflight, return_when=FIRST_COMPLETED)[0]
+                for future in [f for f in inflight if f in done]:
+                    inflight.remove(future)
+                    yield future.result()
+    finally:
+        for future in inflight:
+            future.cancel()
+        executor.shutdown(wait=False)
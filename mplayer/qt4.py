@@ -28,6 +28,7 @@ except ImportError:
     from PyQt4.QtGui import QWidget as _Container
 
 from mplayer.core import Player
+from mplayer.events import EofEvent
 from mplayer import misc
 
 
@@ -72,7 +73,7 @@ class QPlayerView(_Container):
         super(QPlayerView, self).__init__(parent)
         self._player = QtPlayer(('-msglevel', 'global=6', '-fixed-vo', '-fs',
                                  '-wid', int(self.winId())) + args, stderr=stderr)
-        self._player.stdout.connect(self._handle_data)
+        self._player.stdout.subscribe(EofEvent, self._handle_eof)
         self.destroyed.connect(self._on_destroy)
 
     @property
@@ -83,10 +84,8 @@ class QPlayerView(_Container):
     def _on_destroy(self):
         self._player.quit()
 
-    def _handle_data(self, data):
-        if data.startswith('EOF code:'):
-            code = data.partition(':')[2].strip()
-            self.eof.emit(int(code))
+    def _handle_eof(self, event):
+        self.eof.emit(event.code)
 
 
 class _StderrWrapper(misc._StderrWrapper):
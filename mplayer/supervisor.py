@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""Recovery of players whose MPlayer exits unexpectedly
+
+Exits of MPlayer are noticed by a watcher thread which is shared by all
+players. On Linux it waits on pidfds, so a crash is noticed right away
+instead of on the next command; an ExitEvent is published on stdout of the
+player. A Supervisor then respawns MPlayer with the same arguments and
+restores the loaded file, the position, the volume and the pause state:
+
+    def on_respawn(event):
+        log('MPlayer exited with {0}; recovered in {1:.3f} s'.format(
+            event.returncode, event.elapsed))
+
+    player = Player(['-fs'])
+    supervisor = Supervisor(player)
+    player.stdout.subscribe(RespawnEvent, on_respawn)
+
+"""
+
+import sys
+import weakref
+import traceback
+from collections import deque
+from threading import Lock
+
+from mplayer import events, misc, mtypes
+
+
+__all__ = ['Supervisor']
+
+
+class Supervisor(object):
+    """Respawns a Player when its MPlayer exits unexpectedly.
+
+    The state to restore is tracked by observing the properties 'path',
+    'time_pos', 'volume' and 'pause' every interval seconds (see
+    Player.observe()), so changes made just before a crash may be lost.
+    Exits caused by quit() are left alone. Respawning happens in the exit
+    watcher thread, followed by a RespawnEvent on player.stdout.
+
+    Only thread-based Player classes are supported, and the player's stdout
+    has to be a pipe for its state to be tracked.
+
+    """
+
+    # MPlayer names of the restored properties
+    _tracked = ('path', 'time_pos', 'volume', 'pause')
+
+    def __init__(self, player, restore=True, interval=0.25, max_respawns=5, window=60.0):
+        """Arguments:
+
+        player -- the Player to supervise
+        restore -- restore the file, position, volume and pause state
+                   after respawning (default: True)
+        interval -- seconds between updates of the tracked state
+                    (default: 0.25)
+        max_respawns -- stop respawning after this many respawns within
+                        window seconds; None means never (default: 5)
+        window -- see max_respawns (default: 60.0)
+
+        """
+        super(Supervisor, self).__init__()
+        if interval <= 0:
+            raise ValueError('interval must be positive')
+        self._player = weakref.ref(player)
+        self._restore = restore
+        self._max_respawns = max_respawns
+        self._window = window
+        self._lock = Lock()
+        self._state = {}
+        # Times of the respawns within the window
+        self._respawns = deque()
+        self._closed = False
+        self._stats = {'exits': 0, 'respawns': 0, 'gave_up': 0, 'failures': 0,
+                       'recovery_last': None, 'recovery_max': 0.0}
+        player.stdout.subscribe(events.ExitEvent, self._on_exit)
+        if restore:
+            for name in self._tracked:
+                player.observe(name, self._on_change, interval)
+        player._poll_exits = True
+        if player.is_alive():
+            player._watch_exit()
+
+    @property
+    def state(self):
+        """dict of the last known state which would be restored"""
+        with self._lock:
+            return dict(self._state)
+
+    def stats(self):
+        """Returns a dict of supervisor metrics:
+
+        exits -- number of exits of MPlayer, expected or not
+        respawns -- number of times MPlayer was respawned
+        gave_up -- unexpected exits which weren't followed by a respawn
+                   because of max_respawns
+        failures -- respawns which failed to start MPlayer
+        recovery_last, recovery_max -- last and maximum seconds from
+                                       noticing an exit until MPlayer was
+                                       respawned and its state queued
+
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        """Stop supervising the player"""
+        self._closed = True
+        player = self._player()
+        if player is None:
+            return
+        player._poll_exits = False
+        player.stdout.unsubscribe(events.ExitEvent, self._on_exit)
+        if self._restore:
+            for name in self._tracked:
+                player.unobserve(name, self._on_change)
+
+    def _on_change(self, name, value):
+        player = self._player()
+        # The answers were cancelled because MPlayer exited; keep the
+        # last known value
+        if player is None or player.stdout._source is None:
+            return
+        with self._lock:
+            self._state[name] = value
+
+    def _on_exit(self, event):
+        player = self._player()
+        if player is None or self._closed:
+            return
+        now = misc._clock()
+        with self._lock:
+            self._stats['exits'] += 1
+            # Also ignore processes which were replaced by spawn() already
+            if event.expected or player.is_alive():
+                return
+            while self._respawns and self._respawns[0] <= now - self._window:
+                self._respawns.popleft()
+            if self._max_respawns is not None and len(self._respawns) >= self._max_respawns:
+                self._stats['gave_up'] += 1
+                return
+            self._respawns.append(now)
+            state = dict(self._state) if self._restore else {}
+        try:
+            player.spawn()
+        except (IOError, OSError):
+            traceback.print_exc(file=sys.stderr)
+            with self._lock:
+                self._stats['failures'] += 1
+            return
+        self._restore_state(player, state)
+        elapsed = misc._clock() - now
+        with self._lock:
+            self._stats['respawns'] += 1
+            self._stats['recovery_last'] = elapsed
+            self._stats['recovery_max'] = max(self._stats['recovery_max'], elapsed)
+        player.stdout._publish(events.RespawnEvent(event.returncode, state, elapsed))
+
+    @staticmethod
+    def _restore_state(player, state):
+        path = state.get('path')
+        if path is not None:
+            player._run_command('loadfile', mtypes.StringType.adapt(path))
+            time_pos = state.get('time_pos')
+            if time_pos:
+                # Absolute seek
+                player._run_command('seek', mtypes.FloatType.adapt(time_pos),
+                                    mtypes.IntegerType.adapt(2))
+        volume = state.get('volume')
+        if volume is not None:
+            player._run_command('set_property', 'volume', mtypes.FloatType.adapt(volume))
+        # loadfile starts playback; pause toggles it
+        if path is not None and state.get('pause'):
+            player._run_command('pause')
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import subprocess
+
+from mplayer.core import Player
+from mplayer.probe import identify, _imap
+
+
+__all__ = ['Thumbnail', 'thumbnails', 'spaced_thumbnails']
+
+
+class Thumbnail(object):
+    """A single frame grabbed from a file
+
+    path -- the path or URL of the file
+    time -- position of the frame in seconds
+    index -- position of the frame in the request (e.g. 0 to count - 1 for
+             spaced_thumbnails())
+    format -- 'png' or 'jpeg'
+    data -- the encoded image (bytes) or None on failure
+    error -- None on success, else a description of the failure
+
+    """
+
+    __slots__ = ('path', 'time', 'index', 'format', 'data', 'error')
+
+    def __init__(self, path, time, index=0, format='png', data=None, error=None):
+        super(Thumbnail, self).__init__()
+        self.path = path
+        self.time = time
+        self.index = index
+        self.format = format
+        self.data = data
+        self.error = error
+
+    def __repr__(self):
+        if self.error is not None:
+            return '<Thumbnail {0!r} @{1} error={2!r}>'.format(self.path, self.time, self.error)
+        return '<Thumbnail {0!r} @{1} {2} bytes>'.format(self.path, self.time, len(self.data))
+
+
+def _quote(value):
+    # MPlayer's %len%value syntax, so that ':' or ',' in value don't end
+    # the suboption. The length is in bytes.
+    return '%{0}%{1}'.format(len(os.fsencode(value)), value)
+
+
+def _vo(format, outdir, quality):
+    if format == 'png':
+        return 'png:outdir={0}'.format(_quote(outdir))
+    if format == 'jpeg':
+        return 'jpeg:outdir={0}:quality={1}'.format(_quote(outdir), quality)
+    raise ValueError('unsupported format: {0!r}'.format(format))
+
+
+def _grab(job, format, width, quality, args, timeout, exec_path):
+    path, time, index, error = job
+    if error is not None:
+        return Thumbnail(path, time, index, format, error=error)
+    # Every job gets its own directory since MPlayer always names the
+    # images 00000001.png, 00000002.png, ...
+    outdir = tempfile.mkdtemp(prefix='mplayer-thumb-')
+    try:
+        cmd = [exec_path, '-really-quiet', '-nosound', '-ao', 'null',
+               '-ss', '{0:.3f}'.format(time), '-frames', '1',
+               '-vo', _vo(format, outdir, quality)]
+        if width is not None:
+            cmd.extend(['-vf', 'scale={0}:-2'.format(int(width))])
+        cmd.extend(args)
+        cmd.append('./' + path if path.startswith('-') else path)
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+        except OSError as e:
+            return Thumbnail(path, time, index, format, error=str(e))
+        try:
+            out, err = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            return Thumbnail(path, time, index, format,
+                             error='timed out after {0} seconds'.format(timeout))
+        images = sorted(os.listdir(outdir))
+        if not images:
+            lines = err.decode('utf-8', 'ignore').strip().splitlines()
+            error = lines[-1].strip() if lines else 'no frame at {0}'.format(time)
+            return Thumbnail(path, time, index, format, error=error)
+        # The last image is the frame at the requested position
+        with open(os.path.join(outdir, images[-1]), 'rb') as f:
+            return Thumbnail(path, time, index, format, f.read())
+    finally:
+        shutil.rmtree(outdir, ignore_errors=True)
+
+
+def thumbnails(jobs, workers=None, format='png', width=None, quality=85,
+               timeout=30.0, ordered=False, args=(), exec_path=None):
+    """Grab single frames concurrently, one MPlayer process per frame.
+    Returns a generator of Thumbnail records, which are yielded as soon as
+    they're ready (or in the order of jobs if ordered is True). Temporary
+    files are removed before a record is yielded.
+
+    Failures don't raise; the error attribute of the record is set instead.
+
+    jobs -- iterable of (path, seconds) pairs; consumed lazily
+    workers -- number of concurrent MPlayer processes
+               (default: the number of CPUs)
+    format -- 'png' or 'jpeg' (default: 'png')
+    width -- scale the frames to this width, keeping the aspect ratio
+             (default: None; original size)
+    quality -- JPEG quality, 0-100 (default: 85)
+    timeout -- seconds after which grabbing a single frame is aborted
+               (default: 30.0)
+    ordered -- yield the records in the order of jobs (default: False)
+    args -- additional MPlayer arguments (default: ())
+    exec_path -- path to the MPlayer executable (default: Player.exec_path)
+
+    """
+    # Fail early instead of once per job
+    _vo(format, '', quality)
+    if exec_path is None:
+        exec_path = Player.exec_path
+    jobs = ((path, time, 0, None) for path, time in jobs)
+    return _imap(lambda job: _grab(job, format, width, quality, args, timeout, exec_path),
+                 jobs, workers, ordered)
+
+
+def spaced_thumbnails(paths, count=9, workers=None, format='png', width=None,
+                      quality=85, timeout=30.0, ordered=False, args=(), exec_path=None):
+    """Grab count evenly spaced frames of each of paths, e.g. for contact
+    sheets. The length of each file is determined by identify() first; the
+    frames are taken from the middle of count equal parts of it.
+
+    Returns a generator of Thumbnail records (with index set to 0 to
+    count - 1). Files which can't be identified yield a single record with
+    the error set. The other arguments are the same as in thumbnails().
+
+    """
+    if count < 1:
+        raise ValueError('count must be at least 1')
+    _vo(format, '', quality)
+    if exec_path is None:
+        exec_path = Player.exec_path
+
+    def jobs():
+        for info in identify(paths, workers, timeout, ordered, args, exec_path):
+            if info.error is not None or not info.length:
+                yield (info.path, 0.0, 0, info.error or 'unknown length')
+                continue
+            for i in range(count):
+                yield (info.path, info.length * (i + 0.5) / count, i, None)
+
+    return _imap(lambda job: _grab(job, format, width, quality, args, timeout, exec_path),
+                 jobs(), workers, ordered)
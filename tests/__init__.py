@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of mplayer.py
+
+The tests run against benchmarks/fake_mplayer.py, which is put in PATH as
+'mplayer' before mplayer is imported, so no MPlayer is needed:
+
+    python -m unittest discover tests
+    python -m pytest tests
+
+"""
+
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_MPLAYER = os.path.join(ROOT, 'benchmarks', 'fake_mplayer.py')
+
+_tmp_dir = tempfile.mkdtemp(prefix='mplayer-tests-')
+atexit.register(shutil.rmtree, _tmp_dir, True)
+os.mkdir(os.path.join(_tmp_dir, 'bin'))
+os.symlink(FAKE_MPLAYER, os.path.join(_tmp_dir, 'bin', 'mplayer'))
+os.environ['PATH'] = os.pathsep.join([os.path.join(_tmp_dir, 'bin'),
+                                      os.environ.get('PATH', '')])
+os.environ['MPLAYER_PY_CACHE_DIR'] = os.path.join(_tmp_dir, 'cache')
+os.environ['MPLAYER_PY_LAZY'] = '0'
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@contextmanager
+def fake_settings(**settings):
+    """Set FAKE_MPLAYER_<NAME> for the fake MPlayers spawned within"""
+    names = ['FAKE_MPLAYER_' + name.upper() for name in settings]
+    saved = [(name, os.environ.get(name)) for name in names]
+    for name, value in zip(names, settings.values()):
+        os.environ[name] = str(value)
+    try:
+        yield
+    finally:
+        for name, value in saved:
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
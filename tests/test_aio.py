@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import os
+import signal
+import asyncio
+import unittest
+import warnings
+
+from tests import fake_settings
+from mplayer.aio import AsyncioPlayer
+
+
+class AsyncioPlayerTest(unittest.TestCase):
+
+    def test_get_and_set(self):
+        async def main():
+            async with AsyncioPlayer() as player:
+                player.volume = 20.0
+                self.assertEqual(await player.volume, 20.0)
+                self.assertEqual(await player.get_properties(['speed', 'mute']),
+                                 {'speed': 1.0, 'mute': False})
+        asyncio.run(main())
+
+    def test_quit_right_after_spawn(self):
+        async def main():
+            player = AsyncioPlayer()
+            with fake_settings(startup=0.1):
+                await player.spawn()
+            # Detaches before the reader tasks got to run
+            await player.quit()
+            tasks = [player.stdout._task]
+            await asyncio.wait(tasks, timeout=1.0)
+            for task in tasks:
+                self.assertTrue(task.done())
+                self.assertIsNone(task.exception())
+        asyncio.run(main())
+
+    def test_get_async_and_submit(self):
+        async def main():
+            async with AsyncioPlayer() as player:
+                task = player.get_async('volume')
+                self.assertEqual(await task, 50.0)
+                self.assertIsNone(await player.submit('loadfile', '/media/a.flac'))
+                self.assertEqual(await player.get('path'), '/media/a.flac')
+                self.assertRaises(ValueError, player.submit, 'no_such_command')
+                self.assertRaises(TypeError, player.submit, 'seek', 'x')
+        asyncio.run(main())
+
+    def test_observe(self):
+        changes = []
+
+        async def main():
+            async with AsyncioPlayer() as player:
+                player.observe('volume', lambda name, value: changes.append(value), 0.02)
+                await asyncio.sleep(0.1)
+                player.volume = 20.0
+                await asyncio.sleep(0.1)
+                player.unobserve('volume')
+                self.assertEqual(player._observers, {})
+        asyncio.run(main())
+        self.assertEqual(changes, [50.0, 20.0])
+
+    def test_outlive_loop(self):
+        async def main():
+            player = AsyncioPlayer()
+            await player.spawn()
+            return player
+
+        with warnings.catch_warnings():
+            # About the transports of the unfinished process
+            warnings.simplefilter('ignore', ResourceWarning)
+            player = asyncio.run(main())
+            try:
+                self.assertIsNone(player.quit())
+                # Like the hooks which call quit() on deletion and at exit
+                player.__del__()
+            finally:
+                os.kill(player._proc.pid, signal.SIGKILL)
+
+
+if __name__ == '__main__':
+    unittest.main()
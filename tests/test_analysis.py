@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""analyze(), against a stand-in for MPlayer's PCM output"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mplayer import analysis
+
+
+# Writes one second of a full-scale 1 kHz sine as s16 stereo at 48 kHz to
+# the file of -ao pcm, or fails like MPlayer if the input is broken
+DECODER = '''#!{python}
+import os, sys, math, struct
+with open(sys.argv[-1], 'rb') as f:
+    if f.read() == b'broken':
+        sys.exit(1)
+ao = sys.argv[sys.argv.index('-ao') + 1]
+fd = int(ao.rpartition('/dev/fd/')[2])
+samples = [int(32767 * math.sin(2 * math.pi * 1000 * i / 48000.0)) for i in range(48000)]
+data = b''.join([struct.pack('=hh', s, s) for s in samples])
+while data:
+    data = data[os.write(fd, data):]
+'''
+
+
+@unittest.skipIf(numpy is None, 'requires NumPy')
+class AnalyzeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='mplayer-analysis-')
+        self.cache_dir = os.path.join(self.dir, 'cache')
+        self.exec_path = os.path.join(self.dir, 'decoder')
+        with open(self.exec_path, 'w') as f:
+            f.write(DECODER.format(python=sys.executable))
+        os.chmod(self.exec_path, 0o755)
+        self.path = os.path.join(self.dir, 'a.flac')
+        with open(self.path, 'wb') as f:
+            f.write(b'fake')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _analyze(self, path):
+        return analysis.analyze(path, cache_dir=self.cache_dir, exec_path=self.exec_path)
+
+    def _cache_files(self):
+        cache_dir = os.path.join(self.cache_dir, 'analysis')
+        if not os.path.isdir(cache_dir):
+            return []
+        return [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+
+    def test_analyze_and_cache(self):
+        result = self._analyze(self.path)
+        self.assertAlmostEqual(result.duration, 1.0)
+        self.assertAlmostEqual(result.peak, 0.0, places=2)
+        self.assertIsNotNone(result.loudness)
+        self.assertEqual(len(result.peaks), 10)
+        self.assertEqual(len(self._cache_files()), 1)
+        cached = self._analyze(self.path)
+        self.assertEqual(cached.peaks, result.peaks)
+
+    def test_failure_isnt_cached(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'broken')
+        self.assertRaises(OSError, self._analyze, self.path)
+        self.assertEqual(self._cache_files(), [])
+        self.assertRaises(OSError, self._analyze, self.path)
+
+    def test_malformed_cache_entry(self):
+        self._analyze(self.path)
+        cache_file, = self._cache_files()
+        with open(cache_file, 'w') as f:
+            json.dump({'duration': 1.0}, f)
+        self.assertEqual(len(self._analyze(self.path).peaks), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
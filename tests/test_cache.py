@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""The property cache"""
+
+import time
+import unittest
+
+from mplayer import Player
+from mplayer.misc import _PropertyCache, _MISSING
+
+
+class PropertyCacheTest(unittest.TestCase):
+
+    def test_ttls(self):
+        cache = _PropertyCache(ttls={'speed': 0}, default_ttl=0.3, volatile_ttl=0.01)
+        epoch = cache.epoch
+        for pname, value in [('length', 5400.0), ('volume', 50.0),
+                             ('time_pos', 1.0), ('speed', 1.0)]:
+            cache.put(pname, value, epoch)
+        self.assertEqual(cache.get('length'), 5400.0)
+        self.assertEqual(cache.get('volume'), 50.0)
+        self.assertEqual(cache.get('time_pos'), 1.0)
+        # A TTL of 0 disables caching
+        self.assertIs(cache.get('speed', _MISSING), _MISSING)
+        time.sleep(0.02)
+        self.assertIs(cache.get('time_pos', _MISSING), _MISSING)
+        self.assertEqual(cache.get('volume'), 50.0)
+        time.sleep(0.3)
+        self.assertIs(cache.get('volume', _MISSING), _MISSING)
+        # Static properties don't expire
+        self.assertEqual(cache.get('length'), 5400.0)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (5, 3))
+        self.assertEqual(stats['properties']['volume'], (2, 1))
+
+    def test_stale_put(self):
+        cache = _PropertyCache()
+        epoch = cache.epoch
+        # The value was requested before the invalidation
+        cache.invalidate('volume')
+        cache.put('volume', 50.0, epoch)
+        self.assertIsNone(cache.get('volume'))
+        cache.put('volume', 50.0, cache.epoch)
+        self.assertEqual(cache.get('volume'), 50.0)
+
+    def test_update(self):
+        cache = _PropertyCache()
+        epoch = cache.epoch
+        cache.update('volume', 20.0)
+        cache.put('volume', 50.0, epoch)
+        self.assertEqual(cache.get('volume'), 20.0)
+
+    def test_commands(self):
+        cache = _PropertyCache()
+        epoch = cache.epoch
+        cache.put('length', 5400.0, epoch)
+        cache.put('volume', 50.0, epoch)
+        cache.command('seek')
+        self.assertEqual(cache.get('length'), 5400.0)
+        self.assertIsNone(cache.get('volume'))
+        cache.put('volume', 50.0, epoch)
+        self.assertIsNone(cache.get('volume'))
+        cache.command('loadfile')
+        self.assertIsNone(cache.get('length'))
+
+    def test_fill(self):
+        cache = _PropertyCache()
+        cache.put('volume', 50.0, cache.epoch)
+        result = {}
+        props = [('volume', 'volume', None), ('speed', 'speed', None)]
+        self.assertEqual(cache.fill(result, props), props[1:])
+        self.assertEqual(result, {'volume': 50.0})
+
+
+class PlayerCacheTest(unittest.TestCase):
+
+    def test_player(self):
+        player = Player()
+        try:
+            player.enable_property_cache()
+            self.assertEqual(player.get('length'), 5400.0)
+            self.assertEqual(player.get('length'), 5400.0)
+            player.volume = 20.0
+            self.assertEqual(player.get('volume'), 20.0)
+            player.loadfile('/media/a.flac')
+            self.assertEqual(player.get('path'), '/media/a.flac')
+            stats = player.property_cache.stats()
+            self.assertEqual(stats['properties']['length'], (1, 1))
+            self.assertEqual(stats['properties']['volume'], (1, 0))
+        finally:
+            player.quit()
+
+
+if __name__ == '__main__':
+    unittest.main()
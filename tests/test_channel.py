@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+"""The command queue and its writer thread"""
+
+import time
+import unittest
+import threading
+
+from mplayer import Player, Overflow
+from mplayer.misc import _CommandChannel, _AnswerRouter, _Waiter, queue
+
+
+class _Stream(object):
+
+    def __init__(self):
+        self.data = []
+
+    def write(self, data):
+        self.data.append(data)
+
+    def flush(self):
+        pass
+
+
+class _ManualChannel(_CommandChannel):
+    """Drained by the test instead of a writer thread"""
+
+    def _start(self):
+        pass
+
+    def drain(self):
+        batch = self._take(block=False)
+        self._stream.write(b''.join([entry[0] for entry in batch]))
+        self._written(batch)
+
+
+class ChannelTest(unittest.TestCase):
+
+    def test_writes_in_order(self):
+        stream = _Stream()
+        router = _AnswerRouter()
+        channel = _CommandChannel(stream, router)
+        waiter = _Waiter('volume')
+        for data in [b'a\n', b'b\n']:
+            channel.put(data)
+        channel.put(b'get_property volume\n', [waiter])
+        channel.close()
+        deadline = time.time() + 2.0
+        while b''.join(stream.data) != b'a\nb\nget_property volume\n':
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+        self.assertEqual(router.stats()['pending_answers'], 1)
+
+    def test_block(self):
+        channel = _ManualChannel(_Stream(), _AnswerRouter(), 1, Overflow.BLOCK)
+        channel.put(b'a\n')
+        t = threading.Thread(target=channel.put, args=(b'b\n', ))
+        t.start()
+        t.join(0.1)
+        self.assertTrue(t.is_alive())
+        channel.drain()
+        t.join(2.0)
+        self.assertFalse(t.is_alive())
+        self.assertEqual(channel.qsize(), 1)
+        channel.drain()
+        self.assertEqual(channel._stream.data, [b'a\n', b'b\n'])
+
+    def test_drop_oldest(self):
+        channel = _ManualChannel(_Stream(), _AnswerRouter(), 2, Overflow.DROP_OLDEST)
+        waiter = _Waiter('volume')
+        channel.put(b'get_property volume\n', [waiter])
+        channel.put(b'b\n')
+        channel.put(b'c\n')
+        self.assertIsNone(waiter.wait(0))
+        self.assertFalse(waiter.cancelled)
+        channel.drain()
+        self.assertEqual(channel._stream.data, [b'b\nc\n'])
+
+    def test_raise(self):
+        channel = _ManualChannel(_Stream(), _AnswerRouter(), 1, Overflow.RAISE)
+        channel.put(b'a\n')
+        self.assertRaises(queue.Full, channel.put, b'b\n')
+        # Unless the limit is ignored, e.g. for 'quit'
+        channel.put(b'quit\n', force=True)
+        channel.drain()
+        self.assertEqual(channel._stream.data, [b'a\nquit\n'])
+
+    def test_invalid_policy(self):
+        self.assertRaises(ValueError, _ManualChannel, _Stream(), None, 1,
+                          Overflow.DROP_STALE)
+
+    def test_closed(self):
+        channel = _ManualChannel(_Stream(), _AnswerRouter())
+        channel.close()
+        waiter = _Waiter('volume')
+        channel.put(b'get_property volume\n', [waiter])
+        self.assertIsNone(waiter.wait(0))
+        self.assertEqual(channel.qsize(), 0)
+
+
+class RespawnTest(unittest.TestCase):
+
+    def test_spawn_closes_old_channel(self):
+        player = Player()
+        try:
+            threads = threading.active_count()
+            for i in range(5):
+                channel = player._channel
+                player._proc.kill()
+                player._proc.wait()
+                player.spawn()
+                self.assertTrue(channel._closed)
+                self.assertIsNot(player._channel, channel)
+            self.assertEqual(player.get('volume'), 50.0)
+            # The old writer threads exit once they're woken up
+            deadline = time.time() + 2.0
+            while threading.active_count() > threads and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertLessEqual(threading.active_count(), threads)
+        finally:
+            player.quit()
+
+
+if __name__ == '__main__':
+    unittest.main()
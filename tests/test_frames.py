@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+"""Parsing of the YUV4MPEG2 output of VideoStream"""
+
+import os
+import time
+import unittest
+from threading import Thread
+
+from mplayer.frames import VideoStream
+
+
+HEADER = b'YUV4MPEG2 W4 H2 F25:1 C444\n'
+# 4x2 pixels, three full planes
+FRAME_SIZE = 4 * 2 * 3
+
+
+class VideoStreamTest(unittest.TestCase):
+
+    def _frames(self, data, piece=3):
+        """Returns the frames parsed from data, which is written in pieces
+        of piece bytes
+
+        """
+        r, w = os.pipe()
+
+        def write():
+            for i in range(0, len(data), piece):
+                os.write(w, data[i:i + piece])
+                time.sleep(0.001)
+            os.close(w)
+
+        stream = VideoStream('/media/a.mkv')
+        stream._pipe = os.fdopen(r, 'rb', buffering=0)
+        t = Thread(target=write)
+        t.start()
+        try:
+            return [bytes(frame) for frame in stream._chunks()]
+        finally:
+            t.join()
+            stream._pipe.close()
+
+    def test_frames_in_pieces(self):
+        frames = [bytes(bytearray([i]) * FRAME_SIZE) for i in range(3)]
+        data = HEADER + b'FRAME\n' + frames[0] + b'FRAME Ixyz\n' + frames[1] + \
+            b'FRAME\n' + frames[2]
+        self.assertEqual(self._frames(data), frames)
+
+    def test_truncated_frame_header(self):
+        data = HEADER + b'FRAME\n' + b'\0' * FRAME_SIZE + b'FRA'
+        self.assertRaises(ValueError, self._frames, data)
+        data = HEADER + b'FRAME\n' + b'\0' * FRAME_SIZE + b'FRAME Ix'
+        self.assertRaises(ValueError, self._frames, data)
+
+    def test_garbage(self):
+        data = HEADER + b'FRAME\n' + b'\0' * FRAME_SIZE + b'GARBAGE\n'
+        self.assertRaises(ValueError, self._frames, data)
+
+    def test_empty(self):
+        self.assertEqual(self._frames(b''), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
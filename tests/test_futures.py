@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+"""Player.get_async() and Player.submit(), and their AsyncioPlayer
+counterparts"""
+
+import time
+import asyncio
+import unittest
+
+from tests import fake_settings
+from mplayer import core, Player, AnswerTimeout, PlayerExited
+from mplayer.aio import AsyncioPlayer
+from mplayer.misc import Overflow, RequestDropped, queue
+
+
+requires_futures = unittest.skipIf(core.Future is None, 'requires concurrent.futures')
+
+
+@requires_futures
+class FuturesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.player = Player()
+
+    def tearDown(self):
+        self.player.quit()
+
+    def test_get_async(self):
+        futures = [self.player.get_async(name) for name in ['volume', 'speed', 'chapter']]
+        self.assertEqual([f.result(5.0) for f in futures], [50.0, 1.0, None])
+
+    def test_submit(self):
+        future = self.player.submit('loadfile', '/media/a.flac')
+        self.assertIsNone(future.result(5.0))
+        self.assertEqual(self.player.get('path'), '/media/a.flac')
+
+    def test_submit_checks_args(self):
+        self.assertRaises(ValueError, self.player.submit, 'no_such_command')
+        self.assertRaises(TypeError, self.player.submit, 'seek', 'x')
+
+    def test_not_running(self):
+        self.player.quit()
+        self.assertRaises(PlayerExited, self.player.get_async('volume').result, 1.0)
+        self.assertRaises(PlayerExited, self.player.submit('pause').result, 1.0)
+
+
+@requires_futures
+class LatencyTest(unittest.TestCase):
+
+    def test_timeout(self):
+        with fake_settings(latency=0.2):
+            player = Player()
+        try:
+            future = player.get_async('volume', timeout=0.05)
+            start = time.time()
+            self.assertRaises(AnswerTimeout, future.result, 5.0)
+            self.assertLess(time.time() - start, 0.15)
+            # The late answer doesn't go to the next request
+            self.assertEqual(player.get_async('speed', timeout=5.0).result(5.0), 1.0)
+            self.assertEqual(player.stdout.stats()['late_answers'], 1)
+        finally:
+            player.quit()
+
+    def test_quit_with_pending(self):
+        with fake_settings(latency=0.3):
+            player = Player()
+        futures = [player.get_async(name, timeout=5.0) for name in ['volume', 'speed']]
+        time.sleep(0.05)
+        player.quit()
+        for future in futures:
+            self.assertRaises(PlayerExited, future.result, 2.0)
+
+    def test_answer_overflow(self):
+        with fake_settings(latency=0.1):
+            player = Player(autospawn=False)
+            player.answer_queue_size = 1
+            player.answer_overflow = Overflow.DROP_OLDEST
+            player.spawn()
+        try:
+            first = player.get_async('volume', timeout=5.0)
+            second = player.get_async('speed', timeout=5.0)
+            self.assertRaises(RequestDropped, first.result, 2.0)
+            self.assertEqual(second.result(2.0), 1.0)
+        finally:
+            player.quit()
+
+    def test_command_overflow(self):
+        with fake_settings(latency=0.1):
+            player = Player(autospawn=False)
+            player.cmd_queue_size = 1
+            player.cmd_overflow = Overflow.RAISE
+            player.spawn()
+        try:
+            # Fill the pipe so that the writer thread stalls
+            payload = '/media/' + 'x' * 65536
+            futures = [player.submit('loadfile', payload) for i in range(8)]
+            errors = [f.exception(10.0) for f in futures]
+            self.assertTrue(any(isinstance(e, queue.Full) for e in errors))
+        finally:
+            player._proc.kill()
+            player.quit()
+
+
+class AsyncioTest(unittest.TestCase):
+
+    def test_get_async(self):
+        async def main():
+            async with AsyncioPlayer() as player:
+                tasks = [player.get_async(name) for name in ['volume', 'speed', 'chapter']]
+                self.assertEqual(await asyncio.gather(*tasks), [50.0, 1.0, None])
+        asyncio.run(main())
+
+    def test_not_running(self):
+        async def main():
+            player = AsyncioPlayer()
+            async with player:
+                pass
+            with self.assertRaises(PlayerExited):
+                await player.get_async('volume')
+            with self.assertRaises(PlayerExited):
+                await player.submit('pause')
+        asyncio.run(main())
+
+    def test_timeout(self):
+        async def main():
+            with fake_settings(latency=0.2):
+                player = AsyncioPlayer()
+                await player.spawn()
+            try:
+                with self.assertRaises(AnswerTimeout):
+                    await player.get_async('volume', timeout=0.05)
+                # The late answer doesn't go to the next request
+                self.assertEqual(await player.get_async('speed', timeout=5.0), 1.0)
+                self.assertEqual(player.stdout.stats()['late_answers'], 1)
+            finally:
+                await player.quit()
+        asyncio.run(main())
+
+    def test_quit_with_pending(self):
+        async def main():
+            with fake_settings(latency=0.3):
+                player = AsyncioPlayer()
+                await player.spawn()
+            tasks = [player.get_async(name, timeout=5.0) for name in ['volume', 'speed']]
+            await asyncio.sleep(0.05)
+            exited = player.quit()
+            for task in tasks:
+                with self.assertRaises(PlayerExited):
+                    await asyncio.wait_for(task, 2.0)
+            await exited
+        asyncio.run(main())
+
+    def test_answer_overflow(self):
+        async def main():
+            with fake_settings(latency=0.1):
+                player = AsyncioPlayer()
+                player.answer_queue_size = 1
+                player.answer_overflow = Overflow.DROP_OLDEST
+                await player.spawn()
+            try:
+                first = player.get_async('volume', timeout=5.0)
+                second = player.get_async('speed', timeout=5.0)
+                with self.assertRaises(RequestDropped):
+                    await first
+                self.assertEqual(await second, 1.0)
+            finally:
+                await player.quit()
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""Resolving the MPlayer executable and caching its introspection"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from tests import FAKE_MPLAYER
+from mplayer import core
+
+
+class WhichTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='mplayer-which-')
+        self.path = os.environ['PATH']
+        os.environ['PATH'] = self.dir
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _executable(self, name):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n')
+        os.chmod(path, 0o755)
+        return path
+
+    def test_path(self):
+        path = self._executable('tool')
+        self.assertEqual(core._which('tool'), path)
+        self.assertIsNone(core._which('no_such_tool'))
+        self.assertEqual(core._which(os.path.join('.', 'tool')), os.path.abspath('tool'))
+
+    def test_pathext_fallback(self):
+        path = self._executable('tool.EXE')
+        saved = core._shutil_which, sys.platform, os.environ.get('PATHEXT')
+        core._shutil_which = None
+        sys.platform = 'win32'
+        os.environ['PATHEXT'] = os.pathsep.join(['.COM', '.EXE'])
+        try:
+            self.assertEqual(core._which('tool'), path)
+        finally:
+            core._shutil_which, sys.platform = saved[:2]
+            if saved[2] is None:
+                del os.environ['PATHEXT']
+            else:
+                os.environ['PATHEXT'] = saved[2]
+
+
+class IntrospectionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='mplayer-introspection-')
+        self.cache_dir = os.path.join(self.dir, 'cache')
+        self.exec_path = os.path.join(self.dir, 'mplayer')
+        with open(self.exec_path, 'w') as f:
+            f.write('#!/bin/sh\n')
+        os.chmod(self.exec_path, 0o755)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _cache(self):
+        return core._IntrospectionCache(self.exec_path, self.cache_dir)
+
+    def test_hit(self):
+        self.assertIsNone(self._cache().load())
+        self._cache().save({'version': '1.0', 'properties': {'volume': 1}})
+        data = self._cache().load()
+        self.assertEqual((data['version'], data['properties']), ('1.0', {'volume': 1}))
+
+    def test_miss_without_version(self):
+        self._cache().save({'properties': {}})
+        self.assertIsNone(self._cache().load())
+
+    def test_changed_binary(self):
+        self._cache().save({'version': '1.0'})
+        st = os.stat(self.exec_path)
+        os.utime(self.exec_path, (st.st_atime, st.st_mtime + 10))
+        self.assertIsNone(self._cache().load())
+        # A new entry replaces the stale one
+        self._cache().save({'version': '1.1'})
+        self.assertEqual(self._cache().load()['version'], '1.1')
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_disabled(self):
+        cache = core._IntrospectionCache(self.exec_path, None)
+        cache.save({'version': '1.0'})
+        self.assertIsNone(cache.load())
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_player(self):
+        cache = core._IntrospectionCache('mplayer', os.environ['MPLAYER_PY_CACHE_DIR'])
+        # Filled when the tests imported mplayer
+        data = cache.load()
+        self.assertIsNotNone(data)
+        self.assertEqual(os.path.realpath(data['exec_path']), FAKE_MPLAYER)
+
+
+if __name__ == '__main__':
+    unittest.main()
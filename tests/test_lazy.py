@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""Lazy introspection (MPLAYER_PY_LAZY), which only takes effect when
+mplayer is imported, so each test runs in a fresh interpreter"""
+
+import os
+import sys
+import subprocess
+import unittest
+
+from tests import ROOT
+
+
+SUCCESS = '''
+from mplayer.core import Player
+assert not Player._introspected
+player = Player(autospawn=False)
+player.volume
+assert Player._introspected
+assert '__getattr__' not in Player.__dict__
+player.spawn()
+print(player.volume)
+player.quit()
+'''
+
+FAILURE = '''
+from mplayer.core import Player
+calls = []
+introspect = Player.introspect.__func__
+
+def counting(cls):
+    calls.append(cls)
+    return introspect(cls)
+
+Player.introspect = classmethod(counting)
+Player.exec_path = '/nonexistent/mplayer'
+player = Player(autospawn=False)
+for i in range(3):
+    try:
+        player.volume
+    except AttributeError:
+        pass
+    Player._lookup_property('volume')
+print(len(calls))
+'''
+
+
+def _run(code):
+    env = dict(os.environ, MPLAYER_PY_LAZY='1')
+    proc = subprocess.Popen([sys.executable, '-c', code], cwd=ROOT, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    return proc.returncode, out.decode('utf-8').strip(), err.decode('utf-8')
+
+
+class LazyTest(unittest.TestCase):
+
+    def test_introspect_on_first_use(self):
+        returncode, out, err = _run(SUCCESS)
+        self.assertEqual(returncode, 0, err)
+        self.assertEqual(out, '50.0')
+
+    def test_failure_is_recorded(self):
+        returncode, out, err = _run(FAILURE)
+        self.assertEqual(returncode, 0, err)
+        self.assertEqual(out, '1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""Player.observe() and the shared polling thread"""
+
+import time
+import unittest
+from threading import Event
+
+from tests import fake_settings
+from mplayer import Player
+
+
+class ObserveTest(unittest.TestCase):
+
+    def test_changes(self):
+        player = Player()
+        changes = []
+        try:
+            player.observe('volume', lambda name, value: changes.append((name, value)), 0.02)
+            time.sleep(0.1)
+            player.volume = 20.0
+            time.sleep(0.1)
+            player.unobserve('volume')
+            self.assertEqual(changes, [('volume', 50.0), ('volume', 20.0)])
+        finally:
+            player.quit()
+
+    def test_stalled_players(self):
+        with fake_settings(latency=30.0):
+            stalled = [Player() for i in range(3)]
+        player = Player()
+        changed = Event()
+
+        def callback(name, value):
+            if value == 20.0:
+                changed.set()
+
+        try:
+            for p in stalled:
+                p.timeout = 0.5
+                p.observe('volume', lambda name, value: None, 0.05)
+            player.observe('volume', callback, 0.05)
+            # Let the stalled players time out at least once
+            time.sleep(0.6)
+            player.volume = 20.0
+            start = time.time()
+            self.assertTrue(changed.wait(5.0))
+            # One timeout per tick, not one per stalled player
+            self.assertLess(time.time() - start, 1.2)
+        finally:
+            for p in stalled + [player]:
+                p.unobserve()
+            for p in stalled:
+                p._proc.kill()
+                p._proc.wait()
+            player.quit()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""Dispatching the output of MPlayer to subscribers and requests"""
+
+import os
+import unittest
+
+from mplayer import events
+from mplayer.misc import _LineReader, _StderrWrapper, _StdoutWrapper, _Waiter
+
+
+class LineReaderTest(unittest.TestCase):
+
+    def test_partial_lines(self):
+        reader = _LineReader(size=8)
+        self.assertEqual(reader.feed(b'ab'), [])
+        self.assertEqual(reader.feed(b'c\nde'), [b'abc'])
+        # Longer than the buffer
+        self.assertEqual(reader.feed(b'fghijklmn\nop\n'), [b'defghijklmn', b'op'])
+        self.assertEqual(reader.feed(b'\n'), [b''])
+
+    def test_crlf(self):
+        reader = _LineReader()
+        self.assertEqual(reader.feed(b'a\r\nb\r'), [b'a\r'])
+        self.assertEqual(reader.feed(b'\n'), [b'b\r'])
+
+    def test_eof(self):
+        reader = _LineReader()
+        self.assertEqual(reader.feed(b'a\nb'), [b'a'])
+        # The unterminated last line, then EOF
+        self.assertEqual(reader.feed(b''), [b'b'])
+        self.assertIsNone(reader.feed(b''))
+
+    def test_read(self):
+        r, w = os.pipe()
+        try:
+            os.write(w, b'abcdef\ngh')
+            os.close(w)
+            # The buffer grows for the long line
+            reader = _LineReader(size=4)
+            lines = []
+            chunk = reader.read(r)
+            while chunk is not None:
+                lines.extend(chunk)
+                chunk = reader.read(r)
+            self.assertEqual(lines, [b'abcdef', b'gh'])
+        finally:
+            os.close(r)
+
+
+class StderrTest(unittest.TestCase):
+
+    def test_fan_out_per_line(self):
+        stderr = _StderrWrapper(handle=None)
+        seen = []
+        stderr.connect(lambda line: seen.append(('a', line)))
+        stderr.connect(lambda line: seen.append(('b', line)))
+        stderr.connect(lambda line: seen.append(('prefix', line)), prefix='x')
+        stderr.subscribe(events.ErrorEvent, lambda event: seen.append(('event', event.line)))
+        stderr._process_lines([b'x1\r', b'', b'Error 2', b'x3'])
+        self.assertEqual(seen, [('a', 'x1'), ('b', 'x1'), ('prefix', 'x1'),
+                                ('a', 'Error 2'), ('b', 'Error 2'), ('event', 'Error 2'),
+                                ('a', 'x3'), ('b', 'x3'), ('prefix', 'x3')])
+
+
+class StdoutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = _StdoutWrapper(handle=None)
+        self.seen = []
+
+    def test_answers_in_order(self):
+        volume = _Waiter('volume')
+        self.stdout._router.register(volume)
+        self.stdout.subscribe(events.Event, lambda event: self.seen.append(
+            (event.line, volume.value)))
+        self.stdout._process_lines([b'ID_LENGTH=5400.00', b'ANS_volume=50.000000',
+                                    b'EOF code: 1'])
+        self.assertEqual(self.seen, [('ID_LENGTH=5400.00', None),
+                                     ('ANS_volume=50.000000', '50.000000'),
+                                     ('EOF code: 1', '50.000000')])
+
+    def test_answer_after_lines(self):
+        volume = _Waiter('volume')
+        self.stdout._router.register(volume)
+        self.stdout.connect(lambda line: self.seen.append((line, volume.value)))
+        self.stdout._process_lines([b'a', b'b', b'ANS_volume=50.000000', b'c'])
+        self.assertEqual(self.seen, [('a', None), ('b', None), ('c', '50.000000')])
+        self.assertEqual(self.stdout.stats()['lines'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""Requests which are still pending when MPlayer quits or when too many
+are pending, for the thread-based and the asyncio backend"""
+
+import time
+import asyncio
+import unittest
+from threading import Thread
+
+from tests import fake_settings
+from mplayer import Player
+from mplayer.aio import AsyncioPlayer
+
+
+OVERFLOW_NAMES = ['volume', 'speed', 'mute', 'loop']
+# The first two waiters are dropped to make room for the last two
+OVERFLOW_RESULT = {'volume': None, 'speed': None, 'mute': False, 'loop': -1}
+
+
+class ThreadTest(unittest.TestCase):
+
+    def test_quit_with_pending(self):
+        with fake_settings(latency=0.3):
+            player = Player()
+        results = []
+        t = Thread(target=lambda: results.append(player.get('volume', timeout=5.0)))
+        start = time.time()
+        t.start()
+        time.sleep(0.05)
+        player.quit()
+        t.join(5.0)
+        self.assertEqual(results, [None])
+        self.assertLess(time.time() - start, 2.0)
+
+    def test_answer_overflow(self):
+        player = Player(autospawn=False)
+        player.answer_queue_size = 2
+        player.spawn()
+        try:
+            self.assertEqual(player.get_properties(OVERFLOW_NAMES), OVERFLOW_RESULT)
+            self.assertEqual(player.stdout.stats()['dropped_answers'], 2)
+        finally:
+            player.quit()
+
+
+class AsyncioTest(unittest.TestCase):
+
+    def test_quit_with_pending(self):
+        async def main():
+            with fake_settings(latency=0.3):
+                player = AsyncioPlayer()
+                await player.spawn()
+            task = asyncio.ensure_future(player.get('volume', timeout=5.0))
+            await asyncio.sleep(0.05)
+            exited = player.quit()
+            self.assertIsNone(await asyncio.wait_for(task, 2.0))
+            await exited
+        asyncio.run(main())
+
+    def test_answer_overflow(self):
+        async def main():
+            player = AsyncioPlayer()
+            player.answer_queue_size = 2
+            async with player:
+                self.assertEqual(await player.get_properties(OVERFLOW_NAMES),
+                                 OVERFLOW_RESULT)
+                self.assertEqual(player.stdout.stats()['dropped_answers'], 2)
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
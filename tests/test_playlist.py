@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+from tests import fake_settings
+from mplayer.playlist import Playlist, _Order
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class OrderTest(unittest.TestCase):
+
+    def test_shuffle_is_a_permutation(self):
+        order = _Order()
+        for i in range(1000):
+            order.append(i)
+        order.shuffle(True)
+        seen = [order.advance() for _ in range(1000)]
+        self.assertEqual(sorted(seen), list(range(1000)))
+        self.assertIsNone(order.advance())
+
+    def test_shuffle_keeps_current(self):
+        order = _Order()
+        for i in range(10):
+            order.append(i)
+        order.advance()
+        order.advance()
+        order.shuffle(True)
+        self.assertEqual(order.current(), 1)
+        rest = [order.advance() for _ in range(9)]
+        self.assertEqual(sorted(rest), [0] + list(range(2, 10)))
+        current = order.current()
+        order.shuffle(False)
+        self.assertEqual(order.current(), current)
+        self.assertEqual(order.peek(), current + 1 if current < 9 else None)
+
+
+class PlaylistTest(unittest.TestCase):
+
+    def test_gapless_swap(self):
+        with fake_settings(duration=0.3):
+            playlist = Playlist(['/a.mkv', '/b.mkv', '/c.mkv'])
+        with playlist:
+            playlist.play()
+            self.assertTrue(wait_for(lambda: playlist.stats()['position'] == 3))
+            stats = playlist.stats()
+            self.assertEqual((stats['played'], stats['swaps'], stats['misses']), (3, 2, 0))
+            self.assertEqual(stats['gap']['count'], 2)
+
+    def test_skip_to_last_entry_stops_old(self):
+        playlist = Playlist(['/a.mkv', '/b.mkv'])
+        with playlist:
+            playlist.play()
+            old = playlist.player
+            self.assertTrue(wait_for(lambda: playlist._standby.get('paused')))
+            self.assertEqual(playlist.skip(), '/b.mkv')
+            new = playlist.player
+            self.assertIsNot(new, old)
+            self.assertEqual(new.get('path'), '/b.mkv')
+            self.assertFalse(new.get('paused'))
+            self.assertFalse(new.get('mute'))
+            # Nothing left to preload; the old entry must not keep playing
+            self.assertIsNone(old.get('path'))
+            self.assertIsNone(playlist.skip())
+            self.assertIsNone(new.get('path'))
+
+
+if __name__ == '__main__':
+    unittest.main()
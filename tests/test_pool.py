@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+"""PlayerPool"""
+
+import unittest
+
+from mplayer.pool import PlayerPool
+
+
+class PoolTest(unittest.TestCase):
+
+    def test_release_resets(self):
+        with PlayerPool(1) as pool:
+            with pool.player() as player:
+                player._run_command('loadfile', '/media/a.flac')
+                player._run_command('set_property', 'volume', '20')
+                player._run_command('set_property', 'speed', '2')
+                self.assertEqual(player.get('path'), '/media/a.flac')
+            with pool.player() as player:
+                self.assertEqual(player.get_properties(['path', 'volume', 'speed']),
+                                 {'path': None, 'volume': 50.0, 'speed': 1.0})
+
+    def test_exhausted(self):
+        with PlayerPool(1) as pool:
+            player = pool.acquire()
+            self.assertIsNone(pool.acquire(0.05))
+            pool.release(player)
+            self.assertRaises(ValueError, pool.release, player)
+            stats = pool.stats()
+            self.assertEqual((stats['exhausted'], stats['timeouts']), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
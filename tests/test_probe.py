@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""identify(), against a stand-in for 'mplayer -identify'"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+from mplayer import probe
+
+
+# Prints the fields of a video, with the arguments before the path as the
+# title, or hangs if the path contains 'hang'
+IDENTIFIER = '''#!{python}
+import sys, time
+if 'hang' in sys.argv[-1]:
+    time.sleep(30)
+args = sys.argv[sys.argv.index('all=0:identify=4') + 1:-1]
+print('ID_DEMUXER=mkv')
+print('ID_VIDEO_WIDTH=640')
+print('ID_LENGTH=12.50')
+print('ID_CLIP_INFO_N=1')
+print('ID_CLIP_INFO_NAME0=Title')
+print('ID_CLIP_INFO_VALUE0=' + '|'.join(args))
+'''
+
+
+class IdentifyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='mplayer-probe-')
+        self.exec_path = os.path.join(self.dir, 'identifier')
+        with open(self.exec_path, 'w') as f:
+            f.write(IDENTIFIER.format(python=sys.executable))
+        os.chmod(self.exec_path, 0o755)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _identify(self, paths, **kwargs):
+        return list(probe.identify(paths, exec_path=self.exec_path, ordered=True, **kwargs))
+
+    def test_fields(self):
+        info, = self._identify(['a.mkv'])
+        self.assertIsNone(info.error)
+        self.assertEqual((info.demuxer, info.width, info.length), ('mkv', 640, 12.5))
+        self.assertEqual(info.metadata, {'Title': ''})
+
+    def test_args(self):
+        for args in ['-ss 5 -title "a b"', ['-ss', 5, '-title', 'a b']]:
+            info, = self._identify(['a.mkv'], args=args)
+            self.assertEqual(info.metadata['Title'], '-ss|5|-title|a b')
+
+    def test_timeout(self):
+        start = time.time()
+        infos = self._identify(['hang.mkv', 'a.mkv'], workers=2, timeout=0.5)
+        self.assertLess(time.time() - start, 10.0)
+        self.assertEqual(infos[0].error, 'timed out after 0.5 seconds')
+        self.assertIsNone(infos[1].error)
+
+    def test_missing_executable(self):
+        info, = list(probe.identify(['a.mkv'], exec_path=os.path.join(self.dir, 'nothing')))
+        self.assertIsNotNone(info.error)
+
+
+if __name__ == '__main__':
+    unittest.main()
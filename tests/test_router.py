@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+"""Routing of property answers to the requests they belong to"""
+
+import time
+import unittest
+from threading import Thread
+
+from tests import fake_settings
+from mplayer import Player
+from mplayer.misc import _AnswerRouter, _FutureWaiter, _Waiter, AnswerLost
+
+try:
+    from concurrent.futures import Future
+except ImportError:
+    Future = None
+
+
+EXPECTED = {'volume': 50.0, 'speed': 1.0, 'mute': False, 'loop': -1}
+
+
+class RouterTest(unittest.TestCase):
+
+    def test_answers_by_name(self):
+        router = _AnswerRouter()
+        volume, speed = _Waiter('volume'), _Waiter('speed')
+        router.register(volume)
+        router.register(speed)
+        router.dispatch('ANS_volume=50.000000')
+        router.dispatch('ANS_speed=1.00')
+        self.assertEqual(volume.wait(0), '50.000000')
+        self.assertEqual(speed.wait(0), '1.00')
+
+    def test_error_goes_to_oldest(self):
+        router = _AnswerRouter()
+        chapter, speed = _Waiter('chapter'), _Waiter('speed')
+        router.register(chapter)
+        router.register(speed)
+        router.dispatch('ANS_ERROR=PROPERTY_UNAVAILABLE')
+        self.assertIsNone(chapter.wait(0))
+        self.assertFalse(chapter.cancelled)
+        self.assertEqual(router.stats()['pending_answers'], 1)
+        router.dispatch('ANS_speed=1.00')
+        self.assertEqual(speed.wait(0), '1.00')
+        self.assertEqual(router.stats()['error_answers'], 1)
+
+    def test_lost_answers(self):
+        router = _AnswerRouter()
+        volume, speed = _Waiter('volume'), _Waiter('speed')
+        router.register(volume)
+        router.register(speed)
+        # The answer to the older request never arrives
+        router.dispatch('ANS_speed=1.00')
+        self.assertIsNone(volume.wait(0))
+        self.assertEqual(speed.wait(0), '1.00')
+        self.assertEqual(router.stats()['pending_answers'], 0)
+
+    @unittest.skipIf(Future is None, 'requires concurrent.futures')
+    def test_lost_answer_fails_outside_lock(self):
+        router = _AnswerRouter()
+        results = []
+        future = Future()
+        # A callback which asks for more must not deadlock the reader
+        future.add_done_callback(lambda f: results.append(
+            (type(f.exception()), router.stats()['pending_answers'])))
+        router.register(_FutureWaiter('volume', future, lambda ans: ans))
+        router.register(_Waiter('speed'))
+        router.dispatch('ANS_speed=1.00')
+        self.assertEqual(results, [(AnswerLost, 0)])
+
+    def test_late_answer_is_discarded(self):
+        router = _AnswerRouter()
+        volume = _Waiter('volume')
+        router.register(volume)
+        self.assertIsNone(volume.wait(0))
+        speed = _Waiter('speed')
+        router.register(speed)
+        router.dispatch('ANS_volume=50.000000')
+        router.dispatch('ANS_speed=1.00')
+        self.assertIsNone(volume.value)
+        self.assertEqual(speed.wait(0), '1.00')
+        self.assertEqual(router.stats()['late_answers'], 1)
+
+    def test_cancel_all(self):
+        router = _AnswerRouter()
+        waiters = [_Waiter('volume'), _Waiter('speed')]
+        for waiter in waiters:
+            router.register(waiter)
+        router.cancel_all()
+        self.assertEqual([waiter.wait(0) for waiter in waiters], [None, None])
+        self.assertFalse(any(waiter.cancelled for waiter in waiters))
+        self.assertEqual(router.stats()['pending_answers'], 0)
+
+
+class PlayerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.player = Player()
+
+    def tearDown(self):
+        self.player.quit()
+
+    def test_cross_thread_answers(self):
+        errors = []
+
+        def get(name):
+            for i in range(50):
+                value = self.player.get(name, timeout=5.0)
+                if value != EXPECTED[name]:
+                    errors.append((name, value))
+
+        threads = [Thread(target=get, args=(name, )) for name in EXPECTED]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(30.0)
+        self.assertEqual(errors, [])
+        self.assertEqual(self.player.stdout.stats()['pending_answers'], 0)
+
+    def test_error_answer(self):
+        result = self.player.get_properties(['volume', 'chapter', 'no_such', 'speed'])
+        self.assertEqual(result, {'volume': 50.0, 'chapter': None, 'no_such': None,
+                                  'speed': 1.0})
+        self.assertEqual(self.player.stdout.stats()['error_answers'], 2)
+
+
+class LatencyTest(unittest.TestCase):
+
+    def test_timeout_then_late_answer(self):
+        with fake_settings(latency=0.2):
+            player = Player()
+        try:
+            start = time.time()
+            self.assertIsNone(player.get('volume', timeout=0.05))
+            self.assertLess(time.time() - start, 0.15)
+            # Must not be given the late answer to 'volume'
+            self.assertEqual(player.get('speed', timeout=5.0), 1.0)
+            stats = player.stdout.stats()
+            self.assertEqual(stats['timeouts'], 1)
+            self.assertEqual(stats['late_answers'], 1)
+        finally:
+            player.quit()
+
+    def test_quit_with_waiters(self):
+        with fake_settings(latency=0.3):
+            player = Player()
+        results = []
+
+        def get():
+            results.append(player.get_properties(['volume', 'speed'], timeout=5.0))
+
+        threads = [Thread(target=get) for i in range(3)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        player.quit()
+        for t in threads:
+            t.join(5.0)
+        self.assertEqual(results, [{'volume': None, 'speed': None}] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""Bounded answer queues and queued subscribers"""
+
+import time
+import unittest
+import threading
+
+from tests import fake_settings
+from mplayer import Player, Overflow
+from mplayer.misc import _AnswerRouter, _QueuedSubscriber, _Waiter
+
+
+def _waiters(router, *keys):
+    waiters = [_Waiter(key) for key in keys]
+    for waiter in waiters:
+        router.register(waiter)
+    return waiters
+
+
+class AnswerOverflowTest(unittest.TestCase):
+
+    def test_drop_stale(self):
+        router = _AnswerRouter(2, Overflow.DROP_STALE)
+        volume, speed = _waiters(router, 'volume', 'speed')
+        speed.cancelled = True
+        mute, = _waiters(router, 'mute')
+        # The timed-out request goes first
+        self.assertFalse(volume._event.is_set())
+        self.assertTrue(speed._event.is_set())
+        loop, = _waiters(router, 'loop')
+        # Then the oldest
+        self.assertTrue(volume._event.is_set())
+        self.assertEqual(router.stats()['dropped_answers'], 2)
+        router.dispatch('ANS_mute=no')
+        router.dispatch('ANS_loop=-1')
+        self.assertEqual([mute.wait(0), loop.wait(0)], ['no', '-1'])
+
+    def test_drop_oldest(self):
+        router = _AnswerRouter(2, Overflow.DROP_OLDEST)
+        volume, speed = _waiters(router, 'volume', 'speed')
+        speed.cancelled = True
+        _waiters(router, 'mute')
+        self.assertTrue(volume._event.is_set())
+        self.assertFalse(speed._event.is_set())
+        self.assertEqual(router.stats()['pending_answers'], 2)
+
+    def test_reserve(self):
+        router = _AnswerRouter(3, Overflow.BLOCK)
+        _waiters(router, 'volume', 'speed')
+        mute, loop = _Waiter('mute'), _Waiter('loop')
+        self.assertTrue(router.reserve([mute], 0))
+        self.assertFalse(router.reserve([loop], 0.05))
+        # The reserved room isn't taken by others
+        _waiters(router, 'pause')
+        router.register(mute)
+        self.assertFalse(mute._event.is_set())
+        self.assertEqual(router.stats()['dropped_answers'], 1)
+        t = threading.Timer(0.05, router.dispatch, ['ANS_speed=1.00'])
+        t.start()
+        self.assertTrue(router.reserve([loop], 2.0))
+        t.join()
+        router.release([loop])
+        self.assertTrue(router.reserve([_Waiter('osdlevel')], 0))
+
+    def test_invalid_policy(self):
+        self.assertRaises(ValueError, _AnswerRouter, 2, Overflow.RAISE)
+
+    def test_player_block(self):
+        with fake_settings(latency=0.05):
+            player = Player(autospawn=False)
+            player.answer_queue_size = 2
+            player.answer_overflow = Overflow.BLOCK
+            player.spawn()
+        try:
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(
+                player.get('volume', timeout=5.0))) for i in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(10.0)
+            self.assertEqual(results, [50.0] * 4)
+            stats = player.stdout.stats()
+            self.assertEqual(stats['dropped_answers'], 0)
+            self.assertLessEqual(stats['max_pending_answers'], 2)
+        finally:
+            player.quit()
+
+
+class QueuedSubscriberTest(unittest.TestCase):
+
+    def test_drop_oldest(self):
+        release = threading.Event()
+        items = []
+
+        def subscriber(item):
+            release.wait(5.0)
+            items.append(item)
+
+        queued = _QueuedSubscriber(subscriber, 2, Overflow.DROP_OLDEST)
+        queued(0)
+        # Wait for the thread to be stuck in subscriber
+        deadline = time.time() + 2.0
+        while queued._queue and time.time() < deadline:
+            time.sleep(0.01)
+        for i in range(1, 5):
+            queued(i)
+        self.assertEqual(queued.dropped, 2)
+        release.set()
+        deadline = time.time() + 2.0
+        while len(items) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(items, [0, 3, 4])
+        queued.close()
+
+    def test_equality(self):
+        def subscriber(item):
+            pass
+
+        queued = _QueuedSubscriber(subscriber)
+        try:
+            self.assertEqual(queued, subscriber)
+            self.assertEqual(hash(queued), hash(subscriber))
+        finally:
+            queued.close()
+
+    def test_slow_subscriber_doesnt_stall_answers(self):
+        with fake_settings(noise=5):
+            player = Player()
+        release = threading.Event()
+        lines = []
+
+        def subscriber(line):
+            release.wait(5.0)
+            lines.append(line)
+
+        try:
+            player.stdout.connect(subscriber, queue_size=4)
+            for i in range(5):
+                self.assertEqual(player.get('volume', timeout=2.0), 50.0)
+            release.set()
+            self.assertGreater(player.stdout.stats()['dropped_lines'], 0)
+            deadline = time.time() + 2.0
+            while not lines and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(lines)
+            player.stdout.disconnect(subscriber)
+            self.assertEqual(player.stdout._subscribers, [])
+        finally:
+            release.set()
+            player.quit()
+
+
+if __name__ == '__main__':
+    unittest.main()
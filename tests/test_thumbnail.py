@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""thumbnails(), against a stand-in for MPlayer's image outputs"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from mplayer import thumbnail
+
+
+# Parses the suboptions of -vo like MPlayer, including the %len%value
+# syntax, and writes the position as the only frame to outdir
+GRABBER = '''#!{python}
+import os, sys
+# Lengths are in bytes, like in MPlayer
+vo = os.fsencode(sys.argv[sys.argv.index('-vo') + 1])
+name, _, opts = vo.partition(b':')
+subopts = {{}}
+while opts:
+    key, _, opts = opts.partition(b'=')
+    if opts.startswith(b'%'):
+        length, _, opts = opts[1:].partition(b'%')
+        length = int(length)
+        value, opts = opts[:length], opts[length + 1:]
+    else:
+        value, _, opts = opts.partition(b':')
+    subopts[key] = value
+with open(os.path.join(subopts[b'outdir'], b'00000001.' + name), 'w') as f:
+    f.write(sys.argv[sys.argv.index('-ss') + 1])
+'''
+
+
+class ThumbnailsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='mplayer-thumbnail-')
+        self.exec_path = os.path.join(self.dir, 'grabber')
+        with open(self.exec_path, 'w') as f:
+            f.write(GRABBER.format(python=sys.executable))
+        os.chmod(self.exec_path, 0o755)
+        self.tempdir = tempfile.tempdir
+
+    def tearDown(self):
+        tempfile.tempdir = self.tempdir
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_outdir_with_separators(self):
+        for format in ['png', 'jpeg']:
+            tempfile.tempdir = os.path.join(self.dir, 'a:b,c é')
+            os.mkdir(tempfile.tempdir)
+            try:
+                thumb, = thumbnail.thumbnails([('a.mkv', 2.5)], format=format,
+                                              exec_path=self.exec_path)
+                self.assertIsNone(thumb.error)
+                self.assertEqual(thumb.data, b'2.500')
+                # The temporary directory is removed
+                self.assertEqual(os.listdir(tempfile.tempdir), [])
+            finally:
+                os.rmdir(tempfile.tempdir)
+
+    def test_invalid_format(self):
+        self.assertRaises(ValueError, thumbnail.thumbnails, [], format='gif')
+
+
+if __name__ == '__main__':
+    unittest.main()